@@ -6,6 +6,7 @@ import json
 import os
 
 import data_handler
+import live_watcher
 from frame_live import create_frame_live
 from frame_preparazione import create_frame_preparazione
 from frame_correzione import create_frame_correzione
@@ -50,6 +51,19 @@ global_config = {
     "domains_csv_path": tk.StringVar(),
     "ftp_config_path": tk.StringVar(),
 
+    # Limiti di banda per i download FTP (KB/s, 0 = illimitato)
+    "ftp_limite_banda_kbs": tk.StringVar(value="0"),
+    "ftp_limite_connessione_kbs": tk.StringVar(value="0"),
+
+    # Pattern dei nomi delle cartelle test ("{num}" = postazione, più
+    # pattern separati da ";") e intervallo delle postazioni
+    "folder_patterns": tk.StringVar(value=data_handler.FOLDER_PATTERN_DEFAULT),
+    "seat_min": tk.StringVar(value=str(data_handler.TEST_MIN)),
+    "seat_max": tk.StringVar(value=str(data_handler.TEST_MAX)),
+
+    # Live, watcher a polling (share di rete): intervallo massimo (s) tra due
+    # scansioni di una cartella test ferma (più alto = meno I/O sulla share)
+    "live_polling_max_s": tk.StringVar(value=str(int(live_watcher.POLLING_INTERVAL_MAX))),
 
     # callback opzionali per pulsante "Aggiorna cartella"
     "refresh_preparazione": None,
@@ -58,6 +72,10 @@ global_config = {
     "refresh_export": None,
     "refresh_domini": None,
 
+    # callback opzionale di frame_export: mix_in_corso(True/False)
+    # disattiva/riattiva i pulsanti che leggono i file di mix
+    "mix_in_corso": None,
+
     # Testo dell'introduzione per i file di mix
     # Verrà salvato e ricaricato nel file di configurazione JSON
     "intro_text": tk.StringVar(),
@@ -146,6 +164,9 @@ def salva_configurazione():
       - selected_directory
       - current_mode
       - domains_csv_path (percorso file CSV con dati domini)
+      - limiti di banda FTP (ftp_limite_banda_kbs, ftp_limite_connessione_kbs)
+      - pattern delle cartelle test e intervallo postazioni
+      - intervallo massimo del watcher a polling (live_polling_max_s)
       - eventuali credenziali dom_* e dizionario "domini"
     """
     config = {
@@ -155,6 +176,12 @@ def salva_configurazione():
         "selected_directory": global_config["selected_directory"].get(),
         "current_mode": current_mode.get(),
         "domains_csv_path": global_config["domains_csv_path"].get(),
+        "ftp_limite_banda_kbs": global_config["ftp_limite_banda_kbs"].get(),
+        "ftp_limite_connessione_kbs": global_config["ftp_limite_connessione_kbs"].get(),
+        "folder_patterns": global_config["folder_patterns"].get(),
+        "seat_min": global_config["seat_min"].get(),
+        "seat_max": global_config["seat_max"].get(),
+        "live_polling_max_s": global_config["live_polling_max_s"].get(),
     }
     
         # Salvataggio del testo di INTRO, se la variabile è presente
@@ -216,6 +243,9 @@ def carica_configurazione():
       - selected_directory
       - current_mode
       - domains_csv_path
+      - limiti di banda FTP
+      - pattern delle cartelle test e intervallo postazioni
+      - intervallo massimo del watcher a polling (live_polling_max_s)
       - eventuali credenziali dom_* e dizionario "domini"
 
     Dopo aver impostato current_mode viene mostrato il frame
@@ -249,6 +279,24 @@ def carica_configurazione():
         global_config["domains_csv_path"].set(
             config.get("domains_csv_path", "")
         )
+        global_config["ftp_limite_banda_kbs"].set(
+            config.get("ftp_limite_banda_kbs", "0")
+        )
+        global_config["ftp_limite_connessione_kbs"].set(
+            config.get("ftp_limite_connessione_kbs", "0")
+        )
+        global_config["folder_patterns"].set(
+            config.get("folder_patterns", data_handler.FOLDER_PATTERN_DEFAULT)
+        )
+        global_config["seat_min"].set(
+            config.get("seat_min", str(data_handler.TEST_MIN))
+        )
+        global_config["seat_max"].set(
+            config.get("seat_max", str(data_handler.TEST_MAX))
+        )
+        global_config["live_polling_max_s"].set(
+            config.get("live_polling_max_s", str(int(live_watcher.POLLING_INTERVAL_MAX)))
+        )
 
         # Ripristino del testo di INTRO, se presente nel file di configurazione
         if "intro_text" in global_config:
@@ -511,6 +559,71 @@ def refresh_current_directory():
 btn_refresh_dir = tk.Button(top_bar, text="Aggiorna cartella", command=refresh_current_directory)
 btn_refresh_dir.grid(row=0, column=5, padx=5, pady=2, sticky="w")
 
+
+# --- Riga 1: pattern delle cartelle test (vale per tutte le schede)
+
+lbl_pattern = tk.Label(top_bar, text="Cartelle test:", bg="#eeeeee")
+lbl_pattern.grid(row=1, column=0, padx=5, pady=2, sticky="e")
+
+combo_pattern = ttk.Combobox(
+    top_bar,
+    textvariable=global_config["folder_patterns"],
+    values=data_handler.FOLDER_PATTERNS_PRESET,
+    width=40,
+)
+combo_pattern.grid(row=1, column=1, columnspan=2, padx=5, pady=2, sticky="w")
+
+frame_postazioni = tk.Frame(top_bar, bg="#eeeeee")
+frame_postazioni.grid(row=1, column=3, columnspan=3, padx=5, pady=2, sticky="w")
+
+tk.Label(frame_postazioni, text="Postazioni da", bg="#eeeeee").pack(side="left")
+tk.Spinbox(
+    frame_postazioni,
+    from_=0,
+    to=999,
+    width=5,
+    textvariable=global_config["seat_min"],
+).pack(side="left", padx=3)
+tk.Label(frame_postazioni, text="a", bg="#eeeeee").pack(side="left")
+tk.Spinbox(
+    frame_postazioni,
+    from_=0,
+    to=999,
+    width=5,
+    textvariable=global_config["seat_max"],
+).pack(side="left", padx=3)
+
+lbl_pattern_stato = tk.Label(frame_postazioni, text="", bg="#eeeeee", anchor="w")
+lbl_pattern_stato.pack(side="left", padx=10)
+
+
+def _applica_pattern_cartelle(*_args):
+    """
+    Applica a data_handler i pattern e le postazioni scelti nella barra.
+    Se non sono validi resta attiva la configurazione precedente.
+    """
+    try:
+        data_handler.set_folder_patterns(
+            global_config["folder_patterns"].get(),
+            global_config["seat_min"].get(),
+            global_config["seat_max"].get(),
+        )
+    except Exception as e:
+        lbl_pattern_stato.config(text="⚠️ " + str(e), fg="red")
+        return
+
+    nomi = data_handler.expected_test_folder_names()
+    lbl_pattern_stato.config(
+        text="{} cartelle attese ({} … {})".format(len(nomi), nomi[0], nomi[-1]),
+        fg="black",
+    )
+
+
+for _key in ("folder_patterns", "seat_min", "seat_max"):
+    global_config[_key].trace_add("write", _applica_pattern_cartelle)
+
+_applica_pattern_cartelle()
+
 top_bar.grid_columnconfigure(4, weight=1)
 
 
@@ -0,0 +1,634 @@
+"""
+bench_ftp.py
+Banco di prova per ftpAgent senza account Altervista reali.
+
+Contenuto:
+- un server FTP minimale in-process su 127.0.0.1 (un thread per connessione,
+  modalità passiva, MLSD/LIST/NLST/RETR/SIZE/MDTM), con latenza simulata
+  per comando e contatori di connessioni e comandi;
+- la generazione di domini sintetici (numero di file, distribuzione delle
+  dimensioni, profondità delle cartelle, file di libreria identici);
+- l'esecuzione di ftpAgent.start_batch_download contro il server locale con
+  report di file/s, MB/s, connessioni aperte e tempi per fase
+  (connessione, listing, trasferimento).
+
+Uso da riga di comando (dalla cartella Smixer_v6):
+    python bench_ftp.py --domini 20 --file 80 --profondita 3 --latenza-ms 20
+    python bench_ftp.py --sync          (secondo giro in sincronizzazione)
+    python bench_ftp.py --no-mlsd       (server senza MLSD)
+
+Ogni utente FTP corrisponde alla cartella omonima sotto la radice del server:
+i job usano 'ftp_host' / 'ftp_port' per puntare al server locale.
+"""
+
+import os
+import sys
+import time
+import queue
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+
+import ftpAgent
+
+
+# ======================================================================
+# SERVER FTP LOCALE
+# ======================================================================
+
+def _risolvi_percorso(radice_utente, cwd, argomento):
+    """
+    Converte un argomento FTP (assoluto o relativo a 'cwd') in
+    (percorso_virtuale, percorso_su_disco), senza uscire dalla radice.
+    """
+    if not argomento:
+        virtuale = cwd
+    elif argomento.startswith("/"):
+        virtuale = argomento
+    else:
+        virtuale = cwd.rstrip("/") + "/" + argomento
+
+    virtuale = os.path.normpath(virtuale).replace(os.sep, "/")
+    if not virtuale.startswith("/"):
+        virtuale = "/" + virtuale
+    # normpath("/..") resta "/": impossibile risalire oltre la radice
+    if virtuale.startswith("//"):
+        virtuale = virtuale[1:]
+
+    return virtuale, os.path.join(radice_utente, virtuale.lstrip("/"))
+
+
+def _mlsd_fact_time(secondi):
+    return time.strftime("%Y%m%d%H%M%S", time.gmtime(secondi))
+
+
+def _riga_listing(comando, nome, st, is_dir, stile_list):
+    """
+    Una riga di risposta per MLSD, NLST o LIST (stile 'unix' o 'dos').
+    """
+    if comando == "MLSD":
+        return "type={};size={};modify={}; {}".format(
+            "dir" if is_dir else "file",
+            st.st_size,
+            _mlsd_fact_time(st.st_mtime),
+            nome,
+        )
+
+    if comando == "NLST":
+        return nome
+
+    if stile_list == "dos":
+        if is_dir:
+            dimensione = "<DIR>         "
+        else:
+            dimensione = "{:>14}".format(st.st_size)
+        return "{} {} {}".format(
+            time.strftime("%m-%d-%y  %I:%M%p", time.gmtime(st.st_mtime)),
+            dimensione,
+            nome,
+        )
+
+    return "{} 1 ftp ftp {:>10} {} {}".format(
+        "drwxr-xr-x" if is_dir else "-rw-r--r--",
+        st.st_size,
+        time.strftime("%b %d %H:%M", time.gmtime(st.st_mtime)),
+        nome,
+    )
+
+
+def _conta_comando(stato, comando):
+    with stato["lock"]:
+        stato["comandi"][comando] = stato["comandi"].get(comando, 0) + 1
+
+
+def _gestisci_connessione(stato, conn):
+    """
+    Sessione FTP di un singolo client (eseguita in un thread dedicato).
+    """
+    opzioni = stato["opzioni"]
+    latenza = opzioni.get("latenza_ms", 0) / 1000.0
+    lettore = conn.makefile("rb")
+
+    def rispondi(testo):
+        conn.sendall((testo + "\r\n").encode("latin-1"))
+
+    def apri_dati():
+        dati, _ = passivo["socket"].accept()
+        passivo["socket"].close()
+        passivo["socket"] = None
+        return dati
+
+    radice_utente = stato["radice"]
+    cwd = "/"
+    passivo = {"socket": None}
+
+    rispondi("220 SMX bench FTP")
+
+    while True:
+        try:
+            riga = lettore.readline()
+        except Exception:
+            break
+        if not riga:
+            break
+
+        riga = riga.decode("latin-1").rstrip("\r\n")
+        comando, _, argomento = riga.partition(" ")
+        comando = comando.upper()
+        _conta_comando(stato, comando)
+
+        if latenza > 0:
+            time.sleep(latenza)
+
+        try:
+            if comando == "USER":
+                candidata = os.path.join(stato["radice"], argomento)
+                if argomento and os.path.isdir(candidata):
+                    radice_utente = candidata
+                rispondi("331 Password richiesta")
+
+            elif comando == "PASS":
+                rispondi("230 Login OK")
+
+            elif comando in ("TYPE", "MODE", "STRU"):
+                rispondi("200 OK")
+
+            elif comando == "SYST":
+                rispondi("215 UNIX Type: L8")
+
+            elif comando == "NOOP":
+                rispondi("200 OK")
+
+            elif comando == "FEAT":
+                righe = ["211-Features:", " SIZE", " MDTM"]
+                if opzioni.get("mlsd", True):
+                    righe.append(" MLST type*;size*;modify*;")
+                righe.append("211 End")
+                rispondi("\r\n".join(righe))
+
+            elif comando == "PWD":
+                rispondi('257 "{}"'.format(cwd))
+
+            elif comando in ("CWD", "CDUP"):
+                if comando == "CDUP":
+                    argomento = ".."
+                virtuale, su_disco = _risolvi_percorso(radice_utente, cwd, argomento)
+                if os.path.isdir(su_disco):
+                    cwd = virtuale
+                    rispondi("250 OK")
+                else:
+                    rispondi("550 Cartella inesistente")
+
+            elif comando == "PASV":
+                if passivo["socket"] is not None:
+                    passivo["socket"].close()
+                ascolto = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                ascolto.bind(("127.0.0.1", 0))
+                ascolto.listen(1)
+                ascolto.settimeout(10)
+                passivo["socket"] = ascolto
+                porta = ascolto.getsockname()[1]
+                rispondi("227 Entering Passive Mode (127,0,0,1,{},{})".format(porta // 256, porta % 256))
+
+            elif comando in ("MLSD", "LIST", "NLST"):
+                if comando == "MLSD" and not opzioni.get("mlsd", True):
+                    rispondi("500 Comando sconosciuto")
+                    continue
+                if argomento.startswith("-"):
+                    argomento = ""
+                _virtuale, su_disco = _risolvi_percorso(radice_utente, cwd, argomento)
+                if not os.path.isdir(su_disco) or passivo["socket"] is None:
+                    rispondi("550 Cartella inesistente")
+                    continue
+
+                righe = []
+                nomi = sorted(os.listdir(su_disco))
+                i = 0
+                while i < len(nomi):
+                    percorso = os.path.join(su_disco, nomi[i])
+                    try:
+                        st = os.stat(percorso)
+                        righe.append(
+                            _riga_listing(
+                                comando,
+                                nomi[i],
+                                st,
+                                os.path.isdir(percorso),
+                                opzioni.get("stile_list", "unix"),
+                            )
+                        )
+                    except Exception:
+                        pass
+                    i = i + 1
+
+                rispondi("150 Invio listing")
+                dati = apri_dati()
+                testo = "".join(r + "\r\n" for r in righe)
+                dati.sendall(testo.encode("latin-1", errors="replace"))
+                dati.close()
+                rispondi("226 Listing completato")
+
+            elif comando == "RETR":
+                _virtuale, su_disco = _risolvi_percorso(radice_utente, cwd, argomento)
+                if not os.path.isfile(su_disco) or passivo["socket"] is None:
+                    rispondi("550 File inesistente")
+                    continue
+                rispondi("150 Invio file")
+                dati = apri_dati()
+                inviati = 0
+                with open(su_disco, "rb") as f:
+                    while True:
+                        blocco = f.read(65536)
+                        if not blocco:
+                            break
+                        dati.sendall(blocco)
+                        inviati = inviati + len(blocco)
+                dati.close()
+                with stato["lock"]:
+                    stato["byte_inviati"] = stato["byte_inviati"] + inviati
+                rispondi("226 Trasferimento completato")
+
+            elif comando in ("SIZE", "MDTM"):
+                _virtuale, su_disco = _risolvi_percorso(radice_utente, cwd, argomento)
+                if not os.path.isfile(su_disco):
+                    rispondi("550 File inesistente")
+                elif comando == "SIZE":
+                    rispondi("213 {}".format(os.path.getsize(su_disco)))
+                else:
+                    rispondi("213 {}".format(_mlsd_fact_time(os.path.getmtime(su_disco))))
+
+            elif comando == "QUIT":
+                rispondi("221 Arrivederci")
+                break
+
+            else:
+                rispondi("502 Comando non implementato")
+
+        except Exception:
+            try:
+                rispondi("451 Errore locale")
+            except Exception:
+                break
+
+    try:
+        if passivo["socket"] is not None:
+            passivo["socket"].close()
+        conn.close()
+    except Exception:
+        pass
+
+
+def start_local_ftp_server(radice, mlsd=True, stile_list="unix", latenza_ms=0):
+    """
+    Avvia il server FTP locale su una porta libera di 127.0.0.1 e ne
+    restituisce lo stato: {"porta", "connessioni", "comandi", "byte_inviati", ...}.
+    """
+    ascolto = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    ascolto.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    ascolto.bind(("127.0.0.1", 0))
+    ascolto.listen(128)
+
+    stato = {
+        "radice": radice,
+        "opzioni": {"mlsd": mlsd, "stile_list": stile_list, "latenza_ms": latenza_ms},
+        "socket": ascolto,
+        "porta": ascolto.getsockname()[1],
+        "lock": threading.Lock(),
+        "connessioni": 0,
+        "comandi": {},
+        "byte_inviati": 0,
+    }
+
+    def _accetta():
+        while True:
+            try:
+                conn, _ = ascolto.accept()
+            except OSError:
+                return
+            # senza NODELAY le risposte brevi (150/226) subiscono il ritardo di Nagle
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with stato["lock"]:
+                stato["connessioni"] = stato["connessioni"] + 1
+            t = threading.Thread(target=_gestisci_connessione, args=(stato, conn), daemon=True)
+            t.start()
+
+    threading.Thread(target=_accetta, daemon=True).start()
+    return stato
+
+
+def stop_local_ftp_server(stato):
+    try:
+        stato["socket"].close()
+    except Exception:
+        pass
+
+
+def reset_server_counters(stato):
+    with stato["lock"]:
+        stato["connessioni"] = 0
+        stato["comandi"] = {}
+        stato["byte_inviati"] = 0
+
+
+# ======================================================================
+# DOMINI SINTETICI
+# ======================================================================
+
+ESTENSIONI_SINTETICHE = (".php", ".html", ".css", ".js", ".txt")
+
+
+def generate_synthetic_domains(
+    radice,
+    n_domini=10,
+    file_per_dominio=50,
+    dim_min=200,
+    dim_max=200000,
+    profondita=2,
+    file_libreria=0,
+    seme=1,
+):
+    """
+    Crea 'n_domini' cartelle (dominio01, dominio02, ...) sotto 'radice'.
+
+    Le dimensioni seguono una distribuzione log-uniforme tra dim_min e
+    dim_max (molti file piccoli, pochi grandi, come nei siti reali); i file
+    sono distribuiti in cartelle annidate fino a 'profondita' livelli.
+    'file_libreria' file identici vengono copiati in tutti i domini.
+
+    Restituisce la lista dei nomi dominio (= utenti FTP).
+    """
+    casuale = random.Random(seme)
+    os.makedirs(radice, exist_ok=True)
+
+    librerie = []
+    k = 0
+    while k < file_libreria:
+        dimensione = int(dim_min + casuale.random() * (dim_max - dim_min))
+        librerie.append(("lib/libreria{:02d}.js".format(k + 1), os.urandom(dimensione)))
+        k = k + 1
+
+    nomi = []
+    d = 0
+    while d < n_domini:
+        nome = "dominio{:02d}".format(d + 1)
+        cartella = os.path.join(radice, nome)
+        os.makedirs(cartella, exist_ok=True)
+
+        f = 0
+        while f < file_per_dominio:
+            livello = casuale.randint(0, max(0, profondita))
+            parti = []
+            p = 0
+            while p < livello:
+                parti.append("dir{}_{}".format(p + 1, casuale.randint(1, 3)))
+                p = p + 1
+
+            sottocartella = os.path.join(cartella, *parti) if parti else cartella
+            os.makedirs(sottocartella, exist_ok=True)
+
+            dimensione = int(dim_min * ((float(dim_max) / dim_min) ** casuale.random()))
+            estensione = ESTENSIONI_SINTETICHE[f % len(ESTENSIONI_SINTETICHE)]
+            percorso = os.path.join(sottocartella, "file{:04d}{}".format(f + 1, estensione))
+
+            riga = "// {} riga di prova {}\n".format(nome, f + 1)
+            ripetizioni = dimensione // len(riga) + 1
+            with open(percorso, "w", encoding="utf-8") as fh:
+                fh.write((riga * ripetizioni)[:dimensione])
+            f = f + 1
+
+        k = 0
+        while k < len(librerie):
+            percorso = os.path.join(cartella, librerie[k][0])
+            os.makedirs(os.path.dirname(percorso), exist_ok=True)
+            with open(percorso, "wb") as fh:
+                fh.write(librerie[k][1])
+            k = k + 1
+
+        nomi.append(nome)
+        d = d + 1
+
+    return nomi
+
+
+# ======================================================================
+# ESECUZIONE BENCHMARK
+# ======================================================================
+
+def _build_jobs(domini, porta, sincronizza=False):
+    jobs = []
+    i = 0
+    while i < len(domini):
+        jobs.append(
+            {
+                "item_id": "bench{:03d}".format(i + 1),
+                "alunno": domini[i],
+                "dominio": domini[i] + ".bench",
+                "stato_base": "Bench",
+                "ftp_user": domini[i],
+                "ftp_pass": "bench",
+                "ftp_host": "127.0.0.1",
+                "ftp_port": porta,
+                "sync": sincronizza,
+            }
+        )
+        i = i + 1
+    return jobs
+
+
+def run_download_round(server, domini, base_dir, sincronizza=False, usa_cache=False):
+    """
+    Esegue un batch di start_batch_download e attende "fine_download".
+    Restituisce le misure del giro. Senza 'usa_cache' la cache dei listing
+    di ftpAgent viene svuotata, così ogni giro interroga davvero il server.
+    """
+    reset_server_counters(server)
+    if not usa_cache:
+        ftpAgent.clear_listing_cache()
+    update_queue = queue.Queue()
+    jobs = _build_jobs(domini, server["porta"], sincronizza)
+
+    tempi = {}
+    massimi = {}
+    errori = 0
+
+    t0 = time.perf_counter()
+    ftpAgent.start_batch_download(jobs, base_dir, update_queue)
+
+    while True:
+        messaggio = update_queue.get()
+        tipo = messaggio[0]
+
+        if tipo == "tempi":
+            for fase, valore in messaggio[2].items():
+                tempi[fase] = tempi.get(fase, 0) + valore
+                if valore > massimi.get(fase, 0):
+                    massimi[fase] = valore
+        elif tipo == "log" and messaggio[1].startswith("❌"):
+            errori = errori + 1
+        elif tipo == "fine_download":
+            break
+
+    durata = time.perf_counter() - t0
+
+    with server["lock"]:
+        comandi = dict(server["comandi"])
+        connessioni = server["connessioni"]
+        byte_inviati = server["byte_inviati"]
+
+    return {
+        "durata": durata,
+        "file": tempi.get("file", 0),
+        "byte": byte_inviati,
+        "connessioni": connessioni,
+        "comandi": comandi,
+        "tempi": tempi,
+        "massimi": massimi,
+        "errori": errori,
+    }
+
+
+def format_report(titolo, misure):
+    """
+    Testo del report di un giro di benchmark.
+    """
+    durata = max(misure["durata"], 1e-9)
+    tempi = misure["tempi"]
+    massimi = misure["massimi"]
+    comandi = misure["comandi"]
+
+    righe = [
+        "=== {} ===".format(titolo),
+        "Durata:        {:.2f} s".format(misure["durata"]),
+        "File:          {}  ({:.1f} file/s)".format(misure["file"], misure["file"] / durata),
+        "Dati:          {}  ({:.2f} MB/s)".format(
+            ftpAgent._format_bytes(misure["byte"]),
+            misure["byte"] / durata / (1024.0 * 1024.0),
+        ),
+        "Connessioni:   {}".format(misure["connessioni"]),
+        "Comandi:       {} (listing {}, RETR {})".format(
+            sum(comandi.values()),
+            comandi.get("MLSD", 0) + comandi.get("LIST", 0) + comandi.get("NLST", 0),
+            comandi.get("RETR", 0),
+        ),
+    ]
+
+    fasi = ("connessione", "listing", "trasferimento")
+    i = 0
+    while i < len(fasi):
+        righe.append(
+            "{:<14} somma {:.2f} s, max per dominio {:.2f} s".format(
+                fasi[i].capitalize() + ":",
+                tempi.get(fasi[i], 0),
+                massimi.get(fasi[i], 0),
+            )
+        )
+        i = i + 1
+
+    if misure["errori"]:
+        righe.append("Errori:        {}".format(misure["errori"]))
+
+    return "\n".join(righe)
+
+
+def run_benchmark(opzioni):
+    """
+    Genera i domini, avvia il server ed esegue il download completo
+    (più un giro di sincronizzazione se richiesto). Restituisce i report.
+    """
+    cartella_lavoro = opzioni.get("cartella") or tempfile.mkdtemp(prefix="smx_bench_")
+    radice_server = os.path.join(cartella_lavoro, "server")
+    base_dir = os.path.join(cartella_lavoro, "client")
+
+    shutil.rmtree(radice_server, ignore_errors=True)
+    shutil.rmtree(base_dir, ignore_errors=True)
+    os.makedirs(base_dir, exist_ok=True)
+
+    domini = generate_synthetic_domains(
+        radice_server,
+        opzioni.get("domini", 10),
+        opzioni.get("file", 50),
+        opzioni.get("dim_min", 200),
+        opzioni.get("dim_max", 200000),
+        opzioni.get("profondita", 2),
+        opzioni.get("librerie", 0),
+        opzioni.get("seme", 1),
+    )
+
+    ftpAgent.set_bandwidth_limit(opzioni.get("limite_kbs", 0), opzioni.get("limite_connessione_kbs", 0))
+
+    server = start_local_ftp_server(
+        radice_server,
+        mlsd=opzioni.get("mlsd", True),
+        stile_list=opzioni.get("stile_list", "unix"),
+        latenza_ms=opzioni.get("latenza_ms", 0),
+    )
+
+    report = []
+    try:
+        misure = run_download_round(server, domini, base_dir)
+        report.append(format_report("Download completo", misure))
+
+        if opzioni.get("sync"):
+            misure = run_download_round(server, domini, base_dir, True)
+            report.append(format_report("Sincronizzazione (nessuna modifica)", misure))
+    finally:
+        stop_local_ftp_server(server)
+        ftpAgent.set_bandwidth_limit(0, 0)
+        if not opzioni.get("cartella") and not opzioni.get("conserva"):
+            shutil.rmtree(cartella_lavoro, ignore_errors=True)
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark di ftpAgent contro un server FTP locale.")
+    parser.add_argument("--domini", type=int, default=10)
+    parser.add_argument("--file", type=int, default=50, help="file per dominio")
+    parser.add_argument("--dim-min", type=int, default=200, help="byte")
+    parser.add_argument("--dim-max", type=int, default=200000, help="byte")
+    parser.add_argument("--profondita", type=int, default=2)
+    parser.add_argument("--librerie", type=int, default=0, help="file identici in tutti i domini")
+    parser.add_argument("--seme", type=int, default=1)
+    parser.add_argument("--latenza-ms", type=int, default=0, help="ritardo per comando FTP")
+    parser.add_argument("--no-mlsd", action="store_true")
+    parser.add_argument("--list", choices=("unix", "dos"), default="unix")
+    parser.add_argument("--limite-kbs", type=float, default=0)
+    parser.add_argument("--limite-connessione-kbs", type=float, default=0)
+    parser.add_argument("--sync", action="store_true", help="secondo giro in sincronizzazione")
+    parser.add_argument("--cartella", default="", help="cartella di lavoro (conservata)")
+    parser.add_argument("--conserva", action="store_true", help="non eliminare la cartella temporanea")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(
+        {
+            "domini": args.domini,
+            "file": args.file,
+            "dim_min": args.dim_min,
+            "dim_max": args.dim_max,
+            "profondita": args.profondita,
+            "librerie": args.librerie,
+            "seme": args.seme,
+            "latenza_ms": args.latenza_ms,
+            "mlsd": not args.no_mlsd,
+            "stile_list": args.list,
+            "limite_kbs": args.limite_kbs,
+            "limite_connessione_kbs": args.limite_connessione_kbs,
+            "sync": args.sync,
+            "cartella": args.cartella,
+            "conserva": args.conserva,
+        }
+    )
+
+    i = 0
+    while i < len(report):
+        print(report[i])
+        print("")
+        i = i + 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,12 @@
 import os
 import io
+import json
+import hashlib
+import queue
 import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import messagebox
 
 from reportlab.lib.pagesizes import A4
@@ -17,6 +23,20 @@ from PyPDF2 import PdfReader, PdfWriter
 
 FLAG_END_INTRO = "###__END_INTRO__###"
 
+# Mix in parallelo: thread del pool e intervallo con cui la GUI legge i
+# risultati (lettura/decodifica/scrittura dei file, in gran parte I/O)
+MIX_MAX_WORKERS = 8
+MIX_POLL_MS = 100
+
+# Manifest dei mix: per ogni <subdir>_mix.txt, in 00_MixOutput/00_manifest,
+# gli ingressi (file, dimensioni, mtime) e le opzioni usate per crearlo
+MIX_MANIFEST_DIR = "00_manifest"
+MIX_MANIFEST_VERSION = 1
+
+# Esito di create_mix_file: mix riscritto oppure lasciato com'era
+MIX_CREATO = "creato"
+MIX_INVARIATO = "invariato"
+
 
 # =============================================================================
 #  FUNZIONI DI SUPPORTO
@@ -237,7 +257,9 @@ def mix_files(lbl_or_var_directory,
               tree,
               report_text,
               include_prompt,
-              include_subdir):
+              include_subdir,
+              parallel=True,
+              on_done=None):
     """
     Funzione principale richiamata dalla scheda di Correzione per creare
     tutti i file di mix all'interno della directory 00_MixOutput.
@@ -250,6 +272,14 @@ def mix_files(lbl_or_var_directory,
       - report_text          : widget Text per il log
       - include_prompt       : bool, include o meno l'intro nel mix
       - include_subdir       : bool, include o meno il nome della subdir nel mix
+      - parallel             : bool, crea i mix con un pool di thread in
+                               background (la GUI resta reattiva); ogni
+                               risultato aggiorna la colonna "mix_file" e
+                               il log appena pronto
+      - on_done              : opzionale, chiamata senza argomenti a fine
+                               mix (solo se il mix è stato avviato)
+
+    Restituisce True se il mix è stato avviato.
     """
     base_dir = _extract_directory(lbl_or_var_directory)
 
@@ -260,7 +290,7 @@ def mix_files(lbl_or_var_directory,
             "Attenzione",
             "Directory di lavoro non valida.\nSeleziona una directory dalla GUI."
         )
-        return
+        return False
 
     prompt_string = entry_prompt.get("1.0", "end").strip()
     extensions_text = entry_extension.get()
@@ -270,7 +300,7 @@ def mix_files(lbl_or_var_directory,
             "Attenzione",
             "Specificare almeno una estensione per i file da mixare."
         )
-        return
+        return False
 
     extensions = _parse_extensions(extensions_text)
 
@@ -282,58 +312,189 @@ def mix_files(lbl_or_var_directory,
             "Errore",
             "Impossibile creare la directory 00_MixOutput:\n" + str(exc)
         )
-        return
+        return False
 
-        report_text.insert("end", "Inizio creazione dei file di mix...\n")
+    report_text.insert("end", "Inizio creazione dei file di mix...\n")
 
-    # Azzeriamo prima la colonna "mix_file" per tutte le righe
+    # Azzeriamo la colonna "mix_file" e prepariamo l'elenco dei lavori
+    # (item della tabella, subdirectory) leggendo la Treeview nel thread Tk
+    lavori = []
     items = tree.get_children()
     idx = 0
     while idx < len(items):
         item_id = items[idx]
+        idx = idx + 1
         try:
             tree.set(item_id, "mix_file", "")
         except Exception:
             # In caso di problemi non blocchiamo l'esecuzione
             pass
-        idx = idx + 1
-
-    # Ora creiamo i file di mix e aggiorniamo la tabella
-    items = tree.get_children()
-    idx = 0
-    while idx < len(items):
-        item_id = items[idx]
         values = tree.item(item_id, "values")
         if values and len(values) > 0:
             subdir = str(values[0]).strip()
             if subdir != "" and not subdir.startswith("00"):
-                msg, mix_path = create_mix_file(
-                    base_directory=base_dir,
-                    subdir=subdir,
-                    prompt_string=prompt_string,
-                    extensions=extensions,
-                    output_directory=output_directory,
-                    include_prompt=include_prompt,
-                    include_subdir=include_subdir,
+                lavori.append((item_id, subdir))
+
+    def _crea(subdir):
+        return create_mix_file(
+            base_directory=base_dir,
+            subdir=subdir,
+            prompt_string=prompt_string,
+            extensions=extensions,
+            output_directory=output_directory,
+            include_prompt=include_prompt,
+            include_subdir=include_subdir,
+        )
+
+    def _mostra_esito(item_id, msg, mix_path):
+        # Log dell'operazione
+        report_text.insert("end", msg)
+
+        # Se il file di mix è stato creato correttamente,
+        # aggiorniamo la colonna "mix_file" della riga corrispondente
+        if mix_path is not None and mix_path != "":
+            try:
+                tree.set(item_id, "mix_file", mix_path)
+            except Exception:
+                # Non blocchiamo in caso di errore sulla Treeview
+                pass
+
+    if not parallel:
+        k = 0
+        while k < len(lavori):
+            item_id, subdir = lavori[k]
+            k = k + 1
+            msg, mix_path, _esito = _crea(subdir)
+            _mostra_esito(item_id, msg, mix_path)
+
+        report_text.insert("end", "Creazione dei file di mix completata.\n")
+        report_text.see("end")
+        if on_done is not None:
+            on_done()
+        return True
+
+    # ------------------------------------------------------------------
+    # Mix in parallelo: i thread del pool non toccano Tk, i risultati
+    # passano da una coda letta con after()
+    # ------------------------------------------------------------------
+    coda = queue.Queue()
+    t0 = time.perf_counter()
+
+    def _esegui(lavoro):
+        item_id, subdir = lavoro
+        try:
+            msg, mix_path, esito = _crea(subdir)
+        except Exception as exc:
+            msg, mix_path, esito = "Errore durante il mix per " + subdir + ": " + str(exc) + "\n", None, None
+        coda.put((item_id, msg, mix_path, esito))
+
+    def _lavora():
+        try:
+            with ThreadPoolExecutor(max_workers=MIX_MAX_WORKERS) as pool:
+                list(pool.map(_esegui, lavori))
+        finally:
+            coda.put(None)
+
+    stato = {"creati": 0, "invariati": 0, "completati": 0}
+
+    def _leggi_coda():
+        while True:
+            try:
+                esito = coda.get_nowait()
+            except queue.Empty:
+                break
+
+            if esito is None:
+                report_text.insert(
+                    "end",
+                    "Creazione dei file di mix completata: "
+                    + str(stato["creati"])
+                    + " creati, "
+                    + str(stato["invariati"])
+                    + " invariati su "
+                    + str(len(lavori))
+                    + " in "
+                    + "{:.1f}".format(time.perf_counter() - t0)
+                    + " s.\n",
                 )
+                report_text.see("end")
+                if on_done is not None:
+                    on_done()
+                return
+
+            item_id, msg, mix_path, esito_mix = esito
+            stato["completati"] = stato["completati"] + 1
+            if esito_mix == MIX_CREATO:
+                stato["creati"] = stato["creati"] + 1
+            elif esito_mix == MIX_INVARIATO:
+                stato["invariati"] = stato["invariati"] + 1
+            _mostra_esito(item_id, msg, mix_path)
+            report_text.see("end")
 
-                # Log dell'operazione
-                report_text.insert("end", msg)
+        report_text.after(MIX_POLL_MS, _leggi_coda)
 
-                # Se il file di mix è stato creato correttamente,
-                # aggiorniamo la colonna "mix_file" della riga corrispondente
-                if mix_path is not None and mix_path != "":
-                    try:
-                        tree.set(item_id, "mix_file", mix_path)
-                    except Exception:
-                        # Non blocchiamo in caso di errore sulla Treeview
-                        pass
+    threading.Thread(target=_lavora, daemon=True).start()
+    report_text.after(MIX_POLL_MS, _leggi_coda)
+    return True
 
-        idx = idx + 1
 
-    report_text.insert("end", "Creazione dei file di mix completata.\n")
+def _mix_manifest_path(output_directory, subdir):
+    """
+    Percorso del manifest del mix di una subdirectory.
+    """
+    return os.path.join(output_directory, MIX_MANIFEST_DIR, subdir + "_mix.json")
 
-    report_text.see("end")
+
+def load_mix_manifest(output_directory, subdir):
+    """
+    Legge il manifest del mix di una subdirectory (None se assente o
+    non valido). Il manifest contiene:
+      - "ingressi": lista [percorso_relativo, dimensione, mtime_ns] dei file
+        mixati, nell'ordine del mix;
+      - "opzioni":  estensioni, include_prompt, include_subdir e sha256 del
+        prompt;
+      - "mix":      [dimensione, mtime_ns] del file di mix scritto.
+    """
+    try:
+        with open(_mix_manifest_path(output_directory, subdir), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except Exception:
+        return None
+    if not isinstance(manifest, dict) or manifest.get("versione") != MIX_MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def _write_mix_manifest(output_directory, subdir, manifest):
+    """
+    Scrive il manifest in modo atomico (file temporaneo + rename).
+    """
+    percorso = _mix_manifest_path(output_directory, subdir)
+    try:
+        os.makedirs(os.path.dirname(percorso), exist_ok=True)
+        tmp = percorso + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp, percorso)
+    except Exception:
+        # senza manifest il mix verrà semplicemente riscritto la prossima volta
+        pass
+
+
+def _mix_unchanged(mix_file_path, manifest, ingressi, opzioni):
+    """
+    True se il mix esistente corrisponde esattamente a ingressi e opzioni
+    registrati nel manifest e non è stato modificato dopo la scrittura.
+    """
+    if manifest is None:
+        return False
+    if manifest.get("ingressi") != ingressi or manifest.get("opzioni") != opzioni:
+        return False
+    try:
+        st = os.stat(mix_file_path)
+    except OSError:
+        return False
+    return manifest.get("mix") == [st.st_size, st.st_mtime_ns]
 
 
 def create_mix_file(base_directory,
@@ -342,7 +503,8 @@ def create_mix_file(base_directory,
                     extensions,
                     output_directory,
                     include_prompt,
-                    include_subdir):
+                    include_subdir,
+                    force=False):
     """
     Crea il file di mix per una specifica subdirectory (es. test01).
 
@@ -352,6 +514,13 @@ def create_mix_file(base_directory,
     - ESCLUDE SEMPRE i file PDF dal mix, anche se l'estensione '.pdf'
       è presente in 'extensions', per evitare di scrivere contenuto
       binario nel file di testo.
+    - Registra in 00_MixOutput/00_manifest/<subdir>_mix.json ingressi e
+      opzioni del mix: se nulla è cambiato (e force è False) il mix
+      esistente NON viene riscritto e la sua data di modifica resta
+      invariata (PDF e analisi di similarità possono contarci).
+
+    Restituisce (messaggio, percorso_mix, esito) con esito MIX_CREATO,
+    MIX_INVARIATO oppure None (nessun file o errore: percorso_mix None).
     """
     if not isinstance(extensions, list) and not isinstance(extensions, tuple):
         extensions = _parse_extensions(extensions)
@@ -406,6 +575,29 @@ def create_mix_file(base_directory,
                 if match:
                     files_to_mix.append(os.path.join(root, file_name))
 
+        # ingressi del mix, nell'ordine in cui verranno scritti
+        ingressi = []
+        z = 0
+        while z < len(files_to_mix):
+            file_path = files_to_mix[z]
+            z = z + 1
+            st = os.stat(file_path)
+            relativo = os.path.relpath(file_path, full_path).replace(os.sep, "/")
+            ingressi.append([relativo, st.st_size, st.st_mtime_ns])
+
+        prompt_hash = ""
+        if include_prompt and prompt_string:
+            prompt_hash = hashlib.sha256(
+                _normalize_text(prompt_string).encode("utf-8")
+            ).hexdigest()
+
+        opzioni = {
+            "estensioni": normalized_exts,
+            "include_prompt": bool(include_prompt),
+            "include_subdir": bool(include_subdir),
+            "prompt_sha256": prompt_hash,
+        }
+
         if len(files_to_mix) == 0:
             message = (
                 "Nessun file con estensioni "
@@ -414,7 +606,19 @@ def create_mix_file(base_directory,
                 + subdir
                 + " (sottocartelle '00*' escluse). File di mix NON creato.\n"
             )
-            return message, None
+            return message, None, None
+
+        if not force:
+            manifest = load_mix_manifest(output_directory, subdir)
+            if _mix_unchanged(mix_file_path, manifest, ingressi, opzioni):
+                message = (
+                    "File di mix invariato per "
+                    + subdir
+                    + " (nessun file modificato): "
+                    + mix_file_path
+                    + "\n"
+                )
+                return message, mix_file_path, MIX_INVARIATO
 
         with open(mix_file_path, "w", encoding="utf-8") as mix_file:
             # -------------------------------------------------------------
@@ -463,6 +667,19 @@ def create_mix_file(base_directory,
                 mix_file.write(os.path.basename(file_path) + "\n")
                 mix_file.write(content + "\n\n")
 
+        st_mix = os.stat(mix_file_path)
+        _write_mix_manifest(
+            output_directory,
+            subdir,
+            {
+                "versione": MIX_MANIFEST_VERSION,
+                "subdir": subdir,
+                "ingressi": ingressi,
+                "opzioni": opzioni,
+                "mix": [st_mix.st_size, st_mix.st_mtime_ns],
+            },
+        )
+
         message = (
             "File di mix creato per "
             + subdir
@@ -470,11 +687,11 @@ def create_mix_file(base_directory,
             + mix_file_path
             + "\n"
         )
-        return message, mix_file_path
+        return message, mix_file_path, MIX_CREATO
 
     except Exception as exc:
         message = "Errore durante il mix per " + subdir + ": " + str(exc) + "\n"
-        return message, None
+        return message, None, None
 
 def _add_header_to_page(page, header_text):
     """
@@ -1,23 +1,310 @@
 import os
+import re
+import json
+import hashlib
+import io
+import queue
+import tarfile
+import types
+import zipfile
 import shutil
+import string
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import filedialog, messagebox
 from datetime import datetime, timezone
 
-# Limiti delle cartelle test gestite dall'applicazione
+import utils  # file_sha256 (utils importa a sua volta questo modulo: uso solo a runtime)
+
+# Limiti predefiniti delle postazioni (cartelle test01..test30)
 TEST_MIN = 1
 TEST_MAX = 30
 
+# Thread per le scansioni delle cartelle test (su share SMB/NFS ogni stat è
+# un round trip di rete: le cartelle vengono visitate in parallelo)
+SCAN_MAX_WORKERS = 8
+
+# Report della scansione: righe per ogni inserimento nel widget Text e
+# numero di file oltre il quale (in automatico) si mostra solo il riepilogo
+REPORT_CHUNK_LINES = 2000
+REPORT_SUMMARY_THRESHOLD = 5000
+
+# Copia delle cartelle test: thread paralleli, dimensione dei blocchi,
+# intervallo di aggiornamento della GUI e file con gli errori
+COPY_MAX_WORKERS = 8
+COPY_CHUNK_SIZE = 1024 * 1024
+COPY_POLL_MS = 200
+COPY_ERRORS_FILE = "00_errori_copia.txt"
+SNAPSHOT_FILE = "00_snapshot.json"
+
+# Archivio compresso della raccolta: formati, manifest sha256 interno e
+# file in coda verso il thread dell'archivio (limita la memoria)
+ARCHIVE_FORMATS = ("zip", "tar.xz")
+ARCHIVE_MANIFEST_FILE = "00_manifest_sha256.txt"
+ARCHIVE_QUEUE_SIZE = 64
+PROGRESS_MARK = "smx_progresso"
+
+# Distribuzione di file/cartelle nelle cartelle test: file temporaneo
+# scritto accanto alla destinazione e rinominato dopo la verifica
+DISTRIBUTE_TMP_SUFFIX = ".smx_tmp"
+
+# Pulizia veloce delle cartelle test: il contenuto viene spostato (rename)
+# in una cartella cestino nella directory remota e cancellato in background
+TRASH_PREFIX = "00_cestino_SMX_"
+CLEAR_MAX_WORKERS = 8
+
+_copy_jobs = []
+_copy_jobs_lock = threading.Lock()
+
+# cestini in cancellazione da un job attivo (percorsi reali): un'altra
+# pulizia non li tratta come residui di pulizie interrotte
+_cestini_attivi = set()
+_cestini_lock = threading.Lock()
+
+# Pattern dei nomi delle cartelle test: {num} è il numero di postazione.
+# Più pattern separati da ";" vengono gestiti insieme (più laboratori
+# nella stessa sessione).
+FOLDER_PATTERN_DEFAULT = "test{num:02d}"
+FOLDER_PATTERNS_PRESET = [
+    "test{num:02d}",
+    "labA_test{num:02d}",
+    "test{num:02d}_labB",
+    "labA_test{num:02d}; labB_test{num:02d}",
+]
+
+
+# =============================================================================
+#  PATTERN DELLE CARTELLE TEST
+# =============================================================================
+
+def _compile_folder_pattern(pattern):
+    """
+    Compila un pattern tipo 'labA_test{num:02d}' in una regex che riconosce
+    i nomi di cartella e ne estrae il numero di postazione.
+    Solleva ValueError se il pattern non è valido.
+    """
+    regex = ""
+    campi = 0
+    for letterale, campo, formato, conversione in string.Formatter().parse(pattern):
+        regex += re.escape(letterale)
+        if campo is None:
+            continue
+        if campo != "num" or conversione:
+            raise ValueError(f"Campo non ammesso nel pattern: {{{campo}}}")
+        cifre = re.fullmatch(r"0?(\d*)d?", formato or "")
+        if cifre is None:
+            raise ValueError(f"Formato non ammesso nel pattern: {formato}")
+        minimo = int(cifre.group(1) or 1)
+        regex += r"(\d{%d,})" % minimo
+        campi += 1
+
+    if campi != 1:
+        raise ValueError(f"Il pattern deve contenere una sola volta {{num}}: {pattern}")
+
+    # verifica che il pattern produca nomi di cartella validi
+    esempio = pattern.format(num=1)
+    if not esempio or os.sep in esempio or "/" in esempio:
+        raise ValueError(f"Pattern non valido: {pattern}")
+
+    flags = re.IGNORECASE if sys.platform.startswith("win") else 0
+    return re.compile(regex, flags)
+
+
+def parse_folder_patterns(testo):
+    """
+    Divide una stringa 'patternA; patternB' nella lista dei pattern.
+    """
+    return [p.strip() for p in (testo or "").split(";") if p.strip()]
+
+
+def set_folder_patterns(patterns, seat_min=TEST_MIN, seat_max=TEST_MAX):
+    """
+    Imposta i pattern delle cartelle test e l'intervallo di postazioni
+    usati da tutte le funzioni del modulo (e da utils / frame_live).
+
+    patterns può essere una lista o una stringa con pattern separati da ";".
+    Solleva ValueError se i pattern o l'intervallo non sono validi
+    (la configurazione precedente resta attiva).
+    """
+    global _folder_patterns
+
+    if isinstance(patterns, str):
+        patterns = parse_folder_patterns(patterns)
+    if not patterns:
+        raise ValueError("Nessun pattern di cartella indicato.")
+
+    seat_min = int(seat_min)
+    seat_max = int(seat_max)
+    if seat_min < 0 or seat_max < seat_min:
+        raise ValueError(f"Intervallo di postazioni non valido: {seat_min}-{seat_max}")
+
+    compilati = [(p, _compile_folder_pattern(p)) for p in patterns]
+
+    # nomi attesi nell'ordine: pattern, poi numero di postazione
+    nomi = []
+    visti = set()
+    for p, _regex in compilati:
+        for num in range(seat_min, seat_max + 1):
+            nome = p.format(num=num)
+            if nome.lower() not in visti:
+                visti.add(nome.lower())
+                nomi.append(nome)
+
+    # sostituzione in un solo passo: i thread di scansione leggono sempre
+    # una configurazione coerente
+    _folder_patterns = {
+        "patterns": list(patterns),
+        "seat_min": seat_min,
+        "seat_max": seat_max,
+        "compiled": compilati,
+        "names": nomi,
+    }
+    return list(patterns)
+
+
+def get_folder_patterns():
+    """
+    Restituisce (lista_pattern, postazione_min, postazione_max) attivi.
+    """
+    conf = _folder_patterns
+    return list(conf["patterns"]), conf["seat_min"], conf["seat_max"]
+
+
+def expected_test_folder_names():
+    """
+    Nomi di tutte le cartelle test attese (anche se non ancora create),
+    nell'ordine dei pattern e delle postazioni.
+    """
+    return list(_folder_patterns["names"])
+
+
+def find_test_folders(base_directory):
+    """
+    Individua le cartelle test di base_directory con UN solo os.scandir
+    (invece di una stat per ogni nome possibile).
+
+    Restituisce la lista ordinata di (nome_cartella, percorso, esiste) per
+    tutte le cartelle attese: il percorso usa il nome presente su disco.
+    """
+    conf = _folder_patterns
+    trovate = {}
+
+    try:
+        with os.scandir(base_directory) as it:
+            for entry in it:
+                try:
+                    # un link a una cartella non è una cartella test
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                except OSError:
+                    continue
+                for pattern, regex in conf["compiled"]:
+                    m = regex.fullmatch(entry.name)
+                    if m is None:
+                        continue
+                    num = int(m.group(1))
+                    if conf["seat_min"] <= num <= conf["seat_max"]:
+                        nome = pattern.format(num=num)
+                        # scarta varianti come 'test001' per 'test{num:02d}'
+                        if nome.lower() == entry.name.lower():
+                            trovate[nome.lower()] = entry.path
+                    break
+    except OSError:
+        pass
+
+    risultato = []
+    for nome in conf["names"]:
+        percorso = trovate.get(nome.lower())
+        if percorso is None:
+            risultato.append((nome, os.path.join(base_directory, nome), False))
+        else:
+            risultato.append((nome, percorso, True))
+    return risultato
+
 
 def _iter_test_folders(base_directory):
     """
-    Generatore di coppie (nome_cartella, percorso_assoluto) per test01..test30.
+    Generatore di coppie (nome_cartella, percorso_assoluto) per le sole
+    cartelle test ESISTENTI secondo i pattern configurati.
     Serve per essere sicuri di intervenire SOLO su queste cartelle.
     """
-    for i in range(TEST_MIN, TEST_MAX + 1):
-        folder_name = f"test{str(i).zfill(2)}"
-        folder_path = os.path.join(base_directory, folder_name)
-        yield folder_name, folder_path
+    for folder_name, folder_path, exists in find_test_folders(base_directory):
+        if exists:
+            yield folder_name, folder_path
+
+
+_folder_patterns = None
+set_folder_patterns([FOLDER_PATTERN_DEFAULT])
+
+
+def walk_files_with_stat(folder_path, dirs=None):
+    """
+    Come os.walk, ma restituisce direttamente la lista dei file
+    [(root, nome_file, stat_result)] usando os.scandir: la stat arriva dalla
+    voce di directory (su Windows senza ulteriori accessi al disco/rete).
+    L'ordine è lo stesso di os.walk (top-down); come os.walk, i link
+    simbolici a cartelle non vengono seguiti (e non compaiono tra i file).
+    Se `dirs` è una lista, vi vengono aggiunte le sottocartelle incontrate.
+    """
+    results = []
+    try:
+        with os.scandir(folder_path) as it:
+            entries = list(it)
+    except OSError:
+        return results
+
+    subdirs = []
+    for entry in entries:
+        try:
+            # come os.walk (followlinks=False): i link a cartelle non vengono
+            # seguiti (un link a '..' o '/' porterebbe fuori dalla cartella test)
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+                continue
+            if entry.is_symlink() and entry.is_dir():
+                continue
+            results.append((folder_path, entry.name, entry.stat()))
+        except OSError:
+            continue
+
+    for subdir in subdirs:
+        if dirs is not None:
+            dirs.append(subdir)
+        results.extend(walk_files_with_stat(subdir, dirs))
+
+    return results
+
+
+def map_test_folders(base_directory, func, only_folders=None, max_workers=SCAN_MAX_WORKERS):
+    """
+    Esegue func(folder_name, folder_path) sulle cartelle test esistenti in
+    parallelo (pool di max_workers thread).
+
+    Restituisce, nell'ordine dei pattern configurati, la lista di
+    (folder_name, folder_path, risultato) con risultato None per le cartelle
+    mancanti. `only_folders` limita l'elaborazione ai nomi indicati.
+    """
+    folders = [
+        (folder_name, folder_path, exists)
+        for folder_name, folder_path, exists in find_test_folders(base_directory)
+        if only_folders is None or folder_name in only_folders
+    ]
+
+    def _run(folder):
+        folder_name, folder_path, exists = folder
+        if not exists:
+            return None
+        return func(folder_name, folder_path)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        results = list(pool.map(_run, folders))
+
+    return [
+        (folder_name, folder_path, result)
+        for (folder_name, folder_path, _exists), result in zip(folders, results)
+    ]
 
 
 def _sanitize_verifica_name(nome: str) -> str:
@@ -37,63 +324,860 @@ def _sanitize_verifica_name(nome: str) -> str:
     return "".join(allowed)
 
 
-def scan_test_folders(remote_directory, report_text):
+def _build_scan_report(job):
+    """
+    Eseguita nel thread della scansione: visita le cartelle test e prepara
+    in memoria le righe del report (nessun accesso a Tk).
+    """
+    def _visita(_name, folder_path):
+        dirs = []
+        files = walk_files_with_stat(folder_path, dirs)
+        with job["lock"]:
+            job["cartelle_fatte"] += 1
+            job["file_trovati"] += len(files)
+        return files, dirs
+
+    try:
+        scansione = map_test_folders(job["sorgente"], _visita)
+    except Exception as e:
+        scansione = []
+        job["righe"].append(f"Errore durante la scansione: {e}")
+
+    totale_file = 0
+    for _name, _path, risultato in scansione:
+        if risultato is not None:
+            totale_file += len(risultato[0])
+
+    solo_riepilogo = job["solo_riepilogo"]
+    if solo_riepilogo is None:
+        solo_riepilogo = totale_file > REPORT_SUMMARY_THRESHOLD
+    job["solo_riepilogo"] = solo_riepilogo
+
+    righe = job["righe"]
+    presenti = 0
+    for folder_name, _folder_path, risultato in scansione:
+        if risultato is None:
+            righe.append(f"[MANCANTE] {folder_name}")
+            continue
+
+        presenti += 1
+        files, _dirs = risultato
+        if solo_riepilogo:
+            byte_totali = 0
+            ultima = 0
+            for _root, _file, st in files:
+                byte_totali += st.st_size
+                if st.st_mtime > ultima:
+                    ultima = st.st_mtime
+            testo = f"[OK] {folder_name}: {len(files)} file, {_format_bytes(byte_totali)}"
+            if ultima:
+                testo += f", ultima modifica {datetime.fromtimestamp(ultima):%Y-%m-%d %H:%M}"
+            righe.append(testo)
+            continue
+
+        righe.append(f"[OK] {folder_name}")
+        for _root, file, st in files:
+            creation_time = datetime.fromtimestamp(st.st_ctime, tz=timezone.utc)
+            righe.append(f"  - {file} (Creato il: {creation_time})")
+
+    righe.append("")
+    righe.append(
+        f"Cartelle test presenti: {presenti}/{len(scansione)}, file totali: {totale_file}"
+        + (" (solo riepilogo)" if solo_riepilogo else "")
+    )
+    job["scansione"] = scansione
+
+
+def _run_scan_job(job):
+    t0 = time.perf_counter()
+    try:
+        _build_scan_report(job)
+    finally:
+        job["durata"] = time.perf_counter() - t0
+        job["finito"].set()
+
+
+def start_scan_job(remote_directory, summary_only=None):
+    """
+    Avvia in un thread la scansione delle cartelle test di remote_directory.
+
+    Il report viene preparato in memoria (job["righe"]) usando le stat delle
+    voci di os.scandir; job["scansione"] contiene, nell'ordine delle
+    cartelle attese, (folder_name, folder_path, (files, dirs) o None).
+    summary_only: True / False, oppure None per il solo riepilogo
+    automatico oltre REPORT_SUMMARY_THRESHOLD file.
+    """
+    job = {
+        "sorgente": remote_directory,
+        "solo_riepilogo": summary_only,
+        "lock": threading.Lock(),
+        "finito": threading.Event(),
+        "cartelle_fatte": 0,
+        "file_trovati": 0,
+        "righe": [],
+        "scansione": [],
+        "durata": 0.0,
+    }
+    threading.Thread(target=_run_scan_job, args=(job,), daemon=True).start()
+    return job
+
+
+def _insert_lines_batched(report_text, righe, on_done=None):
+    """
+    Inserisce le righe nel widget Text a blocchi di REPORT_CHUNK_LINES,
+    un blocco per giro del mainloop (la GUI resta reattiva).
     """
-    Scansiona le cartelle test01..test30 nella directory remota indicata e
+    def _blocco(inizio):
+        try:
+            blocco = righe[inizio:inizio + REPORT_CHUNK_LINES]
+            if blocco:
+                report_text.insert("end", "\n".join(blocco) + "\n")
+        except Exception:
+            return
+        if inizio + REPORT_CHUNK_LINES < len(righe):
+            report_text.after(1, _blocco, inizio + REPORT_CHUNK_LINES)
+            return
+        report_text.see("end")
+        if on_done is not None:
+            on_done()
+
+    _blocco(0)
+
+
+def scan_test_folders(remote_directory, report_text, summary_only=None, on_done=None):
+    """
+    Scansiona le cartelle test (pattern configurati) nella directory remota indicata e
     scrive nel report:
       - quali cartelle sono presenti/mancanti
-      - per quelle presenti, elenca i file con la data di creazione.
+      - per quelle presenti, elenca i file con la data di creazione
+        (oppure, in modalità solo riepilogo, numero di file, dimensione
+        e ultima modifica).
+
+    La scansione gira in background (start_scan_job) e il report arriva nel
+    widget in pochi blocchi; alla fine viene chiamata on_done(job).
+    Restituisce il job, o None se la directory non esiste.
     """
     report_text.delete("1.0", "end")
+    report_text.mark_unset(PROGRESS_MARK)
 
     if not os.path.exists(remote_directory):
         messagebox.showerror("Errore", "La directory specificata non esiste.")
-        return
+        return None
 
     report_text.insert("end", f"Controllo nelle cartelle test di:\n  {remote_directory}\n\n")
 
-    for folder_name, folder_path in _iter_test_folders(remote_directory):
-        if os.path.isdir(folder_path):
-            report_text.insert("end", f"[OK] {folder_name}\n")
-            for root, dirs, files in os.walk(folder_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    creation_time = datetime.fromtimestamp(
-                        os.path.getctime(file_path), tz=timezone.utc
-                    )
-                    report_text.insert(
-                        "end",
-                        f"  - {file} (Creato il: {creation_time})\n",
-                    )
+    job = start_scan_job(remote_directory, summary_only)
+    totale_cartelle = len(expected_test_folder_names())
+
+    def _avanzamento(job):
+        with job["lock"]:
+            testo = "Scansione in corso: {}/{} cartelle, {} file...".format(
+                job["cartelle_fatte"], totale_cartelle, job["file_trovati"]
+            )
+        _write_progress_line(report_text, testo)
+
+    def _fine(job):
+        try:
+            report_text.delete(PROGRESS_MARK, f"{PROGRESS_MARK} +1 lines")
+            report_text.mark_unset(PROGRESS_MARK)
+        except Exception:
+            pass
+        if on_done is not None:
+            _insert_lines_batched(report_text, job["righe"], lambda: on_done(job))
         else:
-            report_text.insert("end", f"[MANCANTE] {folder_name}\n")
+            _insert_lines_batched(report_text, job["righe"])
 
-    report_text.see("end")
+    _write_progress_line(report_text, "Scansione in corso...")
+    follow_copy_job(report_text, job, _avanzamento, _fine)
+    return job
 
 
-def _copy_test_folders(remote_directory, target_root, report_text=None):
+# =============================================================================
+#  MOTORE DI COPIA DELLE CARTELLE TEST
+# =============================================================================
+
+def _format_bytes(num_bytes):
+    """
+    Converte byte in stringa leggibile.
     """
-    Copia tutte le cartelle test01..test30 esistenti da remote_directory
-    dentro target_root (mantenendo i nomi delle cartelle).
+    unita = ["B", "KB", "MB", "GB", "TB"]
+    valore = float(num_bytes)
+    indice = 0
+    while valore >= 1024.0 and indice < len(unita) - 1:
+        valore = valore / 1024.0
+        indice = indice + 1
+    if indice == 0:
+        return f"{int(valore)} {unita[indice]}"
+    return f"{valore:.1f} {unita[indice]}"
+
+
+def _plan_copy(remote_directory, target_root):
+    """
+    Elenca in anticipo (in parallelo per cartella test) tutto ciò che va copiato.
+
+    Restituisce (cartelle, directory, file):
+      - cartelle:  nomi delle cartelle test trovate
+      - directory: [(src_dir, dest_dir)] in ordine top-down
+      - file:      [(src, dest, stat_result)]
+    """
+    def _elenca(_folder_name, folder_path):
+        dirs = []
+        files = walk_files_with_stat(folder_path, dirs)
+        return dirs, files
+
+    cartelle = []
+    directory = []
+    file = []
 
-    Restituisce la lista delle cartelle effettivamente copiate.
+    for folder_name, folder_path, risultato in map_test_folders(remote_directory, _elenca):
+        if risultato is None:
+            continue
+        dirs, files = risultato
+        dest_base = os.path.join(target_root, folder_name)
+
+        cartelle.append(folder_name)
+        directory.append((folder_path, dest_base))
+        for d in dirs:
+            directory.append((d, os.path.join(dest_base, os.path.relpath(d, folder_path))))
+        for root, nome, st in files:
+            src = os.path.join(root, nome)
+            file.append((src, os.path.join(dest_base, os.path.relpath(src, folder_path)), st))
+
+    return cartelle, directory, file
+
+
+def _copy_one_file(job, src, dest):
     """
-    copied = []
+    Copia un file a blocchi aggiornando i byte copiati del job e calcolando
+    lo sha256 durante la lettura (per il manifest dello snapshot).
+    Restituisce lo sha256, None se la copia è stata annullata (file parziale
+    rimosso).
+    """
+    completato = False
+    scritti = 0
+    h = hashlib.sha256()
+
+    # un file già presente potrebbe essere un hardlink di uno snapshot
+    # precedente: va sostituito, non riscritto
+    if os.path.lexists(dest):
+        os.remove(dest)
 
-    for folder_name, src in _iter_test_folders(remote_directory):
-        if os.path.exists(src):
-            dest = os.path.join(target_root, folder_name)
+    try:
+        with open(src, "rb") as fin, open(dest, "wb") as fout:
+            while True:
+                if job["stop"].is_set():
+                    return None
+                pezzo = fin.read(COPY_CHUNK_SIZE)
+                if not pezzo:
+                    break
+                fout.write(pezzo)
+                h.update(pezzo)
+                scritti += len(pezzo)
+                with job["lock"]:
+                    job["byte_fatti"] += len(pezzo)
+        shutil.copystat(src, dest)
+        completato = True
+        return h.hexdigest()
+    finally:
+        if not completato:
+            with job["lock"]:
+                job["byte_fatti"] -= scritti
             try:
-                shutil.copytree(src, dest, dirs_exist_ok=True)
-                copied.append(folder_name)
+                os.remove(dest)
+            except OSError:
+                pass
+
+
+def _snapshot_key(target_root, dest):
+    """
+    Chiave del manifest: percorso relativo alla radice della copia, con '/'.
+    """
+    return os.path.relpath(dest, target_root).replace(os.sep, "/")
+
+
+def _load_snapshot(directory):
+    """
+    Manifest 00_snapshot.json di una copia precedente (None se assente/illeggibile).
+    """
+    try:
+        with open(os.path.join(directory, SNAPSHOT_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get("file"), dict):
+            return manifest
+    except Exception:
+        pass
+    return None
+
+
+def find_previous_snapshot(parent_directory, remote_directory, exclude=None):
+    """
+    Cerca in parent_directory la copia più recente (con 00_snapshot.json)
+    della stessa directory remota. Le copie annullate o con errori
+    ("completo": false) non vengono considerate.
+    Restituisce (percorso, manifest) oppure (None, None).
+    """
+    sorgente = os.path.normcase(os.path.abspath(remote_directory))
+    candidati = []
+
+    try:
+        with os.scandir(parent_directory) as it:
+            for entry in it:
+                if exclude is not None and os.path.abspath(entry.path) == os.path.abspath(exclude):
+                    continue
+                try:
+                    if not entry.is_dir():
+                        continue
+                    st = os.stat(os.path.join(entry.path, SNAPSHOT_FILE))
+                except OSError:
+                    continue
+                candidati.append((st.st_mtime, entry.path))
+    except OSError:
+        return None, None
+
+    # dal più recente: si legge solo il manifest necessario
+    for _mtime, percorso in sorted(candidati, reverse=True):
+        manifest = _load_snapshot(percorso)
+        if manifest is None or manifest.get("completo") is False:
+            continue
+        if os.path.normcase(os.path.abspath(manifest.get("sorgente", ""))) == sorgente:
+            return percorso, manifest
+
+    return None, None
+
+
+def _link_from_previous(job, src, dest, st, chiave):
+    """
+    Se il file è invariato rispetto allo snapshot precedente (dimensione e
+    mtime, più sha256 se richiesto) crea un hardlink al file già copiato.
+    Restituisce lo sha256 noto ("" se assente) oppure None se va copiato.
+    """
+    precedente = job["precedente"]
+    if precedente is None:
+        return None
+
+    voce = precedente["manifest"]["file"].get(chiave)
+    if voce is None or voce[0] != st.st_size or voce[1] != st.st_mtime_ns:
+        return None
+
+    sha = voce[2] if len(voce) > 2 else None
+    if job["verifica_hash"]:
+        if not sha or utils.file_sha256(src) != sha:
+            return None
+
+    origine = os.path.join(precedente["radice"], *chiave.split("/"))
+    try:
+        if os.path.lexists(dest):
+            os.remove(dest)
+        os.link(origine, dest)
+    except OSError:
+        # filesystem senza hardlink o snapshot precedente modificato: si copia
+        return None
+
+    return sha or ""
+
+
+def _write_snapshot(job):
+    """
+    Scrive (in modo atomico) il manifest 00_snapshot.json della copia:
+    per ogni file dimensione, mtime_ns della sorgente e sha256.
+    """
+    manifest = {
+        "sorgente": job["sorgente"],
+        "creato": datetime.now().isoformat(timespec="seconds"),
+        "precedente": job["precedente"]["radice"] if job["precedente"] else None,
+        "completo": not job["annullata"] and not job["errori"],
+        "file": job["manifest"],
+    }
+    percorso = os.path.join(job["destinazione"], SNAPSHOT_FILE)
+    try:
+        tmp = percorso + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, percorso)
+    except Exception:
+        pass
+
+
+def _write_copy_errors(job):
+    """
+    Scrive l'elenco degli errori nella cartella di destinazione.
+    """
+    try:
+        percorso = os.path.join(job["destinazione"], COPY_ERRORS_FILE)
+        with open(percorso, "w", encoding="utf-8") as f:
+            f.write(f"Copia da {job['sorgente']} del {datetime.now():%Y-%m-%d %H:%M:%S}\n")
+            f.write(f"{len(job['errori'])} errori:\n\n")
+            for src, errore in job["errori"]:
+                f.write(f"{src}\n    {errore}\n")
+    except Exception:
+        pass
+
+
+def _archive_add(job, formato, archivio, percorso, arcname, st):
+    """
+    Aggiunge un file all'archivio leggendolo a blocchi (memoria limitata);
+    restituisce lo sha256 del contenuto scritto.
+    Gli errori di apertura sono del singolo file; quelli a metà scrittura
+    rendono l'archivio inutilizzabile e vengono rilanciati come RuntimeError.
+    """
+    h = hashlib.sha256()
+    fin = open(percorso, "rb")
+    try:
+        if formato == "zip":
+            info = zipfile.ZipInfo.from_file(percorso, arcname, strict_timestamps=False)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            try:
+                with archivio.open(info, "w", force_zip64=True) as fout:
+                    while True:
+                        pezzo = fin.read(COPY_CHUNK_SIZE)
+                        if not pezzo:
+                            break
+                        fout.write(pezzo)
+                        h.update(pezzo)
+                        with job["lock"]:
+                            job["byte_archiviati"] += len(pezzo)
             except Exception as e:
-                if report_text is not None:
-                    report_text.insert(
-                        "end",
-                        f"Errore durante la copia di {src} -> {dest}: {e}\n",
-                    )
+                raise RuntimeError(f"archivio interrotto su {percorso}: {e}")
+        else:
+            # dimensione e data dal file aperto, non dalla stat dell'elenco:
+            # il file può essere stato salvato di nuovo nel frattempo
+            st_aperto = os.fstat(fin.fileno())
+            info = tarfile.TarInfo(arcname)
+            info.size = st_aperto.st_size
+            info.mtime = st_aperto.st_mtime
+            info.mode = st_aperto.st_mode & 0o7777
+            stato = {"rimanenti": st_aperto.st_size, "troncato": False}
+
+            # tarfile chiama solo read(n): lettore che aggiorna hash e
+            # avanzamento e restituisce esattamente info.size byte (un file
+            # accorciato nel frattempo viene completato con zeri e segnalato)
+            def _leggi(n=-1):
+                if n is None or n < 0 or n > stato["rimanenti"]:
+                    n = stato["rimanenti"]
+                pezzo = fin.read(n)
+                if len(pezzo) < n:
+                    stato["troncato"] = True
+                    pezzo = pezzo + bytes(n - len(pezzo))
+                stato["rimanenti"] -= len(pezzo)
+                h.update(pezzo)
+                with job["lock"]:
+                    job["byte_archiviati"] += len(pezzo)
+                return pezzo
+
+            try:
+                archivio.addfile(info, fileobj=types.SimpleNamespace(read=_leggi))
+            except Exception as e:
+                raise RuntimeError(f"archivio interrotto su {percorso}: {e}")
+            if stato["troncato"]:
+                # nessuna riga di manifest per un contenuto non affidabile
+                raise OSError("file accorciato durante l'archiviazione: contenuto nell'archivio non valido")
+    finally:
+        fin.close()
+
+    return h.hexdigest()
+
+
+def _archive_add_text(formato, archivio, arcname, testo):
+    dati = testo.encode("utf-8")
+    if formato == "zip":
+        archivio.writestr(arcname, dati)
+    else:
+        info = tarfile.TarInfo(arcname)
+        info.size = len(dati)
+        info.mtime = time.time()
+        archivio.addfile(info, fileobj=io.BytesIO(dati))
+
+
+def _archive_writer(job):
+    """
+    Thread di scrittura dell'archivio: consuma la coda (limitata) di
+    (percorso, chiave, stat) fino a None. L'archivio viene scritto in un
+    file temporaneo e rinominato solo se completo.
+    """
+    arch = job["archivio"]
+    formato = arch["formato"]
+    radice = os.path.basename(os.path.normpath(job["destinazione"]))
+    tmp = arch["percorso"] + ".tmp"
+    archivio = None
+    righe_manifest = []
+
+    try:
+        if formato == "zip":
+            archivio = zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+        else:
+            archivio = tarfile.open(tmp, "w:xz")
+    except Exception as e:
+        arch["errore"] = str(e)
+
+    while True:
+        voce = arch["coda"].get()
+        if voce is None:
+            break
+        # anche dopo un errore la coda va svuotata (i produttori non si bloccano)
+        if arch["errore"] is not None or job["stop"].is_set():
+            continue
+        percorso, chiave, st = voce
+        try:
+            sha = _archive_add(job, formato, archivio, percorso, radice + "/" + chiave, st)
+            righe_manifest.append(f"{sha}  {chiave}\n")
+            with job["lock"]:
+                job["file_archiviati"] += 1
+        except RuntimeError as e:
+            arch["errore"] = str(e)
+        except Exception as e:
+            with job["lock"]:
+                job["errori"].append((percorso, str(e)))
+
+    if archivio is None:
+        return
+
+    try:
+        if arch["errore"] is None and not job["stop"].is_set():
+            # manifest verificabile con: sha256sum -c 00_manifest_sha256.txt
+            _archive_add_text(formato, archivio, radice + "/" + ARCHIVE_MANIFEST_FILE, "".join(righe_manifest))
+            if job["errori"]:
+                testo = "".join(f"{src}\n    {errore}\n" for src, errore in job["errori"])
+                _archive_add_text(formato, archivio, radice + "/" + COPY_ERRORS_FILE, testo)
+        archivio.close()
+    except Exception as e:
+        arch["errore"] = str(e)
+
+    if arch["errore"] is None and not job["stop"].is_set():
+        os.replace(tmp, arch["percorso"])
+    else:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def _run_copy_job(job):
+    t0 = time.perf_counter()
+
+    try:
+        cartelle, directory, file = _plan_copy(job["sorgente"], job["destinazione"])
+    except Exception as e:
+        cartelle, directory, file = [], [], []
+        job["errori"].append((job["sorgente"], str(e)))
+
+    with job["lock"]:
+        job["cartelle"] = cartelle
+        job["file_totali"] = len(file)
+        job["byte_totali"] = sum(st.st_size for _src, _dest, st in file)
+        job["fase"] = "copia"
+
+    arch = job["archivio"]
+    if arch is not None:
+        arch["thread"] = threading.Thread(target=_archive_writer, args=(job,), daemon=True)
+        arch["thread"].start()
+
+    if job["copia_file"]:
+        for src_dir, dest_dir in directory:
+            try:
+                os.makedirs(dest_dir, exist_ok=True)
+            except Exception as e:
+                with job["lock"]:
+                    job["errori"].append((src_dir, str(e)))
+
+    def _archivia(percorso, chiave, st):
+        # coda limitata: se l'archivio è più lento, le copie aspettano
+        if arch is not None:
+            arch["coda"].put((percorso, chiave, st))
 
-    return copied
+    def _copia(voce):
+        src, dest, st = voce
+        if job["stop"].is_set():
+            return
+        chiave = _snapshot_key(job["destinazione"], dest)
+        try:
+            sha = _link_from_previous(job, src, dest, st, chiave)
+            if sha is not None:
+                with job["lock"]:
+                    job["file_fatti"] += 1
+                    job["file_collegati"] += 1
+                    job["byte_fatti"] += st.st_size
+                    job["manifest"][chiave] = [st.st_size, st.st_mtime_ns, sha or None]
+                _archivia(dest, chiave, st)
+                return
+
+            sha = _copy_one_file(job, src, dest)
+            if sha is not None:
+                with job["lock"]:
+                    job["file_fatti"] += 1
+                    job["manifest"][chiave] = [st.st_size, st.st_mtime_ns, sha]
+                # l'archivio legge la copia locale: la sorgente non viene riletta
+                _archivia(dest, chiave, st)
+        except Exception as e:
+            with job["lock"]:
+                job["errori"].append((src, str(e)))
+
+    if job["copia_file"]:
+        with ThreadPoolExecutor(max_workers=max(1, job["max_workers"])) as pool:
+            list(pool.map(_copia, file))
+
+        # date/permessi delle cartelle dopo i file (la copia dei file le altera)
+        for src_dir, dest_dir in reversed(directory):
+            try:
+                shutil.copystat(src_dir, dest_dir)
+            except Exception:
+                pass
+    else:
+        # solo archivio: i file vanno in coda direttamente dalla sorgente
+        for src, dest, st in file:
+            if job["stop"].is_set():
+                break
+            _archivia(src, _snapshot_key(job["destinazione"], dest), st)
+
+    if arch is not None:
+        arch["coda"].put(None)
+        arch["thread"].join()
+        if arch["errore"] is not None:
+            job["errori"].append((arch["percorso"], arch["errore"]))
+
+    job["annullata"] = job["stop"].is_set()
+    job["durata"] = time.perf_counter() - t0
+    if job["copia_file"] and job["cartelle"]:
+        _write_snapshot(job)
+    if job["copia_file"] and job["errori"]:
+        _write_copy_errors(job)
+
+    with _copy_jobs_lock:
+        if job in _copy_jobs:
+            _copy_jobs.remove(job)
+    job["fase"] = "fine"
+    job["finito"].set()
+
+
+def start_copy_job(
+    remote_directory,
+    target_root,
+    max_workers=COPY_MAX_WORKERS,
+    previous_snapshot=None,
+    verify_hash=False,
+    archive_format=None,
+    copy_files=True,
+):
+    """
+    Avvia in un thread la copia delle cartelle test di remote_directory in
+    target_root: prima elenca tutti i file, poi li copia con un pool di
+    max_workers thread (su share di rete le copie si sovrappongono).
+
+    Copia incrementale: se previous_snapshot è una copia precedente (con
+    00_snapshot.json), i file invariati (dimensione e mtime, più sha256 con
+    verify_hash) vengono collegati con un hardlink invece di essere copiati.
+    Ogni copia scrive il proprio 00_snapshot.json.
+
+    Archivio: con archive_format "zip" o "tar.xz" i file vengono anche
+    scritti, a blocchi, nell'archivio <target_root>.zip / .tar.xz (con un
+    manifest sha256 interno). Con copy_files=False si crea solo l'archivio,
+    leggendo direttamente la sorgente (target_root non viene creata).
+
+    Restituisce il job (dizionario) da passare a follow_copy_job /
+    format_copy_progress / format_copy_summary; job["stop"].set() annulla.
+    """
+    precedente = None
+    if previous_snapshot:
+        manifest = _load_snapshot(previous_snapshot)
+        if manifest is not None:
+            precedente = {"radice": previous_snapshot, "manifest": manifest}
+
+    archivio = None
+    if archive_format:
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Formato di archivio non supportato: {archive_format}")
+        archivio = {
+            "formato": archive_format,
+            "percorso": os.path.normpath(target_root) + "." + archive_format,
+            "coda": queue.Queue(maxsize=ARCHIVE_QUEUE_SIZE),
+            "thread": None,
+            "errore": None,
+        }
+    if not copy_files and archivio is None:
+        raise ValueError("Senza copia dei file serve un formato di archivio.")
+
+    job = {
+        "sorgente": remote_directory,
+        "destinazione": target_root,
+        "max_workers": max_workers,
+        "copia_file": copy_files,
+        "archivio": archivio,
+        "file_archiviati": 0,
+        "byte_archiviati": 0,
+        "precedente": precedente,
+        "verifica_hash": verify_hash,
+        "file_collegati": 0,
+        "manifest": {},
+        "lock": threading.Lock(),
+        "stop": threading.Event(),
+        "finito": threading.Event(),
+        "fase": "elenco",
+        "cartelle": [],
+        "file_totali": 0,
+        "byte_totali": 0,
+        "file_fatti": 0,
+        "byte_fatti": 0,
+        "errori": [],
+        "annullata": False,
+        "durata": 0.0,
+    }
+
+    with _copy_jobs_lock:
+        _copy_jobs.append(job)
+
+    threading.Thread(target=_run_copy_job, args=(job,), daemon=True).start()
+    return job
+
+
+def cancel_copy_jobs():
+    """
+    Annulla tutte le copie in corso.
+    """
+    with _copy_jobs_lock:
+        for job in _copy_jobs:
+            job["stop"].set()
+
+
+def copy_jobs_running():
+    """
+    True se c'è almeno una copia in corso.
+    """
+    with _copy_jobs_lock:
+        return len(_copy_jobs) > 0
+
+
+def format_copy_progress(job):
+    """
+    Riga di avanzamento: file e byte copiati sul totale.
+    """
+    with job["lock"]:
+        if job["fase"] == "elenco":
+            return "Elenco dei file da copiare..."
+        parti = []
+        if job["copia_file"]:
+            parti.append(
+                "Copia in corso: {}/{} file, {} / {}".format(
+                    job["file_fatti"],
+                    job["file_totali"],
+                    _format_bytes(job["byte_fatti"]),
+                    _format_bytes(job["byte_totali"]),
+                )
+            )
+        if job["archivio"] is not None:
+            parti.append(
+                "Archivio {}: {}/{} file, {}".format(
+                    job["archivio"]["formato"],
+                    job["file_archiviati"],
+                    job["file_totali"],
+                    _format_bytes(job["byte_archiviati"]),
+                )
+            )
+        testo = " — ".join(parti)
+        if job["stop"].is_set():
+            testo = testo + " (annullamento...)"
+        return testo
+
+
+def format_copy_summary(job, max_errori=20):
+    """
+    Riepilogo finale della copia, con l'elenco (troncato) degli errori.
+    """
+    righe = []
+    if job["annullata"]:
+        righe.append("COPIA ANNULLATA.")
+    if job["copia_file"]:
+        righe.append(
+            "Copiati {}/{} file ({}) in {:.1f} s.".format(
+                job["file_fatti"],
+                job["file_totali"],
+                _format_bytes(job["byte_fatti"]),
+                job["durata"],
+            )
+        )
+    arch = job["archivio"]
+    if arch is not None:
+        if arch["errore"] is None and not job["annullata"]:
+            righe.append(
+                "Archivio {}: {} file ({} non compressi), manifest {} incluso.".format(
+                    arch["percorso"],
+                    job["file_archiviati"],
+                    _format_bytes(job["byte_archiviati"]),
+                    ARCHIVE_MANIFEST_FILE,
+                )
+            )
+        else:
+            righe.append("Archivio NON creato.")
+    if job["precedente"] is not None:
+        righe.append(
+            "Copia incrementale da {}: {} file invariati collegati, {} copiati.".format(
+                job["precedente"]["radice"],
+                job["file_collegati"],
+                job["file_fatti"] - job["file_collegati"],
+            )
+        )
+
+    if job["errori"]:
+        righe.append(f"ERRORI ({len(job['errori'])}):")
+        for src, errore in job["errori"][:max_errori]:
+            righe.append(f"  - {src}: {errore}")
+        if len(job["errori"]) > max_errori:
+            righe.append(f"  ... altri {len(job['errori']) - max_errori} errori")
+        if job["copia_file"]:
+            righe.append(f"Elenco completo in {os.path.join(job['destinazione'], COPY_ERRORS_FILE)}")
+        else:
+            righe.append(f"Elenco completo in {COPY_ERRORS_FILE} nell'archivio")
+
+    return "\n".join(righe)
+
+
+def follow_copy_job(widget, job, on_progress=None, on_done=None):
+    """
+    Segue il job dal thread Tk con widget.after(): chiama on_progress(job)
+    a ogni controllo e on_done(job) alla fine.
+    """
+    def _controlla():
+        if job["finito"].is_set():
+            if on_done is not None:
+                on_done(job)
+            return
+        if on_progress is not None:
+            on_progress(job)
+        widget.after(COPY_POLL_MS, _controlla)
+
+    widget.after(COPY_POLL_MS, _controlla)
+
+
+def _write_progress_line(report_text, testo):
+    """
+    Scrive (o riscrive sul posto) una riga di avanzamento nel report.
+    """
+    try:
+        if PROGRESS_MARK not in report_text.mark_names():
+            report_text.mark_set(PROGRESS_MARK, "end-1c")
+            report_text.mark_gravity(PROGRESS_MARK, "left")
+            report_text.insert("end", testo + "\n")
+        else:
+            report_text.delete(PROGRESS_MARK, f"{PROGRESS_MARK} lineend")
+            report_text.insert(PROGRESS_MARK, testo)
+        report_text.see("end")
+    except Exception:
+        pass
+
+
+def _copy_test_folders(remote_directory, target_root, report_text=None):
+    """
+    Copia tutte le cartelle test esistenti da remote_directory
+    dentro target_root (mantenendo i nomi delle cartelle), attendendo
+    la fine della copia.
+
+    Restituisce la lista delle cartelle copiate.
+    """
+    job = start_copy_job(remote_directory, target_root)
+    job["finito"].wait()
+
+    if report_text is not None and job["errori"]:
+        report_text.insert("end", format_copy_summary(job) + "\n")
+
+    return job["cartelle"]
 
 
 def create_local_copy(
@@ -103,22 +1187,37 @@ def create_local_copy(
     update_directory_listing_func,
     update_subdirectories_list_func,
     nome_verifica=None,
+    on_done=None,
+    incremental=False,
+    verify_hash=False,
+    archive_format=None,
+    archive_only=False,
 ):
     """
-    Crea una copia locale delle cartelle test01..test30 presenti in remote_directory.
+    Crea una copia locale delle cartelle test presenti in remote_directory.
 
     - La copia viene creata sul Desktop in una nuova cartella con nome:
           YYYYMMDD_HH-MM
       oppure, se nome_verifica è valorizzato:
           YYYYMMDD_HH-MM_<nomeVerificaPulito>
 
-    - Vengono copiate SOLO le cartelle test01..test30.
-    - Aggiorna:
-        * il report,
+    - Vengono copiate SOLO le cartelle test (pattern configurati).
+    - La copia gira in background (start_copy_job): il report mostra
+      l'avanzamento e, alla fine, il riepilogo con gli eventuali errori;
+      cancel_copy_jobs() la annulla.
+    - incremental=True: i file invariati rispetto all'ultima copia della
+      stessa directory remota presente sul Desktop vengono collegati con
+      hardlink (verify_hash=True confronta anche lo sha256).
+    - archive_format ("zip" / "tar.xz"): crea anche l'archivio compresso
+      accanto alla cartella, in streaming durante la copia; con
+      archive_only=True viene creato solo l'archivio.
+    - Alla fine aggiorna:
         * la label lbl_directory,
-        * la tabella/tree tramite le funzioni di update passate.
+        * la tabella/tree tramite le funzioni di update passate,
+        * on_done(new_directory, job), se indicato (new_directory è None
+          se è stato creato solo l'archivio).
 
-    Ritorna il percorso della nuova directory creata.
+    Ritorna subito il percorso della nuova directory creata.
     """
     desktop = os.path.join(os.path.expanduser("~"), "Desktop")
     timestamp = datetime.now().strftime("%Y%m%d_%H-%M")
@@ -130,51 +1229,575 @@ def create_local_copy(
         folder_name = timestamp
 
     new_directory = os.path.join(desktop, folder_name)
-    os.makedirs(new_directory, exist_ok=True)
+    copia_file = not (archive_only and archive_format)
+    if copia_file:
+        os.makedirs(new_directory, exist_ok=True)
 
     # Log in stile simile a Correzione/Live
     report_text.delete("1.0", "end")
+    report_text.mark_unset(PROGRESS_MARK)
     report_text.insert(
         "end",
         "Creazione copia locale delle cartelle test.\n"
-        f"Directory remota di origine:\n  {remote_directory}\n"
-        f"Directory locale di destinazione:\n  {new_directory}\n\n",
+        f"Directory remota di origine:\n  {remote_directory}\n",
+    )
+    if copia_file:
+        report_text.insert("end", f"Directory locale di destinazione:\n  {new_directory}\n")
+    if archive_format:
+        report_text.insert("end", f"Archivio:\n  {new_directory}.{archive_format}\n")
+    report_text.insert("end", "\n")
+
+    precedente = None
+    if incremental and copia_file:
+        precedente, _manifest = find_previous_snapshot(
+            desktop, remote_directory, exclude=new_directory
+        )
+        if precedente is None:
+            report_text.insert(
+                "end",
+                "Nessuna copia precedente con snapshot: copia completa.\n",
+            )
+        else:
+            report_text.insert(
+                "end",
+                f"Copia incrementale rispetto a:\n  {precedente}\n",
+            )
+
+    job = start_copy_job(
+        remote_directory,
+        new_directory,
+        previous_snapshot=precedente,
+        verify_hash=verify_hash,
+        archive_format=archive_format,
+        copy_files=copia_file,
     )
 
-    copied = _copy_test_folders(remote_directory, new_directory, report_text)
+    def _avanzamento(job):
+        _write_progress_line(report_text, format_copy_progress(job))
 
-    if not copied:
-        report_text.insert(
-            "end",
-            "ATTENZIONE: nessuna cartella test01–test30 trovata nella directory remota.\n",
+    def _fine(job):
+        _write_progress_line(report_text, format_copy_summary(job))
+        report_text.mark_unset(PROGRESS_MARK)
+
+        copied = job["cartelle"]
+        if not copied:
+            report_text.insert(
+                "end",
+                "ATTENZIONE: nessuna cartella test trovata nella directory remota.\n",
+            )
+        else:
+            report_text.insert(
+                "end",
+                f"Cartelle test copiate ({len(copied)}):\n  " + ", ".join(copied) + "\n",
+            )
+
+        report_text.see("end")
+
+        if not copia_file:
+            if on_done is not None:
+                on_done(None, job)
+            return
+
+        # Aggiorna la label di quella scheda (vecchio comportamento)
+        lbl_directory.config(text=f"Directory selezionata: {new_directory}")
+
+        # Aggiorna eventuali viste (lista file / treeview)
+        if update_directory_listing_func is not None:
+            update_directory_listing_func(new_directory)
+
+        if update_subdirectories_list_func is not None:
+            update_subdirectories_list_func(new_directory)
+
+        if on_done is not None:
+            on_done(new_directory, job)
+
+    _write_progress_line(report_text, format_copy_progress(job))
+    follow_copy_job(report_text, job, _avanzamento, _fine)
+
+    return new_directory
+
+
+# =============================================================================
+#  DISTRIBUZIONE DI FILE NELLE CARTELLE TEST
+# =============================================================================
+
+def _plan_distribution(source, base_directory):
+    """
+    Elenca i file da distribuire: (sorgente, percorso relativo nella
+    cartella test, stat). Un file va nella radice di ogni cartella test,
+    una cartella viene riprodotta con il suo nome e tutto il suo albero.
+    Restituisce (file, directory_relative, cartelle_test).
+    """
+    source = os.path.normpath(source)
+    cartelle = list(_iter_test_folders(base_directory))
+
+    # una sorgente dentro una cartella test verrebbe copiata su se stessa
+    sorgente_reale = os.path.realpath(source)
+    for folder_name, folder_path in cartelle:
+        cartella_reale = os.path.realpath(folder_path)
+        try:
+            dentro = os.path.commonpath([sorgente_reale, cartella_reale]) == cartella_reale
+        except ValueError:
+            dentro = False
+        if dentro:
+            raise ValueError(f"La sorgente si trova nella cartella test {folder_name}.")
+
+    nome = os.path.basename(source)
+    if not os.path.isdir(source):
+        return [(source, nome, os.stat(source))], [], cartelle
+
+    sottocartelle = []
+    file = []
+    for root, file_name, st in walk_files_with_stat(source, sottocartelle):
+        rel = os.path.join(nome, os.path.relpath(os.path.join(root, file_name), source))
+        file.append((os.path.join(root, file_name), rel, st))
+
+    directory = [nome]
+    for sub in sottocartelle:
+        directory.append(os.path.join(nome, os.path.relpath(sub, source)))
+    return file, directory, cartelle
+
+
+def _distribute_one(job, src, dest, st, sha):
+    """
+    Scrive una copia di src in dest, salvo che dest sia già identica
+    (dimensione e sha256). La copia passa da un file temporaneo che viene
+    riletto e confrontato con lo sha256 della sorgente prima del rename.
+    Restituisce "invariato" o "copiato".
+    """
+    try:
+        dest_st = os.stat(dest)
+    except OSError:
+        dest_st = None
+    if dest_st is not None and dest_st.st_size == st.st_size and utils.file_sha256(dest) == sha:
+        return "invariato"
+
+    tmp = dest + DISTRIBUTE_TMP_SUFFIX
+    completato = False
+    try:
+        with open(src, "rb") as fin, open(tmp, "wb") as fout:
+            while True:
+                if job["stop"].is_set():
+                    return None
+                pezzo = fin.read(COPY_CHUNK_SIZE)
+                if not pezzo:
+                    break
+                fout.write(pezzo)
+        scritto = utils.file_sha256(tmp)
+        if scritto != sha:
+            raise OSError(f"verifica fallita (sha256 {scritto} invece di {sha})")
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dest)
+        completato = True
+        return "copiato"
+    finally:
+        if not completato:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def _run_distribute_job(job):
+    t0 = time.perf_counter()
+
+    # sha256 delle sorgenti, calcolato una sola volta
+    sorgenti = []
+    for src, rel, st in job["file"]:
+        sha = utils.file_sha256(src)
+        if sha is None:
+            job["errori"].append((src, "sorgente illeggibile"))
+        else:
+            sorgenti.append((src, rel, st, sha))
+
+    lavori = []
+    for folder_name, folder_path in job["cartelle"]:
+        ok = True
+        for rel_dir in job["directory"]:
+            try:
+                os.makedirs(os.path.join(folder_path, rel_dir), exist_ok=True)
+            except OSError as e:
+                job["errori"].append((os.path.join(folder_path, rel_dir), str(e)))
+                job["cartelle_con_errori"].add(folder_name)
+                ok = False
+                break
+        if ok:
+            for src, rel, st, sha in sorgenti:
+                lavori.append((folder_name, src, os.path.join(folder_path, rel), st, sha))
+
+    with job["lock"]:
+        job["file_totali"] = len(lavori)
+        job["fase"] = "copia"
+
+    def _distribuisci(lavoro):
+        folder_name, src, dest, st, sha = lavoro
+        if job["stop"].is_set():
+            return
+        try:
+            esito = _distribute_one(job, src, dest, st, sha)
+        except Exception as e:
+            with job["lock"]:
+                job["errori"].append((dest, str(e)))
+                job["cartelle_con_errori"].add(folder_name)
+            return
+        if esito is None:
+            return
+        with job["lock"]:
+            job["file_fatti"] += 1
+            if esito == "invariato":
+                job["file_invariati"] += 1
+            else:
+                job["byte_fatti"] += st.st_size
+
+    with ThreadPoolExecutor(max_workers=max(1, job["max_workers"])) as pool:
+        list(pool.map(_distribuisci, lavori))
+
+    job["annullata"] = job["stop"].is_set()
+    job["durata"] = time.perf_counter() - t0
+    job["fase"] = "fine"
+    job["finito"].set()
+
+
+def start_distribute_job(source, base_directory, max_workers=COPY_MAX_WORKERS):
+    """
+    Distribuisce un file o una cartella (con tutto il suo albero) in tutte
+    le cartelle test esistenti di base_directory, in parallelo.
+
+    - i file già presenti e identici (sha256) non vengono riscritti: la
+      distribuzione si può ripetere senza effetti;
+    - ogni copia viene riletta e verificata prima di sostituire la
+      destinazione (nessun file parziale nelle cartelle test).
+
+    Solleva ValueError se la sorgente è dentro una cartella test.
+    Restituisce il job (dizionario) da passare a follow_copy_job /
+    format_distribute_progress / format_distribute_summary;
+    job["stop"].set() annulla.
+    """
+    file, directory, cartelle = _plan_distribution(source, base_directory)
+
+    job = {
+        "sorgente": source,
+        "file": file,
+        "directory": directory,
+        "cartelle": cartelle,
+        "max_workers": max_workers,
+        "lock": threading.Lock(),
+        "stop": threading.Event(),
+        "finito": threading.Event(),
+        "fase": "verifica",
+        "file_totali": 0,
+        "file_fatti": 0,
+        "file_invariati": 0,
+        "byte_fatti": 0,
+        "errori": [],
+        "cartelle_con_errori": set(),
+        "annullata": False,
+        "durata": 0.0,
+    }
+
+    threading.Thread(target=_run_distribute_job, args=(job,), daemon=True).start()
+    return job
+
+
+def format_distribute_progress(job):
+    """
+    Riga di avanzamento della distribuzione.
+    """
+    with job["lock"]:
+        if job["fase"] == "verifica":
+            return "Calcolo sha256 dei file da distribuire..."
+        testo = "Distribuzione: {}/{} file ({} già presenti e identici)".format(
+            job["file_fatti"],
+            job["file_totali"],
+            job["file_invariati"],
+        )
+        if job["stop"].is_set():
+            testo = testo + " (annullamento...)"
+        return testo
+
+
+def format_distribute_summary(job, max_errori=20):
+    """
+    Riepilogo finale della distribuzione, con l'elenco (troncato) degli errori.
+    """
+    nome = os.path.basename(os.path.normpath(job["sorgente"]))
+    righe = []
+    if job["annullata"]:
+        righe.append("DISTRIBUZIONE ANNULLATA.")
+
+    if not job["cartelle"]:
+        righe.append(
+            "Nessuna cartella test trovata nella directory remota.\n"
+            "File NON distribuito."
         )
     else:
-        report_text.insert(
-            "end",
-            f"Cartelle test copiate ({len(copied)}):\n  " + ", ".join(copied) + "\n",
+        righe.append(
+            "'{}' distribuito in {} cartelle test: {} file scritti e verificati ({}), "
+            "{} già identici, in {:.1f} s.".format(
+                nome,
+                len(job["cartelle"]) - len(job["cartelle_con_errori"]),
+                job["file_fatti"] - job["file_invariati"],
+                _format_bytes(job["byte_fatti"]),
+                job["file_invariati"],
+                job["durata"],
+            )
         )
 
-    report_text.see("end")
+    if job["errori"]:
+        righe.append(f"ERRORI ({len(job['errori'])}):")
+        for percorso, errore in job["errori"][:max_errori]:
+            righe.append(f"  - {percorso}: {errore}")
+        if len(job["errori"]) > max_errori:
+            righe.append(f"  ... altri {len(job['errori']) - max_errori} errori")
 
-    # Aggiorna la label di quella scheda (vecchio comportamento)
-    lbl_directory.config(text=f"Directory selezionata: {new_directory}")
+    return "\n".join(righe)
 
-    # Aggiorna eventuali viste (lista file / treeview)
-    if update_directory_listing_func is not None:
-        update_directory_listing_func(new_directory)
 
-    if update_subdirectories_list_func is not None:
-        update_subdirectories_list_func(new_directory)
+# =============================================================================
+#  PULIZIA DELLE CARTELLE TEST
+# =============================================================================
 
-    return new_directory
+def _new_trash_directory(base_directory):
+    """
+    Crea la cartella cestino 00_cestino_SMX_<timestamp> nella directory
+    remota (stesso filesystem delle cartelle test: gli spostamenti sono
+    semplici rename).
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H-%M-%S")
+    cestino = os.path.join(base_directory, TRASH_PREFIX + timestamp)
+    n = 1
+    while os.path.exists(cestino):
+        n += 1
+        cestino = os.path.join(base_directory, f"{TRASH_PREFIX}{timestamp}_{n}")
+    os.makedirs(cestino)
+    return cestino
+
+
+def _move_to_trash(base_directory, cestino):
+    """
+    Sposta nel cestino il contenuto di ogni cartella test: le cartelle test
+    restano al loro posto (vuote), con permessi e condivisioni invariati.
+
+    Restituisce (cartelle_svuotate, voci_spostate, errori).
+    """
+    cartelle = []
+    spostate = []
+    errori = []
+
+    for folder_name, folder_path in _iter_test_folders(base_directory):
+        try:
+            with os.scandir(folder_path) as it:
+                voci = [entry.name for entry in it]
+        except OSError as e:
+            errori.append((folder_path, str(e)))
+            continue
+
+        cartelle.append(folder_name)
+        if not voci:
+            continue
 
+        destinazione = os.path.join(cestino, folder_name)
+        try:
+            os.makedirs(destinazione, exist_ok=True)
+        except OSError as e:
+            errori.append((destinazione, str(e)))
+            continue
+
+        for nome in voci:
+            src = os.path.join(folder_path, nome)
+            dest = os.path.join(destinazione, nome)
+            try:
+                os.rename(src, dest)
+                spostate.append(dest)
+            except OSError as e:
+                # tipicamente un file ancora aperto su una postazione
+                errori.append((src, str(e)))
+
+    return cartelle, spostate, errori
 
-def clear_test_folders(selected_directory, report_text):
+
+def _delete_tree(job, percorso):
+    """
+    Cancella un file o un albero di cartelle contando i file eliminati.
+    """
+    if job["stop"].is_set():
+        return
+
+    if not os.path.isdir(percorso) or os.path.islink(percorso):
+        try:
+            os.remove(percorso)
+            with job["lock"]:
+                job["file_eliminati"] += 1
+        except FileNotFoundError:
+            # già eliminato: non è un errore
+            pass
+        except OSError as e:
+            with job["lock"]:
+                job["errori"].append((percorso, str(e)))
+        return
+
+    for root, dirs, files in os.walk(percorso, topdown=False):
+        if job["stop"].is_set():
+            return
+        for file in files:
+            file_path = os.path.join(root, file)
+            try:
+                os.remove(file_path)
+                with job["lock"]:
+                    job["file_eliminati"] += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                with job["lock"]:
+                    job["errori"].append((file_path, str(e)))
+        for d in dirs:
+            dir_path = os.path.join(root, d)
+            try:
+                if os.path.islink(dir_path):
+                    os.remove(dir_path)
+                else:
+                    os.rmdir(dir_path)
+            except OSError:
+                # già segnalato l'errore sul file che la teneva occupata
+                pass
+    try:
+        os.rmdir(percorso)
+    except OSError:
+        pass
+
+
+def _run_clear_job(job):
+    try:
+        _clear_trash(job)
+    finally:
+        with _cestini_lock:
+            _cestini_attivi.difference_update(job["cestini_propri"])
+        job["finito"].set()
+
+
+def _clear_trash(job):
+    t0 = time.perf_counter()
+
+    # cestini rimasti da pulizie interrotte (app chiusa durante la
+    # cancellazione); quelli di un job ancora attivo restano a lui
+    da_eliminare = list(job["voci"])
+    try:
+        with os.scandir(job["base"]) as it:
+            for entry in it:
+                if entry.name.startswith(TRASH_PREFIX) and entry.is_dir(follow_symlinks=False):
+                    reale = os.path.realpath(entry.path)
+                    with _cestini_lock:
+                        if reale in _cestini_attivi:
+                            continue
+                        _cestini_attivi.add(reale)
+                    job["cestini_propri"].append(reale)
+                    da_eliminare.append(entry.path)
+    except OSError:
+        pass
+
+    with job["lock"]:
+        job["voci_totali"] = len(da_eliminare)
+
+    def _elimina(percorso):
+        _delete_tree(job, percorso)
+        with job["lock"]:
+            job["voci_fatte"] += 1
+
+    with ThreadPoolExecutor(max_workers=max(1, job["max_workers"])) as pool:
+        list(pool.map(_elimina, da_eliminare))
+
+    if not job["stop"].is_set():
+        _delete_tree(job, job["cestino"])
+
+    job["annullata"] = job["stop"].is_set()
+    job["durata"] = time.perf_counter() - t0
+
+
+def start_clear_job(base_directory, max_workers=CLEAR_MAX_WORKERS):
+    """
+    Svuota subito le cartelle test di base_directory spostandone il
+    contenuto in una cartella cestino (00_cestino_SMX_<timestamp>, ignorata
+    da scansioni e correzione), poi cancella il cestino in un thread con un
+    pool di max_workers thread.
+
+    La parte sincrona è solo una serie di rename: al ritorno le cartelle
+    test sono già vuote. Restituisce il job (dizionario) da passare a
+    follow_copy_job / format_clear_progress / format_clear_summary.
+    """
+    cestino = _new_trash_directory(base_directory)
+    with _cestini_lock:
+        _cestini_attivi.add(os.path.realpath(cestino))
+    cartelle, voci, errori = _move_to_trash(base_directory, cestino)
+
+    job = {
+        "base": base_directory,
+        "cestino": cestino,
+        "cestini_propri": [os.path.realpath(cestino)],
+        "cartelle": cartelle,
+        "voci": voci,
+        "max_workers": max_workers,
+        "lock": threading.Lock(),
+        "stop": threading.Event(),
+        "finito": threading.Event(),
+        "voci_totali": len(voci),
+        "voci_fatte": 0,
+        "file_eliminati": 0,
+        "errori_spostamento": errori,
+        "errori": [],
+        "annullata": False,
+        "durata": 0.0,
+    }
+
+    threading.Thread(target=_run_clear_job, args=(job,), daemon=True).start()
+    return job
+
+
+def format_clear_progress(job):
+    """
+    Riga di avanzamento della cancellazione del cestino.
+    """
+    with job["lock"]:
+        return "Eliminazione del cestino in background: {}/{} elementi, {} file eliminati".format(
+            job["voci_fatte"],
+            job["voci_totali"],
+            job["file_eliminati"],
+        )
+
+
+def format_clear_summary(job, max_errori=20):
+    """
+    Riepilogo finale della pulizia, con l'elenco (troncato) degli errori.
+    """
+    righe = [
+        "Eliminati {} file in {:.1f} s.".format(job["file_eliminati"], job["durata"]),
+    ]
+    if job["annullata"]:
+        righe.append(f"Eliminazione interrotta: il cestino resta in {job['cestino']}")
+
+    errori = job["errori_spostamento"] + job["errori"]
+    if errori:
+        righe.append(f"ERRORI ({len(errori)}):")
+        for percorso, errore in errori[:max_errori]:
+            righe.append(f"  - {percorso}: {errore}")
+        if len(errori) > max_errori:
+            righe.append(f"  ... altri {len(errori) - max_errori} errori")
+    if job["errori"]:
+        righe.append(f"I file non eliminati restano in {job['cestino']}")
+
+    return "\n".join(righe)
+
+
+def clear_test_folders(selected_directory, report_text, fast=True, on_done=None):
     """
     Cancella ricorsivamente TUTTI i file e le sottocartelle contenuti in
-    test01..test30 sotto selected_directory (ma NON tocca altre cartelle).
+    cartelle test sotto selected_directory (ma NON tocca altre cartelle).
 
     Mostra una tripla conferma "paranoica" prima di procedere.
+
+    - fast=True: il contenuto viene spostato nel cestino (start_clear_job),
+      le cartelle test sono vuote appena la funzione ritorna e la
+      cancellazione vera prosegue in background; on_done(job) alla fine.
+    - fast=False: cancellazione file per file nel thread chiamante.
     """
     if not selected_directory:
         messagebox.showwarning("Attenzione", "Seleziona prima una directory.")
@@ -201,27 +1824,63 @@ def clear_test_folders(selected_directory, report_text):
     if not confirm_final_final:
         return
 
+    if fast:
+        try:
+            job = start_clear_job(selected_directory)
+        except Exception as e:
+            report_text.insert("end", f"Errore nella creazione del cestino: {e}\n")
+            report_text.see("end")
+            return
+
+        report_text.mark_unset(PROGRESS_MARK)
+        report_text.insert(
+            "end",
+            f"Cartelle test svuotate ({len(job['cartelle'])}): "
+            f"contenuto spostato in {job['cestino']}\n",
+        )
+        if job["errori_spostamento"]:
+            report_text.insert(
+                "end",
+                f"ATTENZIONE: {len(job['errori_spostamento'])} elementi non spostati "
+                "(file aperti o permessi), vedi riepilogo finale.\n",
+            )
+        else:
+            report_text.insert("end", "Tutte le cartelle test remote sono state pulite.\n")
+
+        def _avanzamento(job):
+            _write_progress_line(report_text, format_clear_progress(job))
+
+        def _fine(job):
+            _write_progress_line(report_text, format_clear_summary(job))
+            report_text.mark_unset(PROGRESS_MARK)
+            report_text.see("end")
+            if on_done is not None:
+                on_done(job)
+
+        _write_progress_line(report_text, format_clear_progress(job))
+        follow_copy_job(report_text, job, _avanzamento, _fine)
+        return job
+
     for folder_name, folder_path in _iter_test_folders(selected_directory):
-        if os.path.exists(folder_path):
-            for root, dirs, files in os.walk(folder_path, topdown=False):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    try:
-                        os.remove(file_path)
-                    except Exception as e:
-                        report_text.insert(
-                            "end",
-                            f"Errore durante la cancellazione di {file_path}: {e}\n",
-                        )
-                for d in dirs:
-                    dir_path = os.path.join(root, d)
-                    try:
-                        shutil.rmtree(dir_path)
-                    except Exception as e:
-                        report_text.insert(
-                            "end",
-                            f"Errore durante la cancellazione di {dir_path}: {e}\n",
-                        )
+        for root, dirs, files in os.walk(folder_path, topdown=False):
+            for file in files:
+                file_path = os.path.join(root, file)
+                try:
+                    os.remove(file_path)
+                except Exception as e:
+                    report_text.insert(
+                        "end",
+                        f"Errore durante la cancellazione di {file_path}: {e}\n",
+                    )
+            for d in dirs:
+                dir_path = os.path.join(root, d)
+                try:
+                    shutil.rmtree(dir_path)
+                except Exception as e:
+                    report_text.insert(
+                        "end",
+                        f"Errore durante la cancellazione di {dir_path}: {e}\n",
+                    )
 
     report_text.insert("end", "Tutte le cartelle test remote sono state pulite.\n")
     report_text.see("end")
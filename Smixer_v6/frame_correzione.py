@@ -286,7 +286,6 @@ def create_frame_correzione(root, global_config):
         path = global_config["selected_directory"].get().strip()
 
         report_text.delete("1.0", "end")
-        tree.delete(*tree.get_children())
 
         if not path or path.lower() == "nessuna":
             report_text.insert(
@@ -295,6 +294,7 @@ def create_frame_correzione(root, global_config):
                 "Seleziona la directory dalla barra superiore (clic sulla voce blu).\n",
             )
             report_text.see("end")
+            tree.delete(*tree.get_children())
             return
 
         if not os.path.isdir(path):
@@ -303,24 +303,14 @@ def create_frame_correzione(root, global_config):
                 "La directory selezionata non esiste:\n" + path + "\n",
             )
             report_text.see("end")
+            tree.delete(*tree.get_children())
             return
 
         # Popola log e tabella con la funzione esistente
         utils.update_directory_listing(path, entry_extension, report_text)
-        utils.update_subdirectories_list(path, tree, entry_extension)
-
-        # --- FILTRO post-popolamento: rimuove le subdirectory che iniziano con '00' ---
-        # Nota: non modifichiamo utils; filtriamo qui gli item già inseriti nella treeview.
-        all_items = tree.get_children()
-        idx = 0
-        while idx < len(all_items):
-            item_id = all_items[idx]
-            values = tree.item(item_id, "values")
-            if values and len(values) > 0:
-                subdir_name = str(values[0]).strip()
-                if subdir_name.startswith("00"):
-                    tree.delete(item_id)
-            idx = idx + 1
+        # la tabella viene aggiornata per chiave (solo le righe cambiate);
+        # le subdirectory che iniziano con '00' sono escluse
+        utils.update_subdirectories_list(path, tree, entry_extension, skip_prefixes=("00",))
 
 
     def on_selected_directory_change(*_args):
@@ -361,7 +351,23 @@ def create_frame_correzione(root, global_config):
                 # mantengo comunque un riferimento al testo.
                 global_config["intro_text"] = intro_corrente
 
-        business_logic.mix_files(
+        def segnala_mix_in_corso(attivo):
+            # il mix gira in background: Mixa, similarità ed export (che
+            # leggono i *_mix.txt) restano disattivati fino alla fine (due
+            # mix contemporanei o una lettura a metà scrittura darebbero
+            # file incompleti)
+            stato = "disabled" if attivo else "normal"
+            btn_mix.config(state=stato)
+            btn_analyze.config(state=stato)
+            callback = global_config.get("mix_in_corso")
+            if callable(callback):
+                callback(attivo)
+
+        def mix_terminato():
+            segnala_mix_in_corso(False)
+
+        segnala_mix_in_corso(True)
+        avviato = business_logic.mix_files(
             global_config["selected_directory"],  # StringVar, gestita da business_logic._resolve_base_directory
             entry_prompt,
             entry_extension,
@@ -369,7 +375,11 @@ def create_frame_correzione(root, global_config):
             report_text,
             include_prompt_var.get(),
             include_subdir_var.get(),
+            parallel=True,
+            on_done=mix_terminato,
         )
+        if not avviato:
+            segnala_mix_in_corso(False)
 
     btn_mix.config(command=do_mix)
 
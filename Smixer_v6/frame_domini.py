@@ -3,15 +3,24 @@ import csv
 import re
 import json
 import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
+import utils
 import similarity_ftp
 import ftpAgent
 import sim_map_ftp
+import monitor_domini
 
 YELLOW_BG = "#85187c"
 
+# Estensioni considerate nell'analisi verifica ↔ dominio
+ESTENSIONI_DOMINI = (".php", ".html", ".htm", ".css", ".js", ".txt")
+
+# file identici in almeno questo numero di domini = libreria (esclusa dal merge)
+SOGLIA_LIBRERIA_CONDIVISA = 4
+
 
 # ======================================================================
 # UTILITÀ LOCALI
@@ -187,6 +196,7 @@ def create_frame_domini(root, global_config):
       - Associa alunno → cartella test
       - Download FTP (ftpAgent) SOLO se necessario
       - Analisi somiglianze (similarity_ftp)
+        (opzionalmente in pipeline: i file vengono indicizzati durante il download)
       - Apertura automatica mappa similitudini (sim_map_ftp)
     """
     frame = tk.Frame(root, bg=YELLOW_BG)
@@ -200,6 +210,15 @@ def create_frame_domini(root, global_config):
     students_in_domain_cache = []
 
     pending_analysis_after_download = False
+    indicizzatore_pipeline = None
+
+    # somma dei tempi per fase ("tempi" da ftpAgent) dell'ultimo batch
+    tempi_download = {}
+
+    # peso (byte) delle cartelle alunno in 00_DominiFTP, aggiornato in modo
+    # incrementale dagli eventi del downloader e dall'indice persistente
+    peso_by_alunno = {}
+    peso_stato = {"dir_ftp": "", "indice_mancante": False, "ricalcolo_in_corso": False}
 
     # ------------------------------------------------------------------
     # RIGA 0: pulsanti + peso totale FTP
@@ -213,12 +232,39 @@ def create_frame_domini(root, global_config):
     )
     btn_analizza.grid(row=0, column=1, padx=6, pady=6, sticky="w")
 
+    pipeline_var = tk.BooleanVar(value=True)
+    chk_pipeline = tk.Checkbutton(
+        frame,
+        text="Analisi in pipeline durante il download",
+        variable=pipeline_var,
+        bg=YELLOW_BG,
+        fg="white",
+        selectcolor=YELLOW_BG,
+        activebackground=YELLOW_BG,
+        activeforeground="white",
+    )
+    chk_pipeline.grid(row=0, column=2, padx=6, pady=6, sticky="w")
+
+    verifica_var = tk.BooleanVar(value=True)
+    chk_verifica = tk.Checkbutton(
+        frame,
+        text="Verifica modifiche prima di riusare 00_DominiFTP",
+        variable=verifica_var,
+        bg=YELLOW_BG,
+        fg="white",
+        selectcolor=YELLOW_BG,
+        activebackground=YELLOW_BG,
+        activeforeground="white",
+    )
+    chk_verifica.grid(row=0, column=3, padx=6, pady=6, sticky="w")
+
     lbl_peso_totale = tk.Label(
         frame,
         text="Totale FTP: 0 B",
         bg=YELLOW_BG,
         fg="white",
-        anchor="e"
+        anchor="e",
+        cursor="hand2",
     )
     lbl_peso_totale.grid(row=0, column=5, padx=10, pady=6, sticky="e")
 
@@ -265,6 +311,38 @@ def create_frame_domini(root, global_config):
     frame.grid_rowconfigure(1, weight=1)
     frame.grid_columnconfigure(5, weight=1)
 
+    # ------------------------------------------------------------------
+    # RIGA 2: limiti di banda FTP (modificabili anche a download in corso)
+    # ------------------------------------------------------------------
+    frame_banda = tk.Frame(frame, bg=YELLOW_BG)
+    frame_banda.grid(row=2, column=0, columnspan=7, padx=10, pady=2, sticky="w")
+
+    limite_banda_var = global_config.get("ftp_limite_banda_kbs")
+    if limite_banda_var is None:
+        limite_banda_var = tk.StringVar(value="0")
+    limite_connessione_var = global_config.get("ftp_limite_connessione_kbs")
+    if limite_connessione_var is None:
+        limite_connessione_var = tk.StringVar(value="0")
+
+    tk.Label(
+        frame_banda,
+        text="Limite banda totale (KB/s, 0 = illimitato):",
+        bg=YELLOW_BG,
+        fg="white",
+    ).pack(side="left")
+    tk.Entry(frame_banda, width=8, textvariable=limite_banda_var).pack(side="left", padx=4)
+
+    tk.Label(
+        frame_banda,
+        text="per connessione (KB/s):",
+        bg=YELLOW_BG,
+        fg="white",
+    ).pack(side="left", padx=(10, 0))
+    tk.Entry(frame_banda, width=8, textvariable=limite_connessione_var).pack(side="left", padx=4)
+
+    btn_banda = tk.Button(frame_banda, text="Applica", relief="raised")
+    btn_banda.pack(side="left", padx=6)
+
     # ------------------------------------------------------------------
     # RIGA 3: log
     # ------------------------------------------------------------------
@@ -281,6 +359,64 @@ def create_frame_domini(root, global_config):
     credenziali_by_item = {}   # item_id -> (ftp_user, ftp_pass)
     testdir_by_item = {}       # item_id -> cartella test associata
 
+    # ==================================================================
+    # SEZIONE: LIMITE DI BANDA
+    # ==================================================================
+    def _leggi_kbs(var):
+        testo = str(var.get()).strip().replace(",", ".")
+        if testo == "":
+            return 0
+        valore = float(testo)
+        if valore < 0:
+            raise ValueError(testo)
+        return valore
+
+    def applica_limite_banda(mostra_log=True):
+        """
+        Passa a ftpAgent i limiti indicati: hanno effetto subito,
+        anche sui download già in corso.
+        """
+        try:
+            globale = _leggi_kbs(limite_banda_var)
+            per_connessione = _leggi_kbs(limite_connessione_var)
+        except Exception:
+            if mostra_log:
+                messagebox.showwarning(
+                    "Attenzione",
+                    "Limiti di banda non validi: indicare numeri di KB/s (0 = illimitato).",
+                )
+            return
+
+        ftpAgent.set_bandwidth_limit(globale, per_connessione)
+
+        if mostra_log:
+            if globale > 0:
+                testo_globale = "{:g} KB/s".format(globale)
+            else:
+                testo_globale = "illimitato"
+            if per_connessione > 0:
+                testo_connessione = "{:g} KB/s".format(per_connessione)
+            else:
+                testo_connessione = "illimitato"
+            log(
+                "Limite banda FTP: totale {}, per connessione {}.".format(
+                    testo_globale, testo_connessione
+                )
+            )
+
+    btn_banda.configure(command=applica_limite_banda)
+
+    def on_limite_banda_change(*_args):
+        applica_limite_banda(False)
+
+    for var_limite in (limite_banda_var, limite_connessione_var):
+        if hasattr(var_limite, "trace_add"):
+            var_limite.trace_add("write", on_limite_banda_change)
+        else:
+            var_limite.trace("w", on_limite_banda_change)
+
+    applica_limite_banda(False)
+
     # ==================================================================
     # SEZIONE: MODELLO CSV (manteniamo la funzione, usabile da menu)
     # ==================================================================
@@ -506,38 +642,102 @@ def create_frame_domini(root, global_config):
     # ==================================================================
     # SEZIONE: PESO TOTALE 00_DominiFTP
     # ==================================================================
-    def aggiorna_peso_totale_ftp():
+    def _dir_ftp_corrente():
         base_dir = global_config["selected_directory"].get().strip()
-
         if not base_dir or not os.path.isdir(base_dir):
-            lbl_peso_totale.config(text="Totale FTP: 0 B")
-            return
+            return ""
+        return os.path.join(base_dir, "00_DominiFTP")
 
-        dir_ftp = os.path.join(base_dir, "00_DominiFTP")
+    def aggiorna_peso_totale_ftp():
+        """
+        Aggiorna l'etichetta sommando i pesi noti per alunno (nessun os.walk).
+        """
+        if peso_stato["ricalcolo_in_corso"]:
+            lbl_peso_totale.config(text="Totale FTP: ricalcolo in corso...")
+            return
 
-        if not os.path.isdir(dir_ftp):
-            lbl_peso_totale.config(text="Totale FTP: 0 B")
+        if peso_stato["indice_mancante"]:
+            lbl_peso_totale.config(text="Totale FTP: ? (clic per ricalcolare)")
             return
 
+        # somma dei pesi logici degli alunni; l'archivio deduplicato
+        # (spazio reale dei contenuti collegati) è mostrato a parte
         totale = 0
+        for alunno, peso in peso_by_alunno.items():
+            if alunno != ftpAgent.BLOB_DIR_NAME:
+                totale = totale + peso
 
-        for radice, _, files in os.walk(dir_ftp):
-            j = 0
-            while j < len(files):
-                percorso_file = os.path.join(radice, files[j])
+        testo = "Totale FTP: " + format_bytes(totale)
+        peso_blob = peso_by_alunno.get(ftpAgent.BLOB_DIR_NAME, 0)
+        if peso_blob > 0:
+            testo = testo + " (archivio dedup: " + format_bytes(peso_blob) + ")"
+        lbl_peso_totale.config(text=testo)
+
+    def carica_indice_pesi():
+        """
+        Ricarica i pesi dall'indice persistente di 00_DominiFTP.
+        Se la cartella esiste ma l'indice manca, il totale resta "?"
+        finché non viene chiesto un ricalcolo.
+        """
+        dir_ftp = _dir_ftp_corrente()
+        peso_stato["dir_ftp"] = dir_ftp
+        peso_by_alunno.clear()
+        peso_stato["indice_mancante"] = False
+
+        if dir_ftp != "" and os.path.isdir(dir_ftp):
+            pesi = ftpAgent.load_ftp_sizes(dir_ftp)
+            if pesi is None:
                 try:
-                    totale = totale + os.path.getsize(percorso_file)
+                    peso_stato["indice_mancante"] = len(os.listdir(dir_ftp)) > 0
                 except Exception:
-                    pass
-                j = j + 1
+                    peso_stato["indice_mancante"] = False
+            else:
+                peso_by_alunno.update(pesi)
+
+        aggiorna_peso_totale_ftp()
 
-        lbl_peso_totale.config(text="Totale FTP: " + format_bytes(totale))
+    def ricalcola_peso_totale_ftp(*_args):
+        """
+        Ricalcolo completo su richiesta (clic sull'etichetta o "Aggiorna cartella"),
+        eseguito in un thread separato per non bloccare la GUI.
+        """
+        if peso_stato["ricalcolo_in_corso"]:
+            return
+
+        dir_ftp = _dir_ftp_corrente()
+        if dir_ftp == "" or not os.path.isdir(dir_ftp):
+            carica_indice_pesi()
+            return
+
+        peso_stato["ricalcolo_in_corso"] = True
+        aggiorna_peso_totale_ftp()
+        log("Ricalcolo del peso di 00_DominiFTP avviato...")
+
+        def _worker():
+            pesi = ftpAgent.rescan_ftp_sizes(dir_ftp)
+            update_queue.put(("peso_ricalcolato", dir_ftp, pesi))
+
+        threading.Thread(target=_worker, daemon=True).start()
+
+    lbl_peso_totale.bind("<Button-1>", ricalcola_peso_totale_ftp)
+    global_config["refresh_domini"] = ricalcola_peso_totale_ftp
+
+    def on_selected_directory_change(*_args):
+        carica_indice_pesi()
+
+    sel_dir_var = global_config.get("selected_directory")
+    if sel_dir_var is not None:
+        if hasattr(sel_dir_var, "trace_add"):
+            sel_dir_var.trace_add("write", on_selected_directory_change)
+        elif hasattr(sel_dir_var, "trace"):
+            sel_dir_var.trace("w", on_selected_directory_change)
 
     # ==================================================================
     # SEZIONE: SERVIZIO CODA (FTP → GUI)
     # ==================================================================
     def process_update_queue():
         nonlocal pending_analysis_after_download
+        nonlocal indicizzatore_pipeline
 
         while True:
             try:
@@ -551,34 +751,91 @@ def create_frame_domini(root, global_config):
                 log(task[1])
 
             elif tipo == "set":
-                item_id = task[1]
-                colonna = task[2]
-                valore = task[3]
-                try:
-                    tree.set(item_id, colonna, valore)
-                except Exception:
-                    pass
+                utils.update_tree_cells(tree, [(task[1], task[2], task[3])])
+
+            elif tipo == "set_many":
+                # aggiornamenti già accorpati da ftpAgent (un solo valore per
+                # (item_id, colonna)): si scrivono solo le celle cambiate
+                utils.update_tree_cells(tree, task[1])
+
+            elif tipo == "peso_alunni":
+                if peso_stato["dir_ftp"] == _dir_ftp_corrente():
+                    peso_by_alunno.update(task[1])
+                    peso_stato["indice_mancante"] = False
+                    aggiorna_peso_totale_ftp()
+
+            elif tipo == "peso_ricalcolato":
+                peso_stato["ricalcolo_in_corso"] = False
+                if task[1] == _dir_ftp_corrente():
+                    peso_stato["dir_ftp"] = task[1]
+                    peso_by_alunno.clear()
+                    peso_by_alunno.update(task[2])
+                    peso_stato["indice_mancante"] = False
+                    log("Ricalcolo del peso di 00_DominiFTP completato.")
+                aggiorna_peso_totale_ftp()
+
+            elif tipo == "tempi":
+                for fase, valore in task[2].items():
+                    tempi_download[fase] = tempi_download.get(fase, 0) + valore
+
+            elif tipo == "fine_verifica":
+                on_fine_verifica(task[1])
 
             elif tipo == "fine_download":
-                aggiorna_peso_totale_ftp()
+                carica_indice_pesi()
                 log("=== Download FTP completato ===")
+                if tempi_download:
+                    log(
+                        "Tempi (somma sui domini): connessione {:.1f} s, listing {:.1f} s, "
+                        "trasferimento {:.1f} s — {} file, {}.".format(
+                            tempi_download.get("connessione", 0),
+                            tempi_download.get("listing", 0),
+                            tempi_download.get("trasferimento", 0),
+                            tempi_download.get("file", 0),
+                            format_bytes(tempi_download.get("byte", 0)),
+                        )
+                    )
                 btn_analizza.configure(state="normal")
 
-                if pending_analysis_after_download:
-                    pending_analysis_after_download = False
-                    base_dir = global_config["selected_directory"].get().strip()
-                    if base_dir and os.path.isdir(base_dir):
-                        dir_ftp_base = os.path.join(base_dir, "00_DominiFTP")
-                        esegui_analisi(base_dir, dir_ftp_base)
+                analisi_in_attesa = pending_analysis_after_download
+                pending_analysis_after_download = False
+
+                if indicizzatore_pipeline is not None:
+                    # il thread Tk non attende l'indicizzatore: fine
+                    # segnalata subito, completamento controllato con after()
+                    similarity_ftp.stop_domain_indexer(indicizzatore_pipeline)
+                    attendi_indicizzatore(indicizzatore_pipeline, analisi_in_attesa)
+                    indicizzatore_pipeline = None
+                elif analisi_in_attesa:
+                    avvia_analisi_dopo_download(None)
+
+    def avvia_analisi_dopo_download(domain_index):
+        base_dir = global_config["selected_directory"].get().strip()
+        if base_dir and os.path.isdir(base_dir):
+            dir_ftp_base = os.path.join(base_dir, "00_DominiFTP")
+            esegui_analisi(base_dir, dir_ftp_base, domain_index)
+
+    def attendi_indicizzatore(indicizzatore, analisi_in_attesa):
+        if not similarity_ftp.domain_indexer_done(indicizzatore):
+            frame.after(200, attendi_indicizzatore, indicizzatore, analisi_in_attesa)
+            return
+        log(
+            "Pipeline: {} file indicizzati durante il download.".format(
+                indicizzatore["file_indicizzati"]
+            )
+        )
+        if analisi_in_attesa:
+            avvia_analisi_dopo_download(similarity_ftp.domain_indexer_result(indicizzatore))
 
     # ==================================================================
     # SEZIONE: ANALISI SOMIGLIANZE (core)
     # ==================================================================
-    def esegui_analisi(base_dir, dir_ftp_base):
+    def esegui_analisi(base_dir, dir_ftp_base, domain_index=None):
         """
         Esegue l'analisi di similarità usando:
           - tests_dirs:   alunno -> cartella test locale
           - domini_dirs:  alunno -> cartella dominio scaricato (00_DominiFTP)
+          - domain_index: indice costruito in pipeline durante il download (opzionale)
         Poi aggiorna le cache e apre direttamente la mappa similitudini.
         """
         tests_dirs = {}
@@ -632,8 +889,6 @@ def create_frame_domini(root, global_config):
             )
             return
 
-        estensioni = (".php", ".html", ".htm", ".css", ".js", ".txt")
-
         def progress_cb(phase, current, total, name):
             if total <= 0:
                 percent = 0
@@ -667,6 +922,26 @@ def create_frame_domini(root, global_config):
 
         log("=== Avvio analisi somiglianze (verifica vs MERGE dominio) ===")
 
+        # librerie note: elenco manuale (cartella programma e 00_DominiFTP)
+        # più i file identici presenti in molti domini
+        librerie_note = similarity_ftp.load_library_hashes(
+            [
+                os.path.join(os.path.dirname(os.path.abspath(__file__)), similarity_ftp.LIBRERIE_NOTE_FILE),
+                os.path.join(dir_ftp_base, similarity_ftp.LIBRERIE_NOTE_FILE),
+            ]
+        )
+        librerie_condivise = ftpAgent.shared_file_hashes(dir_ftp_base, SOGLIA_LIBRERIA_CONDIVISA)
+        skip_hashes = librerie_note.union(librerie_condivise)
+        if skip_hashes:
+            log(
+                "Librerie escluse dal merge: {} hash ({} da elenco, {} condivisi da ≥{} domini).".format(
+                    len(skip_hashes),
+                    len(librerie_note),
+                    len(librerie_condivise),
+                    SOGLIA_LIBRERIA_CONDIVISA,
+                )
+            )
+
         (
             metrics_by_student,
             students_in_test,
@@ -676,8 +951,10 @@ def create_frame_domini(root, global_config):
         ) = similarity_ftp.analyze_reuse_by_student(
             tests_dirs,
             domini_dirs,
-            estensioni,
+            ESTENSIONI_DOMINI,
             progress_cb,
+            domain_index,
+            skip_hashes,
         )
 
         metrics_by_student_cache.clear()
@@ -713,15 +990,134 @@ def create_frame_domini(root, global_config):
     # ==================================================================
     # SEZIONE: ANALIZZA SOMIGLIANZE (workflow unico)
     # ======================================================================
+    def costruisci_jobs(items, sincronizza):
+        """
+        Crea i job FTP per le righe indicate (solo quelle con dati completi).
+        Con 'sincronizza' il download scarica solo i file cambiati.
+        """
+        jobs = []
+
+        i = 0
+        while i < len(items):
+            item_id = items[i]
+            valori_corr = list(tree.item(item_id, "values"))
+
+            alunno = valori_corr[0]
+            dominio = valori_corr[1]
+
+            if testdir_by_item.get(item_id, ""):
+                stato_base = "Test OK"
+            else:
+                stato_base = "Test non trovato"
+
+            cred = credenziali_by_item.get(item_id, ("", ""))
+            ftp_user = cred[0]
+            ftp_pass = cred[1]
+
+            if dominio == "" or ftp_user == "" or ftp_pass == "":
+                try:
+                    tree.set(item_id, "Stato", "Dati FTP incompleti")
+                except Exception:
+                    pass
+                i = i + 1
+                continue
+
+            job = {
+                "item_id": item_id,
+                "alunno": alunno,
+                "dominio": dominio,
+                "stato_base": stato_base,
+                "ftp_user": ftp_user,
+                "ftp_pass": ftp_pass,
+                "sync": sincronizza,
+            }
+
+            jobs.append(job)
+            i = i + 1
+
+        return jobs
+
+    def avvia_download(jobs, base_dir):
+        """
+        Avvia il batch di download (eventualmente in pipeline con l'indicizzazione);
+        al termine ("fine_download") parte esegui_analisi.
+        """
+        nonlocal pending_analysis_after_download
+        nonlocal indicizzatore_pipeline
+
+        metrics_by_student_cache.clear()
+        texts_test_cache.clear()
+        merged_domain_texts_cache.clear()
+        del students_in_test_cache[:]
+        del students_in_domain_cache[:]
+
+        btn_analizza.configure(state="disabled")
+        pending_analysis_after_download = True
+        tempi_download.clear()
+
+        on_file_downloaded = None
+        if pipeline_var.get():
+            indicizzatore = similarity_ftp.start_domain_indexer(ESTENSIONI_DOMINI)
+            indicizzatore_pipeline = indicizzatore
+
+            def on_file_downloaded(alunno_dir, dom_dir, percorso):
+                similarity_ftp.index_downloaded_file(indicizzatore, alunno_dir, dom_dir, percorso)
+
+            log("Analisi in pipeline attiva: i file vengono indicizzati durante il download.")
+
+        ftpAgent.start_batch_download(jobs, base_dir, update_queue, on_file_downloaded)
+
+    def on_fine_verifica(esiti):
+        """
+        Esito della verifica "solo listing": riscarica solo i domini cambiati,
+        poi avvia l'analisi (subito, se tutto è aggiornato).
+        """
+        btn_analizza.configure(state="normal")
+
+        base_dir = global_config["selected_directory"].get().strip()
+        if not base_dir or not os.path.isdir(base_dir):
+            return
+        dir_ftp_base = os.path.join(base_dir, "00_DominiFTP")
+
+        da_aggiornare = []
+        aggiornati = 0
+        for item_id, esito in esiti.items():
+            if esito is True:
+                da_aggiornare.append(item_id)
+            elif esito is False:
+                aggiornati = aggiornati + 1
+
+        log(
+            "=== Verifica completata: {} aggiornati, {} da aggiornare, {} non verificati ===".format(
+                aggiornati,
+                len(da_aggiornare),
+                len(esiti) - aggiornati - len(da_aggiornare),
+            )
+        )
+
+        if not da_aggiornare:
+            esegui_analisi(base_dir, dir_ftp_base)
+            return
+
+        # si mantiene l'ordine della tabella
+        items_ordinati = []
+        for item_id in tree.get_children():
+            if item_id in da_aggiornare:
+                items_ordinati.append(item_id)
+
+        log("Aggiornamento dei soli domini modificati prima dell'analisi...")
+        avvia_download(costruisci_jobs(items_ordinati, True), base_dir)
+
     def analizza_somiglianze():
         """
         Workflow unico:
           1) Garantisce che il CSV sia caricato.
-          2) Se esiste 00_DominiFTP non vuota → usa direttamente quei dati.
+          2) Se esiste 00_DominiFTP non vuota:
+               - con "Verifica modifiche" attivo confronta il listing remoto con
+                 il manifest locale e riscarica solo i domini cambiati;
+               - altrimenti usa direttamente quei dati.
           3) Altrimenti avvia il download FTP e, al termine, lancia esegui_analisi.
         """
-        nonlocal pending_analysis_after_download
-
         base_dir = global_config["selected_directory"].get().strip()
 
         if not base_dir or not os.path.isdir(base_dir):
@@ -753,14 +1149,23 @@ def create_frame_domini(root, global_config):
             if len(elementi) > 0:
                 use_existing = True
 
+        items = tree.get_children()
+
         if use_existing:
+            if verifica_var.get():
+                jobs = costruisci_jobs(items, True)
+                if jobs:
+                    log("Dati presenti in 00_DominiFTP: verifica delle modifiche sui domini...")
+                    btn_analizza.configure(state="disabled")
+                    ftpAgent.start_batch_check(jobs, base_dir, update_queue)
+                    return
+
             log("Uso i dati già presenti in 00_DominiFTP (nessun nuovo download).")
             esegui_analisi(base_dir, dir_ftp_base)
             return
 
         log("Nessuna directory 00_DominiFTP con dati: avvio download FTP prima dell'analisi.")
 
-        items = tree.get_children()
         if not items:
             messagebox.showwarning(
                 "Attenzione",
@@ -768,46 +1173,7 @@ def create_frame_domini(root, global_config):
             )
             return
 
-        metrics_by_student_cache.clear()
-        texts_test_cache.clear()
-        merged_domain_texts_cache.clear()
-        del students_in_test_cache[:]
-        del students_in_domain_cache[:]
-
-        jobs = []
-
-        i = 0
-        while i < len(items):
-            item_id = items[i]
-            valori_corr = list(tree.item(item_id, "values"))
-
-            alunno = valori_corr[0]
-            dominio = valori_corr[1]
-            stato_base = valori_corr[2]
-
-            cred = credenziali_by_item.get(item_id, ("", ""))
-            ftp_user = cred[0]
-            ftp_pass = cred[1]
-
-            if dominio == "" or ftp_user == "" or ftp_pass == "":
-                try:
-                    tree.set(item_id, "Stato", "Dati FTP incompleti")
-                except Exception:
-                    pass
-                i = i + 1
-                continue
-
-            job = {
-                "item_id": item_id,
-                "alunno": alunno,
-                "dominio": dominio,
-                "stato_base": stato_base,
-                "ftp_user": ftp_user,
-                "ftp_pass": ftp_pass,
-            }
-
-            jobs.append(job)
-            i = i + 1
+        jobs = costruisci_jobs(items, False)
 
         if not jobs:
             messagebox.showwarning(
@@ -815,21 +1181,65 @@ def create_frame_domini(root, global_config):
                 "Nessun job FTP con credenziali complete.",
             )
         else:
-            btn_analizza.configure(state="disabled")
-            pending_analysis_after_download = True
-            ftpAgent.start_batch_download(jobs, base_dir, update_queue)
+            avvia_download(jobs, base_dir)
 
     btn_analizza.configure(command=analizza_somiglianze)
 
     # ==================================================================
-    # TICK PERIODICO: coda + peso FTP
+    # SEZIONE: MONITOR LIVE DEI DOMINI (solo listing durante la verifica)
+    # ==================================================================
+    def scarica_da_monitor(items):
+        """
+        Download (sincronizzato) delle righe scelte nel monitor, seguito
+        dall'analisi come per il pulsante principale.
+        """
+        base_dir = global_config["selected_directory"].get().strip()
+        if not base_dir or not os.path.isdir(base_dir):
+            messagebox.showwarning(
+                "Attenzione",
+                "Seleziona prima la directory principale delle prove.",
+            )
+            return
+
+        presenti = []
+        k = 0
+        while k < len(items):
+            if tree.exists(items[k]):
+                presenti.append(items[k])
+            k = k + 1
+
+        jobs = costruisci_jobs(presenti, True)
+        if jobs:
+            log("Download richiesto dal monitor per {} domini.".format(len(jobs)))
+            avvia_download(jobs, base_dir)
+
+    def apri_monitor():
+        if not tree.get_children():
+            carica_csv(None)
+        monitor_domini.open_domain_monitor(
+            frame,
+            lambda: costruisci_jobs(tree.get_children(), False),
+            scarica_da_monitor,
+        )
+
+    btn_monitor = tk.Button(
+        frame,
+        text="Monitor live domini",
+        width=20,
+        command=apri_monitor,
+        relief="raised"
+    )
+    btn_monitor.grid(row=0, column=4, padx=6, pady=6, sticky="w")
+
+    # ==================================================================
+    # TICK PERIODICO: coda FTP (il peso totale arriva dagli eventi)
     # ==================================================================
     def tick():
         process_update_queue()
-        aggiorna_peso_totale_ftp()
         frame.after(1000, tick)
 
     frame.after(300, tick)
+    frame.after(300, carica_indice_pesi)
 
     # ==================================================================
     # AUTOLOAD CSV DALLA CONFIGURAZIONE
@@ -429,8 +429,17 @@ def create_frame_export(root, global_config):
     )
     log_text.see("end")
 
+    def mix_in_corso(attivo):
+        # durante il mix i *_mix.txt possono essere scritti a metà
+        stato = "disabled" if attivo else "normal"
+        btn_create_pdfs.config(state=stato)
+        btn_megamerge.config(state=stato)
+        if not attivo:
+            update_file_list()
+
     # Avvio
     update_file_list()
     global_config["refresh_export"] = update_file_list
+    global_config["mix_in_corso"] = mix_in_corso
 
     return frame
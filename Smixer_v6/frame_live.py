@@ -1,9 +1,29 @@
 import os
+import time
+from datetime import datetime
+import queue
+import threading
 import tkinter as tk
 from tkinter import filedialog, ttk
 
-from utils import scan_remote_directory, copy_test_directories
-
+import data_handler
+from utils import (
+    scan_remote_directory,
+    copy_test_directories,
+    reconcile_tree_rows,
+    update_tree_cells,
+    format_age,
+)
+from live_watcher import start_watcher, stop_watcher, POLLING_INTERVAL_MAX
+import live_timeline
+import live_copie
+
+# colonna attività: ultimi 30 minuti a 1 minuto per carattere
+ATTIVITA_LIVELLO = 1
+ATTIVITA_BUCKET = 30
+
+# intervallo del tick: aggiorna il tempo trascorso e controlla la directory
+# (le modifiche ai file arrivano subito dal watcher)
 SCAN_INTERVAL = 30000  # 30 secondi
 
 
@@ -72,6 +92,7 @@ def create_frame_live(root, global_config):
             "elenco_file",
             "ultima_modifica",
             "tempo_trascorso",
+            "attivita",
         ),
         show="headings",
     )
@@ -81,6 +102,7 @@ def create_frame_live(root, global_config):
     tree.heading("elenco_file", text="File trovati")
     tree.heading("ultima_modifica", text="Ultima modifica")
     tree.heading("tempo_trascorso", text="Tempo trascorso")
+    tree.heading("attivita", text="Attività (30 min)")
 
     tree.column("cartella", width=100)
     tree.column("num_file", width=60, anchor="center")
@@ -88,6 +110,7 @@ def create_frame_live(root, global_config):
     tree.column("elenco_file", width=420)
     tree.column("ultima_modifica", width=140)
     tree.column("tempo_trascorso", width=110, anchor="center")
+    tree.column("attivita", width=230)
 
     tree.grid(row=2, column=0, columnspan=5, padx=10, pady=10, sticky="nsew")
 
@@ -112,6 +135,11 @@ def create_frame_live(root, global_config):
     lbl_esito.grid(row=3, column=1, columnspan=4, sticky="w", padx=5, pady=5)
 
     def crea_copia():
+        # durante una copia il pulsante la annulla
+        if data_handler.copy_jobs_running():
+            data_handler.cancel_copy_jobs()
+            return
+
         nome_verifica = global_config["verifica_name"].get().strip()
         directory_remota = global_config["remote_directory"].get().strip()
 
@@ -121,82 +149,395 @@ def create_frame_live(root, global_config):
 
         destinazione = filedialog.askdirectory(title="Seleziona destinazione")
         if destinazione:
-            esito = copy_test_directories(directory_remota, destinazione, nome_verifica)
+            def _aggiorna_esito(testo):
+                lbl_esito.config(text=testo)
+                if not data_handler.copy_jobs_running():
+                    btn_copy.config(text="Crea copia locale")
+
+            esito = copy_test_directories(
+                directory_remota,
+                destinazione,
+                nome_verifica,
+                widget=frame,
+                on_update=_aggiorna_esito,
+            )
             lbl_esito.config(text=esito)
+            if data_handler.copy_jobs_running():
+                btn_copy.config(text="Annulla copia")
 
     btn_copy = tk.Button(frame, text="Crea copia locale", command=crea_copia, bg='lime', font=( 'bold') )
     btn_copy.grid(row=3, column=0, padx=5, pady=5 )
    
 
-    # === Aggiornamento periodico "a goccia" === #
+    lbl_scan = tk.Label(frame, text="Nessuna scansione eseguita.", bg="white", anchor="w")
+    lbl_scan.grid(row=4, column=0, columnspan=5, sticky="w", padx=5, pady=(0, 5))
+
+    # === Avvisi di possibili copie tra postazioni === #
+    tree_avvisi = ttk.Treeview(
+        frame,
+        columns=("ora", "tipo", "cartelle", "file"),
+        show="headings",
+        height=5,
+    )
+    tree_avvisi.heading("ora", text="Ora")
+    tree_avvisi.heading("tipo", text="Possibile copia")
+    tree_avvisi.heading("cartelle", text="Cartelle")
+    tree_avvisi.heading("file", text="File")
+
+    tree_avvisi.column("ora", width=80, anchor="center")
+    tree_avvisi.column("tipo", width=130, anchor="center")
+    tree_avvisi.column("cartelle", width=160, anchor="center")
+    tree_avvisi.column("file", width=600)
+
+    tree_avvisi.grid(row=5, column=0, columnspan=5, padx=10, pady=(0, 10), sticky="ew")
+
+    # === Aggiornamento event-driven === #
+    # Un watcher (inotify su Linux, polling leggero su share di rete/Windows)
+    # segnala solo le cartelle test cambiate: vengono riscandite solo quelle,
+    # in un thread, e le righe corrispondenti aggiornate via after().
+    # Il tick periodico non fa I/O: aggiorna il "tempo trascorso" e riavvia
+    # il watcher se la directory remota è cambiata.
     auto_job_id = None
+    coda_scan = queue.Queue()
+    coda_watcher = queue.Queue()
+    scan_stato = {"in_corso": False}
+    watcher_stato = {"watcher": None, "path": "", "nomi": [], "polling_max": None}
+    cartelle_in_attesa = set()
+
+    # storico dell'attività per cartella (ring buffer in memoria) e indice
+    # dei contenuti per gli avvisi di copia, legati alla directory remota e
+    # alle estensioni scandite
+    timeline_stato = {
+        "timeline": live_timeline.new_timeline(),
+        "copie": live_copie.new_copy_index(),
+        "chiave": None,
+    }
+
+    def _timeline_per(path, estensioni):
+        chiave = (path, estensioni)
+        if timeline_stato["chiave"] != chiave:
+            timeline_stato["timeline"] = live_timeline.new_timeline()
+            timeline_stato["copie"] = live_copie.new_copy_index()
+            timeline_stato["chiave"] = chiave
+            tree_avvisi.delete(*tree_avvisi.get_children())
+        return timeline_stato["timeline"], timeline_stato["copie"]
+
+    def _esegui_scan(path, estensioni, conta_righe, cartelle, timeline, copie):
+        t0 = time.perf_counter()
+        try:
+            risultati = scan_remote_directory(
+                path,
+                estensioni,
+                count_lines=conta_righe,
+                only_folders=cartelle,
+                timeline=timeline,
+                copy_index=copie,
+            )
+            errore = None
+        except Exception as e:
+            risultati = []
+            errore = str(e)
+        coda_scan.put((risultati, errore, time.perf_counter() - t0, cartelle))
 
-    def aggiorna_tabella():
+    def _avvia_scan(cartelle=None):
         """
-        Aggiorna la tabella leggendo la directory remota e l'estensione/i.
+        Scansione in background: tutte le cartelle (None) o solo 'cartelle'.
+        Restituisce False se una scansione è già in corso.
         """
-        nonlocal auto_job_id
+        if scan_stato["in_corso"]:
+            return False
 
         path = global_config["remote_directory"].get().strip()
         estensioni = global_config["file_extension"].get().strip()
 
-        for i in tree.get_children():
-            tree.delete(i)
-
         if not path or not os.path.isdir(path):
-            auto_job_id = None
-            return
+            for i in tree.get_children():
+                tree.delete(i)
+            return True
+
+        scan_stato["in_corso"] = True
+        if cartelle is None:
+            lbl_scan.config(text="Scansione in corso...")
+        timeline, copie = _timeline_per(path, estensioni)
+        threading.Thread(
+            target=_esegui_scan,
+            args=(
+                path,
+                estensioni,
+                count_lines_var.get(),
+                cartelle,
+                timeline,
+                copie,
+            ),
+            daemon=True,
+        ).start()
+        frame.after(200, _controlla_scan)
+        return True
+
+    def _testo_attivita(nome_dir):
+        """
+        Sparkline dei file toccati negli ultimi 30 minuti, dallo storico
+        (nessun accesso ai file).
+        """
+        timeline = timeline_stato["timeline"]
+        serie = live_timeline.get_series(
+            timeline, nome_dir, ATTIVITA_LIVELLO, ATTIVITA_BUCKET, "file"
+        )
+        totale = sum(serie)
+        if totale == 0:
+            return ""
+        if not count_lines_var.get():
+            # senza "Conta righe" le righe non vengono contate
+            return "{} {} mod.".format(live_timeline.sparkline(serie), totale)
+        righe = sum(
+            live_timeline.get_series(
+                timeline, nome_dir, ATTIVITA_LIVELLO, ATTIVITA_BUCKET, "righe"
+            )
+        )
+        return "{} {} mod. ({:+d} righe)".format(
+            live_timeline.sparkline(serie), totale, righe
+        )
 
-        risultati = scan_remote_directory(
-            path,
-            estensioni,
-            count_lines=count_lines_var.get(),
+    def _valori_riga(risultato):
+        nome_dir, num_file, num_righe, files, ultima_mod, age_str = risultato
+        righe_display = num_righe if num_righe is not None else "-"
+        return (
+            nome_dir,
+            num_file,
+            righe_display,
+            ", ".join(files),
+            ultima_mod,
+            age_str,
+            _testo_attivita(nome_dir),
         )
 
-        for nome_dir, num_file, num_righe, files, ultima_mod, age_str in risultati:
-            righe_display = num_righe if num_righe is not None else "-"
-            tree.insert(
+    def _aggiorna_righe(risultati, cartelle):
+        """
+        Aggiorna solo le righe delle cartelle riscandite (in ordine di nome);
+        le cartelle sparite vengono rimosse.
+        """
+        per_nome = {}
+        for risultato in risultati:
+            per_nome[risultato[0]] = risultato
+
+        for nome in sorted(cartelle):
+            if nome not in per_nome:
+                if tree.exists(nome):
+                    tree.delete(nome)
+                live_timeline.forget_folder(timeline_stato["timeline"], nome)
+                live_copie.forget_folder(timeline_stato["copie"], nome)
+                continue
+
+            valori = _valori_riga(per_nome[nome])
+            if tree.exists(nome):
+                update_tree_cells(tree, [(nome, col, v) for col, v in zip(tree["columns"], valori)])
+            else:
+                indice = 0
+                for iid in tree.get_children():
+                    if iid < nome:
+                        indice += 1
+                tree.insert("", indice, iid=nome, values=valori)
+
+    def _mostra_avvisi():
+        """
+        Inserisce in cima alla tabella avvisi le nuove possibili copie.
+        """
+        base = global_config["remote_directory"].get().strip()
+
+        def _relativo(percorso):
+            try:
+                return os.path.relpath(percorso, base)
+            except ValueError:
+                return percorso
+
+        for avviso in live_copie.pop_alerts(timeline_stato["copie"]):
+            if avviso["tipo"] == "identico":
+                tipo = "Identico"
+            else:
+                tipo = "Simile {:.0f}%".format(avviso["quota"] * 100)
+            tree_avvisi.insert(
                 "",
-                "end",
+                0,
                 values=(
-                    nome_dir,
-                    num_file,
-                    righe_display,
-                    ", ".join(files),
-                    ultima_mod,
-                    age_str,
+                    time.strftime("%H:%M:%S", time.localtime(avviso["ora"])),
+                    tipo,
+                    "{} ↔ {}".format(avviso["cartella"], avviso["altra_cartella"]),
+                    "{} ↔ {}".format(_relativo(avviso["file"]), _relativo(avviso["altro_file"])),
                 ),
             )
 
-        if auto_refresh_var.get():
-            if auto_job_id is not None:
-                try:
-                    frame.after_cancel(auto_job_id)
-                except Exception:
-                    pass
-            auto_job_id = frame.after(SCAN_INTERVAL, aggiorna_tabella)
+    def _controlla_scan():
+        try:
+            risultati, errore, durata, cartelle = coda_scan.get_nowait()
+        except queue.Empty:
+            frame.after(200, _controlla_scan)
+            return
+
+        scan_stato["in_corso"] = False
+        _mostra_avvisi()
+
+        if cartelle is None:
+            reconcile_tree_rows(tree, [(r[0], _valori_riga(r)) for r in risultati])
+            testo = "Ultima scansione: {} ({:.1f} s, {} cartelle)".format(
+                time.strftime("%H:%M:%S"),
+                durata,
+                len(risultati),
+            )
         else:
-            auto_job_id = None
+            _aggiorna_righe(risultati, cartelle)
+            testo = "Aggiornate alle {}: {} ({:.1f} s)".format(
+                time.strftime("%H:%M:%S"),
+                ", ".join(sorted(cartelle)),
+                durata,
+            )
+
+        if watcher_stato["watcher"] is not None:
+            testo = testo + " — watcher: " + watcher_stato["watcher"]["backend"]
+        if errore is not None:
+            testo = testo + " — errore: " + errore
+        lbl_scan.config(text=testo)
+
+        if cartelle_in_attesa:
+            _avvia_scan(set(cartelle_in_attesa))
+            cartelle_in_attesa.clear()
+
+    def _on_watcher_change(nomi):
+        # chiamata dal thread del watcher: nessun accesso a Tk
+        coda_watcher.put(nomi)
+
+    def _controlla_watcher():
+        while True:
+            try:
+                cartelle_in_attesa.update(coda_watcher.get_nowait())
+            except queue.Empty:
+                break
+
+        if cartelle_in_attesa and not scan_stato["in_corso"]:
+            _avvia_scan(set(cartelle_in_attesa))
+            cartelle_in_attesa.clear()
+
+        frame.after(300, _controlla_watcher)
+
+    def ferma_watcher():
+        stop_watcher(watcher_stato["watcher"])
+        watcher_stato["watcher"] = None
+        watcher_stato["path"] = ""
+        watcher_stato["nomi"] = []
+        watcher_stato["polling_max"] = None
+        cartelle_in_attesa.clear()
+
+    def _polling_max():
+        """
+        Intervallo massimo (s) del watcher a polling, da global_config;
+        il valore predefinito se assente o non valido.
+        """
+        variabile = global_config.get("live_polling_max_s")
+        try:
+            valore = float(variabile.get())
+        except Exception:
+            return POLLING_INTERVAL_MAX
+        if valore <= 0:
+            return POLLING_INTERVAL_MAX
+        return valore
+
+    def avvia_watcher():
+        ferma_watcher()
+        path = global_config["remote_directory"].get().strip()
+        if not path or not os.path.isdir(path):
+            return
+        # anche le cartelle non ancora create: il watcher ne segnala la comparsa
+        nomi = data_handler.expected_test_folder_names()
+        polling_max = _polling_max()
+        watcher_stato["watcher"] = start_watcher(
+            path, nomi, _on_watcher_change, polling_interval_max=polling_max
+        )
+        watcher_stato["path"] = path
+        watcher_stato["nomi"] = nomi
+        watcher_stato["polling_max"] = polling_max
+
+    def _watcher_da_riavviare(path):
+        """
+        True se la directory remota, i pattern delle cartelle test o
+        l'intervallo massimo del polling sono cambiati.
+        """
+        return (
+            path != watcher_stato["path"]
+            or data_handler.expected_test_folder_names() != watcher_stato["nomi"]
+            or _polling_max() != watcher_stato["polling_max"]
+        )
+
+    def _aggiorna_tempi():
+        """
+        Ricalcola le colonne "Tempo trascorso" e "Attività" dai valori in
+        tabella e dallo storico (nessun I/O).
+        """
+        modifiche = []
+        for iid in tree.get_children():
+            modifiche.append((iid, "attivita", _testo_attivita(iid)))
+            ultima_mod = tree.set(iid, "ultima_modifica")
+            try:
+                istante = datetime.strptime(ultima_mod, "%Y-%m-%d %H:%M:%S").timestamp()
+            except Exception:
+                continue
+            modifiche.append((iid, "tempo_trascorso", format_age(istante)))
+        update_tree_cells(tree, modifiche)
+
+    def tick():
+        nonlocal auto_job_id
+        auto_job_id = None
+        if not auto_refresh_var.get():
+            return
+
+        path = global_config["remote_directory"].get().strip()
+        if _watcher_da_riavviare(path):
+            avvia_watcher()
+            _avvia_scan()
+        else:
+            _aggiorna_tempi()
+
+        auto_job_id = frame.after(SCAN_INTERVAL, tick)
+
+    def aggiorna_tabella():
+        """
+        Scansione completa in background (pulsante "Scan").
+        Se la scansione precedente è ancora in corso viene saltata.
+        """
+        if auto_refresh_var.get():
+            path = global_config["remote_directory"].get().strip()
+            if _watcher_da_riavviare(path):
+                avvia_watcher()
+
+        if not _avvia_scan():
+            lbl_scan.config(text="Scansione precedente ancora in corso: aggiornamento saltato.")
 
     def on_toggle_auto():
         nonlocal auto_job_id
 
+        if auto_job_id is not None:
+            try:
+                frame.after_cancel(auto_job_id)
+            except Exception:
+                pass
+            auto_job_id = None
+
         if auto_refresh_var.get():
+            avvia_watcher()
             aggiorna_tabella()
+            auto_job_id = frame.after(SCAN_INTERVAL, tick)
         else:
-            if auto_job_id is not None:
-                try:
-                    frame.after_cancel(auto_job_id)
-                except Exception:
-                    pass
-                auto_job_id = None
+            ferma_watcher()
 
     chk_auto_refresh.config(command=on_toggle_auto)
 
     btn_scan.config(command=aggiorna_tabella)
-    btn_clear.config(command=lambda: tree.delete(*tree.get_children()))
+    def pulisci_tabella():
+        tree.delete(*tree.get_children())
+        tree_avvisi.delete(*tree_avvisi.get_children())
+
+    btn_clear.config(command=pulisci_tabella)
 
+    frame.after(300, _controlla_watcher)
     if auto_refresh_var.get():
-        auto_job_id = frame.after(SCAN_INTERVAL, aggiorna_tabella)
+        auto_job_id = frame.after(1000, tick)
 
     return frame
@@ -1,5 +1,4 @@
 import os
-import shutil
 
 import tkinter as tk
 from tkinter import filedialog, messagebox, Scrollbar
@@ -9,6 +8,7 @@ import data_handler
 import utils
 
 YELLOW_BG = "#fff5cc"
+ARCHIVIO_NESSUNO = "nessun archivio"
 
 
 def create_frame_preparazione(root, global_config):
@@ -81,23 +81,49 @@ def create_frame_preparazione(root, global_config):
     tree_stats.column("num_extension_files", width=140, anchor="center")
     tree_stats.column("extension_files", width=420, anchor="w")
 
-    def update_remote_stats_table():
+    def update_remote_stats_table(scansione=None):
         """
         Aggiorna la tabella con le informazioni sulle cartelle test01..test30
         presenti nella directory remota, usando le estensioni in global_config["file_extension"].
+
+        scansione: opzionale, risultato di data_handler.start_scan_job
+        (job["scansione"]): la tabella viene riempita senza rivisitare le cartelle.
         """
         remote_dir = global_config["remote_directory"].get().strip()
         entry_extension = global_config["file_extension"]  # StringVar
 
         tree_stats.delete(*tree_stats.get_children())
 
+        if scansione is not None:
+            exts = utils.parse_extensions(entry_extension.get().strip())
+            for folder_name, _folder_path, risultato in scansione:
+                if risultato is None:
+                    continue
+                files, dirs = risultato
+                if exts:
+                    ext_files = [
+                        nome for _root, nome, _st in files
+                        if any(nome.lower().endswith(e) for e in exts)
+                    ]
+                else:
+                    ext_files = [nome for _root, nome, _st in files]
+                tree_stats.insert(
+                    "",
+                    "end",
+                    values=(
+                        folder_name,
+                        len(dirs),
+                        len(files),
+                        len(ext_files),
+                        ", ".join(ext_files),
+                    ),
+                )
+            return
+
         if not remote_dir or not os.path.isdir(remote_dir):
             return
 
         for folder_name, folder_path in data_handler._iter_test_folders(remote_dir):
-            if not os.path.isdir(folder_path):
-                continue
-
             num_folders, num_files, num_ext, ext_files = utils.count_directory_content(
                 folder_path, entry_extension
             )
@@ -129,8 +155,21 @@ def create_frame_preparazione(root, global_config):
                 "Imposta prima la directory remota (contente le cartelle testXX).",
             )
             return
-        data_handler.scan_test_folders(remote_dir, report_text)
-        update_remote_stats_table()
+
+        def _scansione_terminata(job):
+            btn_scan.config(state="normal")
+            update_remote_stats_table(job["scansione"])
+
+        # la scansione gira in background: il pulsante resta disattivato
+        # finché il report non è stato scritto
+        job = data_handler.scan_test_folders(
+            remote_dir,
+            report_text,
+            summary_only=True if solo_riepilogo_var.get() else None,
+            on_done=_scansione_terminata,
+        )
+        if job is not None:
+            btn_scan.config(state="disabled")
 
     btn_scan = tk.Button(
         frame,
@@ -140,6 +179,16 @@ def create_frame_preparazione(root, global_config):
     )
     btn_scan.grid(row=1, column=0, padx=8, pady=4, sticky="ew")
 
+    # Report della scansione: solo una riga per cartella (automatico oltre
+    # data_handler.REPORT_SUMMARY_THRESHOLD file)
+    solo_riepilogo_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(
+        frame,
+        text="Scansione: solo riepilogo",
+        variable=solo_riepilogo_var,
+        bg=YELLOW_BG,
+    ).grid(row=3, column=4, sticky="e", padx=8, pady=4)
+
     # Label per mostrare l'ultima directory locale creata
     lbl_local_dir = tk.Label(
         frame,
@@ -147,13 +196,56 @@ def create_frame_preparazione(root, global_config):
         anchor="w",
         bg=YELLOW_BG,
     )
-    lbl_local_dir.grid(row=2, column=0, columnspan=5, sticky="ew", padx=8, pady=4)
+    lbl_local_dir.grid(row=2, column=1, columnspan=4, sticky="ew", padx=8, pady=4)
+
+    # Opzioni della copia locale
+    incrementale_var = tk.BooleanVar(value=False)
+    verifica_hash_var = tk.BooleanVar(value=False)
+
+    frame_opzioni_copia = tk.Frame(frame, bg=YELLOW_BG)
+    frame_opzioni_copia.grid(row=2, column=0, sticky="w", padx=8, pady=4)
+
+    tk.Checkbutton(
+        frame_opzioni_copia,
+        text="Copia incrementale",
+        variable=incrementale_var,
+        bg=YELLOW_BG,
+    ).pack(side="left")
+    tk.Checkbutton(
+        frame_opzioni_copia,
+        text="Verifica hash",
+        variable=verifica_hash_var,
+        bg=YELLOW_BG,
+    ).pack(side="left")
+
+    # Archivio compresso creato durante la copia (o al posto della copia)
+    archivio_var = tk.StringVar(value=ARCHIVIO_NESSUNO)
+    solo_archivio_var = tk.BooleanVar(value=False)
+
+    ttk.Combobox(
+        frame_opzioni_copia,
+        textvariable=archivio_var,
+        values=(ARCHIVIO_NESSUNO,) + data_handler.ARCHIVE_FORMATS,
+        state="readonly",
+        width=14,
+    ).pack(side="left", padx=(8, 0))
+    tk.Checkbutton(
+        frame_opzioni_copia,
+        text="Solo archivio",
+        variable=solo_archivio_var,
+        bg=YELLOW_BG,
+    ).pack(side="left")
 
     def do_create_local_copy():
         """
-        Crea una copia locale di test01..test30 sul Desktop in una cartella
+        Crea una copia locale delle cartelle test sul Desktop in una cartella
         timestampata + nome verifica, aggiorna il log e imposta selected_directory.
+        La copia gira in background: durante la copia il pulsante la annulla.
         """
+        if data_handler.copy_jobs_running():
+            data_handler.cancel_copy_jobs()
+            return
+
         remote_dir = global_config["remote_directory"].get().strip()
         nome_verifica = global_config["verifica_name"].get().strip()
 
@@ -164,16 +256,15 @@ def create_frame_preparazione(root, global_config):
             )
             return
 
-        new_dir = data_handler.create_local_copy(
-            remote_dir,
-            report_text,
-            lbl_local_dir,
-            lambda *_: None,
-            lambda *_: None,
-            nome_verifica=nome_verifica,
-        )
+        formato_archivio = archivio_var.get()
+        if formato_archivio not in data_handler.ARCHIVE_FORMATS:
+            formato_archivio = None
 
-        if new_dir:
+        def _copia_terminata(new_dir, job):
+            btn_create_copy.config(text="Crea copia locale (Desktop)")
+            if new_dir is None:
+                # creato solo l'archivio
+                return
             global_config["selected_directory"].set(new_dir)
             lbl_local_dir.config(
                 text=f"Ultima directory locale creata: {new_dir}"
@@ -184,6 +275,21 @@ def create_frame_preparazione(root, global_config):
             )
             report_text.see("end")
 
+        data_handler.create_local_copy(
+            remote_dir,
+            report_text,
+            lbl_local_dir,
+            lambda *_: None,
+            lambda *_: None,
+            nome_verifica=nome_verifica,
+            on_done=_copia_terminata,
+            incremental=incrementale_var.get(),
+            verify_hash=verifica_hash_var.get(),
+            archive_format=formato_archivio,
+            archive_only=solo_archivio_var.get(),
+        )
+        btn_create_copy.config(text="Annulla copia")
+
     btn_create_copy = tk.Button(
         frame,
         text="Crea copia locale (Desktop)",
@@ -192,11 +298,20 @@ def create_frame_preparazione(root, global_config):
     )
     btn_create_copy.grid(row=1, column=1, padx=8, pady=4, sticky="ew")
 
+    # job della distribuzione in corso (None se nessuna)
+    distribuzione = {"job": None}
+
     def do_distribute_file():
         """
-        Chiede un file e lo copia in tutte le cartelle test01..test30
-        presenti nella directory remota.
+        Chiede un file o una cartella e lo copia in tutte le cartelle
+        test01..test30 presenti nella directory remota (in background,
+        saltando le copie già identiche). Durante la distribuzione il
+        pulsante la annulla.
         """
+        if distribuzione["job"] is not None:
+            distribuzione["job"]["stop"].set()
+            return
+
         remote_dir = global_config["remote_directory"].get().strip()
         if not remote_dir:
             messagebox.showwarning(
@@ -205,42 +320,57 @@ def create_frame_preparazione(root, global_config):
             )
             return
 
-        file_path = filedialog.askopenfilename(
-            title="Seleziona il file da distribuire nelle cartelle test"
+        scelta = messagebox.askyesnocancel(
+            "Distribuisci",
+            "Vuoi distribuire un'intera cartella?\n\n"
+            "Sì = cartella (con tutte le sottocartelle)\n"
+            "No = singolo file",
         )
-        if not file_path:
+        if scelta is None:
+            return
+        if scelta:
+            source = filedialog.askdirectory(
+                title="Seleziona la cartella da distribuire nelle cartelle test"
+            )
+        else:
+            source = filedialog.askopenfilename(
+                title="Seleziona il file da distribuire nelle cartelle test"
+            )
+        if not source:
+            return
+
+        try:
+            job = data_handler.start_distribute_job(source, remote_dir)
+        except Exception as e:
+            messagebox.showerror("Errore", f"Distribuzione non avviata:\n{e}")
             return
 
-        file_name = os.path.basename(file_path)
-        copied_count = 0
+        distribuzione["job"] = job
+        btn_distribute.config(text="Annulla distribuzione")
 
+        report_text.mark_unset(data_handler.PROGRESS_MARK)
         report_text.insert(
             "end",
-            f"Distribuzione del file '{file_name}' nelle cartelle test...\n",
+            f"Distribuzione di '{os.path.basename(os.path.normpath(source))}' nelle cartelle test...\n",
         )
 
-        for folder_name, folder_path in data_handler._iter_test_folders(remote_dir):
-            if os.path.isdir(folder_path):
-                dest_path = os.path.join(folder_path, file_name)
-                try:
-                    shutil.copy2(file_path, dest_path)
-                    copied_count += 1
-                except Exception as e:
-                    report_text.insert(
-                        "end",
-                        f"Errore nel copiare {file_name} in {folder_name}: {e}\n",
-                    )
-
-        if copied_count == 0:
-            msg = (
-                "Nessuna cartella test01–test30 trovata nella directory remota.\n"
-                "File NON distribuito."
+        def _avanzamento(job):
+            data_handler._write_progress_line(
+                report_text, data_handler.format_distribute_progress(job)
             )
-        else:
-            msg = f"File '{file_name}' distribuito in {copied_count} cartelle test.\n"
 
-        report_text.insert("end", msg + "\n")
-        report_text.see("end")
+        def _fine(job):
+            distribuzione["job"] = None
+            btn_distribute.config(text="Distribuisci file nelle cartelle test")
+            data_handler._write_progress_line(
+                report_text, data_handler.format_distribute_summary(job)
+            )
+            report_text.mark_unset(data_handler.PROGRESS_MARK)
+            report_text.see("end")
+            update_remote_stats_table()
+
+        _avanzamento(job)
+        data_handler.follow_copy_job(report_text, job, _avanzamento, _fine)
 
     btn_distribute = tk.Button(
         frame,
@@ -259,7 +389,10 @@ def create_frame_preparazione(root, global_config):
             )
             return
 
-        data_handler.clear_test_folders(remote_dir, report_text)
+        # le cartelle test sono vuote al ritorno; il cestino viene
+        # cancellato in background
+        if data_handler.clear_test_folders(remote_dir, report_text) is not None:
+            update_remote_stats_table()
 
     btn_clear_remote = tk.Button(
         frame,
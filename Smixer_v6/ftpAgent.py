@@ -4,23 +4,78 @@ Modulo procedurale per la gestione dei download FTP dei domini Altervista.
 
 Responsabilità:
 - Connessione FTP (latin-1 per gestire risposte non UTF-8)
-- Traversal ricorsivo (MLSD se disponibile, altrimenti NLST)
+- Traversal in ampiezza su una sola connessione (MLSD se disponibile,
+  altrimenti LIST con parsing dei formati Unix e DOS), con cache per dominio
 - Download file con versionamento incrementale locale
 - Aggiornamento progressi verso la GUI tramite 'update_queue'
+  (i "set" dei worker vengono accorpati e inviati a frequenza fissa)
 - Esecuzione parallela (un thread per dominio)
 - Segnale di completamento batch ("fine_download")
+- Indice persistente per alunno ('__indice_ftp.json' in '00_DominiFTP'):
+  peso della cartella e manifest dei file remoti scaricati (size/modify MLSD)
+- Verifica "solo listing" dei domini già scaricati (aggiornato / da aggiornare)
+- Limite di banda (token bucket globale condiviso + limite per connessione),
+  modificabile a runtime
+- Deduplicazione per contenuto: ogni file scaricato viene collegato (hardlink)
+  a un archivio di blob indicizzato per sha256 ('00_DominiFTP/00_blob')
+- Tempi per fase di ogni dominio (connessione, listing, trasferimento),
+  inviati come ("tempi", item_id, {...}) per confronti e benchmark
+
+Campi opzionali dei job: 'ftp_host' / 'ftp_port' sostituiscono l'host
+'ftp.<dominio>' e la porta 21 (server locali di prova, vedi bench_ftp.py).
 
 Interfaccia pubblica:
-- start_batch_download(jobs, base_dir, update_queue)
+- start_batch_download(jobs, base_dir, update_queue, on_file_downloaded=None)
+- start_batch_check(jobs, base_dir, update_queue)
+- set_bandwidth_limit(globale_kb_s, per_connessione_kb_s) / get_bandwidth_limit()
+- shared_file_hashes(dir_ftp_base, min_alunni)
+- clear_listing_cache()
+- poll_domain(job, dirs_precedenti, forza)  (monitor live, solo listing)
+- load_ftp_sizes(dir_ftp_base)
+- rescan_ftp_sizes(dir_ftp_base)
 
 Il chiamante si occupa di costruire 'jobs' e di passare 'base_dir' (cartella radice
 che contiene le cartelle test; qui verrà creata/aggiornata la sottocartella '00_DominiFTP').
 """
 
 import os
+import re
+import json
 from ftplib import FTP
 from datetime import datetime
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import utils
+
+# Intervallo (secondi) con cui i progressi accorpati vengono inviati alla GUI
+PROGRESS_FLUSH_INTERVAL = 0.5
+
+# File indice (in '00_DominiFTP') con il peso in byte di ogni cartella alunno
+INDEX_FILE_NAME = "__indice_ftp.json"
+
+_index_lock = threading.Lock()
+
+# Archivio dei contenuti (in '00_DominiFTP'): 00_blob/<sha[:2]>/<sha256>
+BLOB_DIR_NAME = "00_blob"
+
+# estensione dei file in scaricamento (rinominati sul nome finale solo a
+# trasferimento riuscito)
+PARTIAL_SUFFIX = ".part"
+
+# Connessioni contemporanee usate dalla verifica "solo listing"
+CHECK_MAX_WORKERS = 8
+
+# Cache in memoria dei listing remoti per dominio: un download lanciato subito
+# dopo una verifica riusa il listing appena ottenuto (validità in secondi).
+LISTING_CACHE_TTL = 60
+_listing_cache = {}
+_listing_cache_lock = threading.Lock()
+
+# Limiti di banda in byte/s (0 = illimitato), letti a ogni blocco ricevuto:
+# una modifica a runtime ha effetto anche sui download in corso.
+_bandwidth_limits = {"globale": 0, "per_connessione": 0}
 
 
 # ======================================================================
@@ -58,15 +113,757 @@ def _get_versioned_path(percorso_base):
         contatore = contatore + 1
 
 
+def _folder_size(percorso):
+    """
+    Somma le dimensioni di tutti i file sotto 'percorso' (0 se non esiste).
+
+    È il peso "logico": i file collegati ai blob (hardlink) contano per
+    intero in ogni cartella alunno; lo spazio occupato davvero dai contenuti
+    deduplicati è il peso di BLOB_DIR_NAME, riportato a parte.
+    """
+    totale = 0
+    if not os.path.isdir(percorso):
+        return totale
+
+    for radice, _, files in os.walk(percorso):
+        j = 0
+        while j < len(files):
+            try:
+                totale = totale + os.path.getsize(os.path.join(radice, files[j]))
+            except Exception:
+                pass
+            j = j + 1
+
+    return totale
+
+
+def _remove_partial(percorso_parziale):
+    """
+    Rimuove (se c'è) il file temporaneo di un download non riuscito.
+    """
+    try:
+        if os.path.lexists(percorso_parziale):
+            os.remove(percorso_parziale)
+    except Exception:
+        pass
+
+
+def _dedup_file(dir_ftp_base, percorso_locale):
+    """
+    Deduplica un file appena scaricato tramite l'archivio dei blob.
+
+    - se il contenuto è già in archivio, il file locale viene sostituito da
+      un hardlink al blob esistente;
+    - altrimenti il file stesso diventa il blob (hardlink in archivio).
+
+    Se il filesystem non supporta gli hardlink il file resta una copia
+    normale: il riferimento al contenuto rimane comunque nel manifest.
+    Restituisce (sha256, byte_nuovi_in_archivio).
+    """
+    sha = utils.file_sha256(percorso_locale)
+    if sha is None:
+        raise OSError("file non leggibile: " + percorso_locale)
+
+    cartella_blob = os.path.join(dir_ftp_base, BLOB_DIR_NAME, sha[:2])
+    percorso_blob = os.path.join(cartella_blob, sha)
+
+    try:
+        os.makedirs(cartella_blob, exist_ok=True)
+    except Exception:
+        return sha, 0
+
+    if not os.path.isfile(percorso_blob):
+        try:
+            os.link(percorso_locale, percorso_blob)
+            return sha, os.path.getsize(percorso_blob)
+        except FileExistsError:
+            # creato nel frattempo da un altro worker: si procede al collegamento
+            pass
+        except Exception:
+            return sha, 0
+
+    temporaneo = percorso_locale + ".dedup_tmp"
+    try:
+        os.link(percorso_blob, temporaneo)
+        os.replace(temporaneo, percorso_locale)
+    except Exception:
+        try:
+            if os.path.exists(temporaneo):
+                os.remove(temporaneo)
+        except Exception:
+            pass
+
+    return sha, 0
+
+
+# ======================================================================
+# INDICE PESI PER ALUNNO (persistente in 00_DominiFTP)
+# ======================================================================
+
+def _load_ftp_index(dir_ftp_base):
+    """
+    Legge l'indice JSON di '00_DominiFTP'.
+    Restituisce None se l'indice non esiste o non è leggibile.
+    """
+    percorso = os.path.join(dir_ftp_base, INDEX_FILE_NAME)
+    if not os.path.isfile(percorso):
+        return None
+
+    try:
+        with open(percorso, "r", encoding="utf-8") as f:
+            dati = json.load(f)
+    except Exception:
+        return None
+
+    if not isinstance(dati, dict):
+        return None
+    if not isinstance(dati.get("alunni"), dict):
+        dati["alunni"] = {}
+    return dati
+
+
+def _save_ftp_index(dir_ftp_base, dati):
+    """
+    Scrive l'indice JSON in modo atomico (file temporaneo + replace).
+    """
+    percorso = os.path.join(dir_ftp_base, INDEX_FILE_NAME)
+    temporaneo = percorso + ".tmp"
+    try:
+        with open(temporaneo, "w", encoding="utf-8") as f:
+            json.dump(dati, f, indent=1)
+        os.replace(temporaneo, percorso)
+    except Exception:
+        pass
+
+
+def _update_alunno_index(dir_ftp_base, alunno, campi):
+    """
+    Aggiorna (sotto lock) la voce di un alunno nell'indice.
+    """
+    with _index_lock:
+        dati = _load_ftp_index(dir_ftp_base)
+        if dati is None:
+            dati = {"alunni": {}}
+        voce = dati["alunni"].get(alunno)
+        if not isinstance(voce, dict):
+            voce = {}
+        voce.update(campi)
+        dati["alunni"][alunno] = voce
+        _save_ftp_index(dir_ftp_base, dati)
+
+
+def _prune_blobs(dir_ftp_base):
+    """
+    Elimina dall'archivio i blob non più collegati a nessun file alunno
+    (un solo link: quello dell'archivio stesso).
+    """
+    for radice, _, files in os.walk(os.path.join(dir_ftp_base, BLOB_DIR_NAME)):
+        j = 0
+        while j < len(files):
+            percorso = os.path.join(radice, files[j])
+            try:
+                if os.stat(percorso).st_nlink <= 1:
+                    os.remove(percorso)
+            except Exception:
+                pass
+            j = j + 1
+
+
+def _add_blob_size(dir_ftp_base, byte_aggiunti):
+    """
+    Aggiunge all'indice il peso dei nuovi blob creati da un job.
+    """
+    if byte_aggiunti <= 0:
+        return
+    with _index_lock:
+        dati = _load_ftp_index(dir_ftp_base)
+        if dati is None:
+            dati = {"alunni": {}}
+        try:
+            attuale = int(dati.get("peso_blob", 0))
+        except Exception:
+            attuale = 0
+        dati["peso_blob"] = attuale + byte_aggiunti
+        _save_ftp_index(dir_ftp_base, dati)
+
+
+def shared_file_hashes(dir_ftp_base, min_alunni):
+    """
+    Restituisce gli sha256 dei file presenti nei domini di almeno
+    'min_alunni' alunni diversi (tipicamente librerie di terze parti).
+    """
+    with _index_lock:
+        dati = _load_ftp_index(dir_ftp_base)
+
+    if dati is None:
+        return set()
+
+    alunni_per_hash = {}
+    for alunno, voce in dati["alunni"].items():
+        if not isinstance(voce, dict) or not isinstance(voce.get("manifest"), dict):
+            continue
+        visti = set()
+        for voce_file in voce["manifest"].values():
+            sha = voce_file.get("sha256", "")
+            if sha != "" and sha not in visti:
+                visti.add(sha)
+                alunni_per_hash[sha] = alunni_per_hash.get(sha, 0) + 1
+
+    condivisi = set()
+    for sha, conteggio in alunni_per_hash.items():
+        if conteggio >= int(min_alunni):
+            condivisi.add(sha)
+    return condivisi
+
+
+def load_ftp_sizes(dir_ftp_base):
+    """
+    Restituisce {alunno: byte} letto dall'indice persistente,
+    oppure None se l'indice non è disponibile (serve un ricalcolo).
+    I pesi per alunno sono logici (vedi _folder_size); la voce
+    BLOB_DIR_NAME contiene a parte il peso dell'archivio deduplicato e non
+    va sommata ai pesi degli alunni.
+    """
+    with _index_lock:
+        dati = _load_ftp_index(dir_ftp_base)
+
+    if dati is None:
+        return None
+
+    pesi = {}
+    for alunno, voce in dati["alunni"].items():
+        if isinstance(voce, dict):
+            try:
+                pesi[alunno] = int(voce.get("peso", 0))
+            except Exception:
+                pesi[alunno] = 0
+
+    # spazio effettivo dei contenuti deduplicati (dato separato)
+    try:
+        pesi[BLOB_DIR_NAME] = int(dati.get("peso_blob", 0))
+    except Exception:
+        pesi[BLOB_DIR_NAME] = 0
+    return pesi
+
+
+def rescan_ftp_sizes(dir_ftp_base):
+    """
+    Ricalcolo completo (su richiesta): percorre ogni cartella alunno di
+    '00_DominiFTP', aggiorna l'indice e restituisce {alunno: byte}
+    (più la voce BLOB_DIR_NAME per l'archivio deduplicato).
+    """
+    pesi = {}
+    if not os.path.isdir(dir_ftp_base):
+        return pesi
+
+    try:
+        nomi = sorted(os.listdir(dir_ftp_base))
+    except Exception:
+        nomi = []
+
+    i = 0
+    while i < len(nomi):
+        percorso = os.path.join(dir_ftp_base, nomi[i])
+        if os.path.isdir(percorso) and nomi[i] != BLOB_DIR_NAME:
+            pesi[nomi[i]] = _folder_size(percorso)
+        i = i + 1
+
+    _prune_blobs(dir_ftp_base)
+    peso_blob = _folder_size(os.path.join(dir_ftp_base, BLOB_DIR_NAME))
+
+    with _index_lock:
+        dati = _load_ftp_index(dir_ftp_base)
+        if dati is None:
+            dati = {"alunni": {}}
+        dati["peso_blob"] = peso_blob
+        nuovi = {}
+        for alunno, peso in pesi.items():
+            voce = dati["alunni"].get(alunno)
+            if not isinstance(voce, dict):
+                voce = {}
+            voce["peso"] = peso
+            nuovi[alunno] = voce
+        dati["alunni"] = nuovi
+        _save_ftp_index(dir_ftp_base, dati)
+
+    pesi[BLOB_DIR_NAME] = peso_blob
+    return pesi
+
+
+def _load_alunno_manifest(dir_ftp_base, alunno):
+    """
+    Restituisce il manifest {remoto: {"size", "modify", "locale"}} salvato
+    per l'alunno, oppure None se non c'è (dominio scaricato senza manifest).
+    """
+    with _index_lock:
+        dati = _load_ftp_index(dir_ftp_base)
+
+    if dati is None:
+        return None
+    voce = dati["alunni"].get(alunno)
+    if not isinstance(voce, dict):
+        return None
+    manifest = voce.get("manifest")
+    if not isinstance(manifest, dict):
+        return None
+    return manifest
+
+
+def _facts_match(voce_manifest, facts):
+    """
+    True se size e modify remoti coincidono con quelli registrati.
+    Senza facts (server privo di MLSD) il file è sempre considerato cambiato.
+    """
+    size = facts.get("size", "")
+    modify = facts.get("modify", "")
+    if size == "" or modify == "":
+        return False
+    return voce_manifest.get("size") == size and voce_manifest.get("modify") == modify
+
+
+def _compare_manifest(manifest, facts_remoti):
+    """
+    Confronta il listing remoto con il manifest locale.
+    Restituisce il numero di file nuovi, modificati o rimossi.
+    """
+    differenze = 0
+    for remoto, facts in facts_remoti.items():
+        voce = manifest.get(remoto)
+        if voce is None or not _facts_match(voce, facts):
+            differenze = differenze + 1
+    for remoto in manifest.keys():
+        if remoto not in facts_remoti:
+            differenze = differenze + 1
+    return differenze
+
+
+# ======================================================================
+# LIMITE DI BANDA (token bucket)
+# ======================================================================
+
+def _new_bucket():
+    """
+    Crea un token bucket (capacità: un secondo di traffico al rate corrente).
+    """
+    return {"lock": threading.Lock(), "tokens": 0.0, "ultimo": time.monotonic()}
+
+
+# Token bucket condiviso da tutti i worker per il limite globale
+_global_bucket = _new_bucket()
+
+
+def _bucket_consume(bucket, quantita, rate):
+    """
+    Preleva 'quantita' byte dal bucket al rate indicato (byte/s).
+    Il saldo può andare in negativo: chi preleva attende il tempo necessario
+    a ripagare il debito, così più thread si spartiscono il rate complessivo.
+    """
+    if rate <= 0:
+        return
+
+    with bucket["lock"]:
+        ora = time.monotonic()
+        tokens = bucket["tokens"] + (ora - bucket["ultimo"]) * rate
+        if tokens > rate:
+            tokens = float(rate)
+        tokens = tokens - quantita
+        bucket["tokens"] = tokens
+        bucket["ultimo"] = ora
+
+    if tokens < 0:
+        time.sleep(-tokens / float(rate))
+
+
+def set_bandwidth_limit(globale_kb_s, per_connessione_kb_s=0):
+    """
+    Imposta i limiti di banda in KB/s (0 o valori negativi = illimitato).
+    Il limite globale è condiviso da tutte le connessioni di download.
+    """
+    try:
+        globale = int(float(globale_kb_s) * 1024)
+    except Exception:
+        globale = 0
+    try:
+        per_connessione = int(float(per_connessione_kb_s) * 1024)
+    except Exception:
+        per_connessione = 0
+
+    _bandwidth_limits["globale"] = max(0, globale)
+    _bandwidth_limits["per_connessione"] = max(0, per_connessione)
+
+
+def get_bandwidth_limit():
+    """
+    Restituisce (globale_kb_s, per_connessione_kb_s) attualmente in uso.
+    """
+    return (
+        _bandwidth_limits["globale"] // 1024,
+        _bandwidth_limits["per_connessione"] // 1024,
+    )
+
+
+def _throttled_writer(f_locale, bucket_connessione):
+    """
+    Callback per retrbinary: applica i limiti di banda prima di scrivere.
+    Rallentando la lettura dal socket, il controllo di flusso TCP riduce
+    la velocità di invio del server.
+    """
+    def scrivi(dati):
+        quantita = len(dati)
+        _bucket_consume(_global_bucket, quantita, _bandwidth_limits["globale"])
+        _bucket_consume(bucket_connessione, quantita, _bandwidth_limits["per_connessione"])
+        f_locale.write(dati)
+
+    return scrivi
+
+
+# ======================================================================
+# AGGREGATORE PROGRESSI (worker → GUI)
+# ======================================================================
+
+def _new_progress_aggregator():
+    """
+    Crea lo stato dell'aggregatore dei progressi.
+
+    I worker non scrivono più i "set" direttamente in 'update_queue':
+    li depositano qui, dove per ogni coppia (item_id, colonna) resta solo
+    l'ultimo valore. Un thread di flush li invia poi alla GUI in un unico
+    messaggio ("set_many", [...]) ogni PROGRESS_FLUSH_INTERVAL secondi.
+    """
+    return {
+        "lock": threading.Lock(),
+        "pending": {},
+        "ordine": [],
+        "pesi": {},
+        "stop": threading.Event(),
+    }
+
+
+def _progress_set(aggregatore, item_id, colonna, valore):
+    """
+    Registra l'ultimo valore di (item_id, colonna), sovrascrivendo
+    eventuali valori non ancora inviati.
+    """
+    chiave = (item_id, colonna)
+    with aggregatore["lock"]:
+        if chiave not in aggregatore["pending"]:
+            aggregatore["ordine"].append(chiave)
+        aggregatore["pending"][chiave] = valore
+
+
+def _progress_peso(aggregatore, alunno, byte_totali):
+    """
+    Registra il peso corrente (in byte) della cartella locale di un alunno.
+    Alla GUI arriva solo l'ultimo valore, come ("peso_alunni", {alunno: byte}).
+    """
+    with aggregatore["lock"]:
+        aggregatore["pesi"][alunno] = byte_totali
+
+
+def _progress_flush(aggregatore, update_queue):
+    """
+    Invia alla GUI tutti i valori in sospeso in un solo messaggio.
+    """
+    with aggregatore["lock"]:
+        ordine = aggregatore["ordine"]
+        pending = aggregatore["pending"]
+        pesi = aggregatore["pesi"]
+        aggregatore["ordine"] = []
+        aggregatore["pending"] = {}
+        aggregatore["pesi"] = {}
+
+    if pesi:
+        update_queue.put(("peso_alunni", pesi))
+
+    if not ordine:
+        return
+
+    modifiche = []
+    i = 0
+    while i < len(ordine):
+        item_id, colonna = ordine[i]
+        modifiche.append((item_id, colonna, pending[ordine[i]]))
+        i = i + 1
+
+    update_queue.put(("set_many", modifiche))
+
+
+def _progress_flusher(aggregatore, update_queue):
+    """
+    Thread di flush periodico: termina quando viene impostato 'stop'
+    (l'ultimo flush viene eseguito dal monitor del batch).
+    """
+    while not aggregatore["stop"].wait(PROGRESS_FLUSH_INTERVAL):
+        _progress_flush(aggregatore, update_queue)
+
+
+# ======================================================================
+# CONNESSIONE E LISTING REMOTO
+# ======================================================================
+
+def _host_for_dominio(dominio):
+    """
+    Altervista: l'host FTP è 'ftp.<dominio>'.
+    """
+    host = dominio
+    if host and not host.startswith("ftp."):
+        host = "ftp." + host
+    return host
+
+
+def _connect_ftp(job):
+    """
+    Apre la connessione FTP del job ed esegue il login.
+    Restituisce (ftp, host); le eccezioni sono lasciate al chiamante.
+    """
+    host = job.get("ftp_host") or _host_for_dominio(job["dominio"])
+    porta = int(job.get("ftp_port") or 21)
+
+    ftp = FTP(timeout=30, encoding="latin-1")
+    ftp.connect(host, porta)
+    ftp.login(user=job["ftp_user"], passwd=job["ftp_pass"])
+    return ftp, host
+
+
+_MESI_LIST = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+# Unix: "-rw-r--r--   1 owner group   1234 Jan 31 12:34 nome file"
+#       (gruppo assente in alcuni server; anno al posto dell'ora se vecchio)
+_RE_LIST_UNIX = re.compile(
+    r"^([-dlbcps])\S{9}\S*\s+\d+\s+\S+\s+(?:\S+\s+)?(\d+)\s+"
+    r"([A-Za-z]{3})\s+(\d{1,2})\s+(\d{1,2}:\d{2}|\d{4})\s(.+)$"
+)
+
+# DOS/IIS: "01-31-24  12:34PM       <DIR>          nome" oppure "...  1234 nome"
+_RE_LIST_DOS = re.compile(
+    r"^(\d{2})-(\d{2})-(\d{2,4})\s+(\d{1,2}):(\d{2})\s*([AaPp][Mm])?\s+(<DIR>|\d+)\s+(.+)$"
+)
+
+
+def _parse_list_line(riga, adesso=None):
+    """
+    Converte una riga di LIST (formato Unix o DOS) in (nome, facts) con le
+    stesse chiavi di MLSD: {"type": "file"/"dir", "size": str, "modify": str}.
+    'modify' è nel formato MLSD (AAAAMMGGhhmmss, precisione al minuto).
+    Restituisce None per righe non riconosciute ("total 12", link, ecc.).
+    """
+    if adesso is None:
+        adesso = datetime.now()
+
+    m = _RE_LIST_UNIX.match(riga)
+    if m is not None:
+        tipo_car, size, mese, giorno, ora_anno, nome = m.groups()
+        if tipo_car == "l":
+            # link simbolico: "nome -> destinazione"
+            nome = nome.split(" -> ", 1)[0]
+        elif tipo_car not in ("-", "d"):
+            return None
+
+        try:
+            mese_num = _MESI_LIST[mese.lower()]
+            if ":" in ora_anno:
+                ore, minuti = ora_anno.split(":")
+                data = datetime(adesso.year, mese_num, int(giorno), int(ore), int(minuti))
+                # senza anno il server mostra gli ultimi 6 mesi: data futura = anno scorso
+                if (data - adesso).days > 1:
+                    data = data.replace(year=adesso.year - 1)
+            else:
+                data = datetime(int(ora_anno), mese_num, int(giorno))
+            modify = data.strftime("%Y%m%d%H%M%S")
+        except Exception:
+            modify = ""
+
+        tipo = "dir" if tipo_car == "d" else "file"
+        return nome, {"type": tipo, "size": size if tipo == "file" else "", "modify": modify}
+
+    m = _RE_LIST_DOS.match(riga)
+    if m is not None:
+        mese, giorno, anno, ore, minuti, ampm, size, nome = m.groups()
+        try:
+            anno_num = int(anno)
+            if anno_num < 100:
+                anno_num = anno_num + (2000 if anno_num < 70 else 1900)
+            ore_num = int(ore)
+            if ampm is not None:
+                ore_num = ore_num % 12
+                if ampm.lower() == "pm":
+                    ore_num = ore_num + 12
+            data = datetime(anno_num, int(mese), int(giorno), ore_num, int(minuti))
+            modify = data.strftime("%Y%m%d%H%M%S")
+        except Exception:
+            modify = ""
+
+        if size == "<DIR>":
+            return nome, {"type": "dir", "size": "", "modify": modify}
+        return nome, {"type": "file", "size": size, "modify": modify}
+
+    return None
+
+
+def _mlsd_unsupported(errore):
+    """
+    True se l'errore indica che il server non conosce MLSD
+    (e non, ad esempio, una cartella inesistente).
+    """
+    codice = str(errore)[:3]
+    return codice in ("500", "502", "504")
+
+
+def _list_directory(ftp, percorso_remoto, stato_listing):
+    """
+    Elenca una singola cartella senza cambiare la cartella corrente.
+    Usa MLSD finché il server lo supporta, poi LIST (Unix/DOS).
+    Restituisce [(nome, facts)] oppure None se la cartella non è leggibile.
+    """
+    if stato_listing["mlsd"]:
+        try:
+            return list(ftp.mlsd(percorso_remoto))
+        except Exception as e:
+            if not _mlsd_unsupported(e):
+                return None
+            stato_listing["mlsd"] = False
+
+    righe = []
+    try:
+        if percorso_remoto in (".", ""):
+            ftp.retrlines("LIST", righe.append)
+        else:
+            ftp.retrlines("LIST " + percorso_remoto, righe.append)
+    except Exception:
+        return None
+
+    voci = []
+    adesso = datetime.now()
+    j = 0
+    while j < len(righe):
+        voce = _parse_list_line(righe[j], adesso)
+        if voce is not None:
+            voci.append(voce)
+        j = j + 1
+    return voci
+
+
+def _listing_cache_key(job):
+    """
+    Chiave della cache dei listing: stesso server, stessa utenza.
+    """
+    host = job.get("ftp_host") or _host_for_dominio(job["dominio"])
+    return (host, int(job.get("ftp_port") or 21), job["ftp_user"])
+
+
+def clear_listing_cache():
+    """
+    Svuota la cache dei listing remoti (es. per forzare una nuova lettura).
+    """
+    with _listing_cache_lock:
+        _listing_cache.clear()
+
+
+def _list_remote_files(ftp, chiave_cache=None, max_eta=0):
+    """
+    Raccoglie i file remoti visitando le cartelle in ampiezza (BFS) sulla
+    stessa connessione, con percorsi relativi alla radice (nessun cwd).
+    MLSD se disponibile, altrimenti LIST con parsing Unix/DOS: in entrambi i
+    casi si ottengono dimensione e data di modifica.
+
+    Restituisce (lista_file_remoti, facts_remoti, ultima_modifica, completo)
+    dove facts_remoti = {remoto: {"size": str, "modify": str}} e completo è
+    False se il listing di almeno una cartella non è riuscito (i file di
+    quella cartella mancano dal risultato, non sono spariti dal server).
+
+    Con 'chiave_cache' il risultato viene memorizzato (solo se completo) e,
+    se un listing della stessa chiave ha al massimo 'max_eta' secondi,
+    riutilizzato senza interrogare il server.
+    """
+    if chiave_cache is not None and max_eta > 0:
+        with _listing_cache_lock:
+            voce_cache = _listing_cache.get(chiave_cache)
+        if voce_cache is not None and time.monotonic() - voce_cache["istante"] <= max_eta:
+            return voce_cache["risultato"]
+
+    lista_file_remoti = []
+    facts_remoti = {}
+    ultima_modifica = None
+
+    completo = True
+
+    stato_listing = {"mlsd": True}
+    da_visitare = ["."]
+    visitate = set()
+
+    i = 0
+    while i < len(da_visitare):
+        percorso_remoto = da_visitare[i]
+        i = i + 1
+
+        if percorso_remoto in visitate:
+            continue
+        visitate.add(percorso_remoto)
+
+        entries = _list_directory(ftp, percorso_remoto, stato_listing)
+        if entries is None:
+            completo = False
+            continue
+
+        k = 0
+        while k < len(entries):
+            nome, facts = entries[k]
+            k = k + 1
+            if nome in (".", "..") or "/" in nome:
+                continue
+            tipo = facts.get("type", "")
+            if percorso_remoto in (".", ""):
+                remoto = nome
+            else:
+                remoto = percorso_remoto + "/" + nome
+            if tipo == "dir":
+                da_visitare.append(remoto)
+            elif tipo not in ("cdir", "pdir"):
+                lista_file_remoti.append(remoto)
+                modify = facts.get("modify", "")
+                facts_remoti[remoto] = {"size": facts.get("size", ""), "modify": modify}
+                if modify:
+                    try:
+                        data = datetime.strptime(modify[:14], "%Y%m%d%H%M%S")
+                        if ultima_modifica is None or data > ultima_modifica:
+                            ultima_modifica = data
+                    except Exception:
+                        pass
+
+    risultato = (lista_file_remoti, facts_remoti, ultima_modifica, completo)
+
+    if chiave_cache is not None and not completo:
+        # un listing parziale non deve essere riusato da altri (monitor,
+        # verifica, sincronizzazione): si scarta anche quello vecchio
+        with _listing_cache_lock:
+            _listing_cache.pop(chiave_cache, None)
+    elif chiave_cache is not None:
+        with _listing_cache_lock:
+            _listing_cache[chiave_cache] = {"istante": time.monotonic(), "risultato": risultato}
+
+    return risultato
+
+
 # ======================================================================
 # WORKER PER SINGOLO DOMINIO
 # ======================================================================
 
-def _worker_job(job, dir_ftp_base, update_queue):
+def _worker_job(job, dir_ftp_base, update_queue, aggregatore, on_file_downloaded=None):
     """
     Esegue il download per un singolo dominio.
     'job' deve contenere:
         item_id, alunno, dominio, stato_base, ftp_user, ftp_pass
+    (opzionali: sync, ftp_host, ftp_port)
+
+    I messaggi di log vanno direttamente in 'update_queue', mentre gli
+    aggiornamenti delle celle passano dall'aggregatore.
+
+    Se 'on_file_downloaded' è indicato, viene chiamato (da questo thread)
+    per ogni file scaricato con (nome_cartella_alunno, dir_locale_alunno,
+    percorso_locale): serve ad alimentare l'analisi in pipeline.
     """
     item_id = job["item_id"]
     alunno = job["alunno"]
@@ -76,37 +873,35 @@ def _worker_job(job, dir_ftp_base, update_queue):
     ftp_pass = job["ftp_pass"]
 
     # reset campi nella tabella
-    update_queue.put(("set", item_id, "Stato", stato_base + " / Connessione FTP..."))
-    update_queue.put(("set", item_id, "Avanzamento", "0%"))
-    update_queue.put(("set", item_id, "N. file", "0"))
-    update_queue.put(("set", item_id, "Elenco file", ""))
-    update_queue.put(("set", item_id, "Peso cartella", "0 B"))
-    update_queue.put(("set", item_id, "Ultima modifica", ""))
+    _progress_set(aggregatore, item_id, "Stato", stato_base + " / Connessione FTP...")
+    _progress_set(aggregatore, item_id, "Avanzamento", "0%")
+    _progress_set(aggregatore, item_id, "N. file", "0")
+    _progress_set(aggregatore, item_id, "Elenco file", "")
+    _progress_set(aggregatore, item_id, "Peso cartella", "0 B")
+    _progress_set(aggregatore, item_id, "Ultima modifica", "")
 
     if not dominio:
         update_queue.put(("log", "❌ Nessun dominio specificato per '{}'.".format(alunno)))
-        update_queue.put(("set", item_id, "Stato", "Errore: dominio mancante"))
+        _progress_set(aggregatore, item_id, "Stato", "Errore: dominio mancante")
         return
 
     if not ftp_user or not ftp_pass:
         update_queue.put(("log", "❌ Credenziali mancanti per '{}' ({}).".format(alunno, dominio)))
-        update_queue.put(("set", item_id, "Stato", "Errore: credenziali mancanti"))
+        _progress_set(aggregatore, item_id, "Stato", "Errore: credenziali mancanti")
         return
 
-    host = dominio
-    if host and not host.startswith("ftp."):
-        host = "ftp." + host
+    host = job.get("ftp_host") or _host_for_dominio(dominio)
 
     update_queue.put(("log", "Connessione a {} per '{}'...".format(host, alunno)))
 
     # Connessione (latin-1 per evitare errori di decode)
+    t_inizio = time.perf_counter()
     try:
-        ftp = FTP(host, timeout=30, encoding="latin-1")
-        ftp.login(user=ftp_user, passwd=ftp_pass)
-        update_queue.put(("set", item_id, "Stato", stato_base + " / Login OK"))
+        ftp, host = _connect_ftp(job)
+        _progress_set(aggregatore, item_id, "Stato", stato_base + " / Login OK")
         update_queue.put(("log", "✅ Login riuscito su {} per '{}'".format(host, alunno)))
     except Exception as e:
-        update_queue.put(("set", item_id, "Stato", "Errore login FTP"))
+        _progress_set(aggregatore, item_id, "Stato", "Errore login FTP")
         update_queue.put(("log", "❌ Errore di connessione/login {} per '{}': {}".format(host, alunno, e)))
         return
 
@@ -119,72 +914,77 @@ def _worker_job(job, dir_ftp_base, update_queue):
         except Exception:
             pass
 
-    # Raccolta lista file remoti (mlsd se disponibile, fallback nlst)
-    lista_file_remoti = []
-    ultima_modifica = None
+    # peso logico già presente in locale (download precedenti): durante il
+    # download il peso inviato alla GUI è aggiornato file per file con la
+    # stessa misura dell'indice finale (_folder_size)
+    peso_iniziale = _folder_size(dir_locale_alunno)
+    peso_corrente = peso_iniziale
 
-    def collect_files(percorso_remoto):
-        nonlocal ultima_modifica
-        try:
-            entries = list(ftp.mlsd(percorso_remoto))
-        except Exception:
-            # fallback NLST
-            try:
-                ftp.cwd(percorso_remoto)
-                nomi = ftp.nlst()
-            except Exception:
-                return
-            j = 0
-            while j < len(nomi):
-                nome = nomi[j]
-                if nome not in (".", ".."):
-                    if percorso_remoto in (".", ""):
-                        remoto = nome
-                    else:
-                        remoto = percorso_remoto + "/" + nome
-                    lista_file_remoti.append(remoto)
-                j = j + 1
-            return
+    # In sincronizzazione si scaricano solo i file cambiati rispetto al manifest
+    # e i file modificati sovrascrivono la copia locale (niente _vNN).
+    sincronizza = bool(job.get("sync", False))
+    manifest_precedente = {}
+    if sincronizza:
+        manifest_precedente = _load_alunno_manifest(dir_ftp_base, nome_cartella_alunno)
+        if manifest_precedente is None:
+            manifest_precedente = {}
+    manifest_nuovo = {}
 
-        k = 0
-        while k < len(entries):
-            nome, facts = entries[k]
-            if nome in (".", ".."):
-                k = k + 1
-                continue
-            tipo = facts.get("type", "")
-            if percorso_remoto in (".", ""):
-                remoto = nome
-            else:
-                remoto = percorso_remoto + "/" + nome
-            if tipo == "dir":
-                collect_files(remoto)
-            else:
-                lista_file_remoti.append(remoto)
-                modify = facts.get("modify")
-                if modify:
-                    try:
-                        data = datetime.strptime(modify, "%Y%m%d%H%M%S")
-                        if ultima_modifica is None or data > ultima_modifica:
-                            ultima_modifica = data
-                    except Exception:
-                        pass
-            k = k + 1
+    # Raccolta lista file remoti (mlsd se disponibile, fallback LIST; cache recente)
+    t_listing = time.perf_counter()
+    lista_file_remoti, facts_remoti, ultima_modifica, listing_completo = _list_remote_files(
+        ftp,
+        _listing_cache_key(job),
+        LISTING_CACHE_TTL,
+    )
+    t_trasferimento = time.perf_counter()
 
-    collect_files(".")
+    if not listing_completo:
+        update_queue.put(
+            (
+                "log",
+                "⚠ Listing incompleto su {} per '{}': alcune cartelle non sono state lette, "
+                "nessun file locale verrà rimosso.".format(dominio, alunno),
+            )
+        )
+        # il manifest non va sostituito con un listing parziale: le voci
+        # delle cartelle non lette restano quelle del download precedente
+        if not sincronizza:
+            manifest_precedente = _load_alunno_manifest(dir_ftp_base, nome_cartella_alunno)
+            if manifest_precedente is None:
+                manifest_precedente = {}
+
+    # limite di banda di questa connessione (il bucket globale è condiviso)
+    bucket_connessione = _new_bucket()
 
     totale_file = len(lista_file_remoti)
     if totale_file == 0:
-        update_queue.put(("set", item_id, "Stato", stato_base + " / Nessun file remoto"))
+        _progress_set(aggregatore, item_id, "Stato", stato_base + " / Nessun file remoto")
         update_queue.put(("log", "ℹ Nessun file trovato su {} per '{}'".format(dominio, alunno)))
         try:
             ftp.quit()
         except Exception:
             pass
+        if listing_completo:
+            _update_alunno_index(dir_ftp_base, nome_cartella_alunno, {"peso": peso_iniziale, "manifest": {}})
+        update_queue.put(
+            (
+                "tempi",
+                item_id,
+                {
+                    "connessione": t_listing - t_inizio,
+                    "listing": t_trasferimento - t_listing,
+                    "trasferimento": 0.0,
+                    "file": 0,
+                    "byte": 0,
+                },
+            )
+        )
         return
 
     conteggio_file = 0
     peso_totale_alunno = 0
+    peso_blob_nuovi = 0
     elenco_file_preview = []
 
     m = 0
@@ -207,23 +1007,88 @@ def _worker_job(job, dir_ftp_base, update_queue):
 
         nome_file = parti[-1]
         percorso_locale_base = os.path.join(cartella_locale_corrente, nome_file)
-        percorso_locale = _get_versioned_path(percorso_locale_base)
+        facts = facts_remoti.get(remoto, {})
+
+        if sincronizza:
+            percorso_locale = percorso_locale_base
+            voce = manifest_precedente.get(remoto)
+            if voce is not None and _facts_match(voce, facts):
+                percorso_invariato = os.path.join(dir_locale_alunno, voce.get("locale", ""))
+                if os.path.isfile(percorso_invariato):
+                    # file invariato: nessun trasferimento
+                    manifest_nuovo[remoto] = voce
+                    conteggio_file = conteggio_file + 1
+                    m = m + 1
+                    continue
+        else:
+            percorso_locale = _get_versioned_path(percorso_locale_base)
+
+        # download su un file temporaneo nella stessa cartella: la copia
+        # precedente (spesso un hardlink a un blob condiviso) non viene
+        # toccata finché trasferimento e deduplicazione non sono riusciti
+        percorso_parziale = percorso_locale + PARTIAL_SUFFIX
+        try:
+            if os.path.lexists(percorso_parziale):
+                # residuo di un download interrotto: si toglie il
+                # collegamento (mai scrivere dentro un possibile blob)
+                os.remove(percorso_parziale)
+            with open(percorso_parziale, "wb") as f_locale:
+                ftp.retrbinary("RETR " + remoto, _throttled_writer(f_locale, bucket_connessione))
+        except Exception:
+            # file saltato: resta la copia precedente con la sua voce
+            _remove_partial(percorso_parziale)
+            if remoto in manifest_precedente:
+                manifest_nuovo[remoto] = manifest_precedente[remoto]
+            m = m + 1
+            continue
+
+        try:
+            sha, byte_nuovi = _dedup_file(dir_ftp_base, percorso_parziale)
+            peso_blob_nuovi = peso_blob_nuovi + byte_nuovi
+        except Exception:
+            sha = ""
+
+        dimensione_precedente = 0
+        if os.path.isfile(percorso_locale):
+            try:
+                dimensione_precedente = os.path.getsize(percorso_locale)
+            except Exception:
+                pass
 
-        # download
+        # rename atomico sulla copia precedente: sostituisce solo il nome
+        # (gli altri collegamenti allo stesso blob restano intatti)
         try:
-            with open(percorso_locale, "wb") as f_locale:
-                ftp.retrbinary("RETR " + remoto, f_locale.write)
+            os.replace(percorso_parziale, percorso_locale)
         except Exception:
-            # file saltato
+            _remove_partial(percorso_parziale)
+            if remoto in manifest_precedente:
+                manifest_nuovo[remoto] = manifest_precedente[remoto]
             m = m + 1
             continue
+        peso_corrente = peso_corrente - dimensione_precedente
+
+        manifest_nuovo[remoto] = {
+            "size": facts.get("size", ""),
+            "modify": facts.get("modify", ""),
+            "locale": os.path.relpath(percorso_locale, dir_locale_alunno).replace(os.sep, "/"),
+            "sha256": sha,
+        }
 
         try:
             dimensione = os.path.getsize(percorso_locale)
             peso_totale_alunno = peso_totale_alunno + dimensione
+            peso_corrente = peso_corrente + dimensione
         except Exception:
             pass
 
+        _progress_peso(aggregatore, nome_cartella_alunno, peso_corrente)
+
+        if on_file_downloaded is not None:
+            try:
+                on_file_downloaded(nome_cartella_alunno, dir_locale_alunno, percorso_locale)
+            except Exception:
+                pass
+
         conteggio_file = conteggio_file + 1
 
         # preview elenco file (max 10)
@@ -237,10 +1102,10 @@ def _worker_job(job, dir_ftp_base, update_queue):
         if percentuale > 99 and conteggio_file < totale_file:
             percentuale = 99
 
-        update_queue.put(("set", item_id, "Avanzamento", str(percentuale) + "%"))
-        update_queue.put(("set", item_id, "N. file", str(conteggio_file)))
-        update_queue.put(("set", item_id, "Peso cartella", _format_bytes(peso_totale_alunno)))
-        update_queue.put(("set", item_id, "Elenco file", ", ".join(elenco_file_preview)))
+        _progress_set(aggregatore, item_id, "Avanzamento", str(percentuale) + "%")
+        _progress_set(aggregatore, item_id, "N. file", str(conteggio_file))
+        _progress_set(aggregatore, item_id, "Peso cartella", _format_bytes(peso_totale_alunno))
+        _progress_set(aggregatore, item_id, "Elenco file", ", ".join(elenco_file_preview))
 
         m = m + 1
 
@@ -249,27 +1114,184 @@ def _worker_job(job, dir_ftp_base, update_queue):
     except Exception:
         pass
 
+    update_queue.put(
+        (
+            "tempi",
+            item_id,
+            {
+                "connessione": t_listing - t_inizio,
+                "listing": t_trasferimento - t_listing,
+                "trasferimento": time.perf_counter() - t_trasferimento,
+                "file": conteggio_file,
+                "byte": peso_totale_alunno,
+            },
+        )
+    )
+
+    if not listing_completo:
+        for remoto, voce in manifest_precedente.items():
+            if remoto not in facts_remoti and remoto not in manifest_nuovo:
+                manifest_nuovo[remoto] = voce
+    elif sincronizza:
+        # file rimossi dal dominio: si eliminano le copie locali registrate
+        # (solo con un listing completo: un errore di listing non è una rimozione)
+        for remoto, voce in manifest_precedente.items():
+            if remoto not in facts_remoti:
+                percorso_rimosso = os.path.join(dir_locale_alunno, voce.get("locale", ""))
+                if os.path.isfile(percorso_rimosso):
+                    try:
+                        os.remove(percorso_rimosso)
+                    except Exception:
+                        pass
+
+    _add_blob_size(dir_ftp_base, peso_blob_nuovi)
+    _update_alunno_index(
+        dir_ftp_base,
+        nome_cartella_alunno,
+        {"peso": _folder_size(dir_locale_alunno), "manifest": manifest_nuovo},
+    )
+
     if ultima_modifica is not None:
         testo_data = ultima_modifica.strftime("%Y-%m-%d %H:%M")
     else:
         testo_data = "n.d."
 
     # fine job: porta al 100%
-    update_queue.put(("set", item_id, "Avanzamento", "100%"))
-    update_queue.put(("set", item_id, "Ultima modifica", testo_data))
-    update_queue.put(("set", item_id, "Stato", stato_base + " / Download OK"))
+    _progress_set(aggregatore, item_id, "Avanzamento", "100%")
+    _progress_set(aggregatore, item_id, "Ultima modifica", testo_data)
+    _progress_set(aggregatore, item_id, "Stato", stato_base + " / Download OK")
     update_queue.put(("log", "✅ Download completato per '{}' ({}). Ultima modifica remota: {}".format(alunno, dominio, testo_data)))
 
 
+# ======================================================================
+# VERIFICA MODIFICHE (SOLO LISTING)
+# ======================================================================
+
+def _check_job(job, dir_ftp_base, update_queue, aggregatore):
+    """
+    Confronta il listing MLSD del dominio con il manifest locale, senza
+    scaricare nulla. Restituisce:
+        True  -> dominio da aggiornare
+        False -> dominio aggiornato
+        None  -> verifica non riuscita (si usano i dati locali)
+    """
+    item_id = job["item_id"]
+    alunno = job["alunno"]
+    dominio = job["dominio"]
+    stato_base = job["stato_base"]
+
+    nome_cartella_alunno = alunno if alunno else "sconosciuto"
+    manifest = _load_alunno_manifest(dir_ftp_base, nome_cartella_alunno)
+
+    if not os.path.isdir(os.path.join(dir_ftp_base, nome_cartella_alunno)):
+        _progress_set(aggregatore, item_id, "Stato", stato_base + " / Mai scaricato")
+        return True
+
+    _progress_set(aggregatore, item_id, "Stato", stato_base + " / Verifica modifiche...")
+
+    host = job.get("ftp_host") or _host_for_dominio(dominio)
+    try:
+        ftp, host = _connect_ftp(job)
+    except Exception as e:
+        _progress_set(aggregatore, item_id, "Stato", stato_base + " / Verifica non riuscita")
+        update_queue.put(("log", "❌ Verifica {} per '{}' non riuscita: {}".format(host, alunno, e)))
+        return None
+
+    try:
+        # la verifica interroga sempre il server e aggiorna la cache
+        _lista, facts_remoti, _ultima, completo = _list_remote_files(ftp, _listing_cache_key(job))
+    finally:
+        try:
+            ftp.quit()
+        except Exception:
+            pass
+
+    if not completo:
+        # cartelle non lette: i loro file risulterebbero "mancanti"
+        _progress_set(aggregatore, item_id, "Stato", stato_base + " / Verifica non riuscita (listing incompleto)")
+        update_queue.put(("log", "⚠ Verifica {} per '{}': listing incompleto, esito non verificato.".format(host, alunno)))
+        return None
+
+    if manifest is None:
+        _progress_set(aggregatore, item_id, "Stato", stato_base + " / Da aggiornare (nessun manifest)")
+        return True
+
+    differenze = _compare_manifest(manifest, facts_remoti)
+    if differenze == 0:
+        _progress_set(aggregatore, item_id, "Stato", stato_base + " / Aggiornato")
+        return False
+
+    _progress_set(
+        aggregatore,
+        item_id,
+        "Stato",
+        stato_base + " / Da aggiornare ({} file)".format(differenze),
+    )
+    return True
+
+
+def start_batch_check(jobs, base_dir, update_queue, max_workers=CHECK_MAX_WORKERS):
+    """
+    Verifica in parallelo (al massimo 'max_workers' connessioni) se i domini
+    già presenti in '00_DominiFTP' sono cambiati sul server.
+    Al termine invia update_queue.put(("fine_verifica", {item_id: esito}))
+    con esito True (da aggiornare), False (aggiornato) o None (errore).
+    """
+    if not base_dir or not os.path.isdir(base_dir):
+        update_queue.put(("log", "❌ base_dir non valida per la verifica FTP."))
+        update_queue.put(("fine_verifica", {}))
+        return
+
+    dir_ftp_base = os.path.join(base_dir, "00_DominiFTP")
+
+    update_queue.put(("log", "=== Verifica modifiche domini ({} domini) ===".format(len(jobs))))
+
+    aggregatore = _new_progress_aggregator()
+    flusher = threading.Thread(
+        target=_progress_flusher,
+        args=(aggregatore, update_queue),
+        daemon=True,
+    )
+    flusher.start()
+
+    def _esegui():
+        esiti = {}
+        with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+            futures = []
+            i = 0
+            while i < len(jobs):
+                futures.append(pool.submit(_check_job, jobs[i], dir_ftp_base, update_queue, aggregatore))
+                i = i + 1
+
+            i = 0
+            while i < len(jobs):
+                try:
+                    esiti[jobs[i]["item_id"]] = futures[i].result()
+                except Exception:
+                    esiti[jobs[i]["item_id"]] = None
+                i = i + 1
+
+        aggregatore["stop"].set()
+        flusher.join()
+        _progress_flush(aggregatore, update_queue)
+        update_queue.put(("fine_verifica", esiti))
+
+    threading.Thread(target=_esegui, daemon=True).start()
+
+
 # ======================================================================
 # AVVIO BATCH PARALLELO
 # ======================================================================
 
-def start_batch_download(jobs, base_dir, update_queue):
+def start_batch_download(jobs, base_dir, update_queue, on_file_downloaded=None):
     """
     Avvia i download per tutti i 'jobs' in parallelo.
     Crea (se necessario) la cartella '00_DominiFTP' sotto 'base_dir'.
     Al termine invia update_queue.put(("fine_download", None)).
+    Ogni dominio concluso invia anche ("tempi", item_id, {"connessione",
+    "listing", "trasferimento", "file", "byte"}) con i secondi per fase.
+
+    'on_file_downloaded' (opzionale) viene passato a ogni worker: vedi _worker_job.
     """
     if not base_dir or not os.path.isdir(base_dir):
         update_queue.put(("log", "❌ base_dir non valida per il download FTP."))
@@ -281,11 +1303,19 @@ def start_batch_download(jobs, base_dir, update_queue):
 
     update_queue.put(("log", "=== Inizio download FTP in {} ===".format(dir_ftp_base)))
 
+    aggregatore = _new_progress_aggregator()
+    flusher = threading.Thread(
+        target=_progress_flusher,
+        args=(aggregatore, update_queue),
+        daemon=True,
+    )
+    flusher.start()
+
     # avvio thread
     threads = []
     i = 0
     while i < len(jobs):
-        t = threading.Thread(target=_worker_job, args=(jobs[i], dir_ftp_base, update_queue))
+        t = threading.Thread(target=_worker_job, args=(jobs[i], dir_ftp_base, update_queue, aggregatore, on_file_downloaded))
         t.daemon = True
         t.start()
         threads.append(t)
@@ -297,7 +1327,200 @@ def start_batch_download(jobs, base_dir, update_queue):
         while j < len(threads):
             threads[j].join()
             j = j + 1
+        aggregatore["stop"].set()
+        flusher.join()
+        _progress_flush(aggregatore, update_queue)
         update_queue.put(("fine_download", None))
 
     m = threading.Thread(target=_monitor, daemon=True)
     m.start()
+
+
+# ======================================================================
+# MONITOR LIVE (SOLO LISTING, NESSUN DOWNLOAD)
+# ======================================================================
+
+# ogni quanti giri il monitor rilegge tutte le cartelle senza scorciatoie
+MONITOR_FULL_EVERY = 5
+
+
+def _list_remote_tree_conditional(ftp, dirs_precedenti, forza):
+    """
+    Listing in ampiezza che riusa il listing precedente di una cartella
+    quando la sua data di modifica (fact 'modify' letto nel listing della
+    cartella padre) non è cambiata e la cartella non ha sottocartelle.
+
+    La radice viene sempre riletta; le sottocartelle con figli devono essere
+    rilette comunque per conoscere le date aggiornate dei figli. Le modifiche
+    "sul posto" di un file (che non cambiano la data della cartella) sono
+    rilevate al più tardi dal giro completo successivo ('forza').
+
+    Se il listing di una cartella non riesce si riusa, se c'è, quello del
+    giro precedente; in ogni caso il risultato è segnato come incompleto.
+
+    Restituisce (dirs_nuovi, facts_remoti, ultima_modifica, listing_eseguiti,
+    listing_riusati, mlsd, completo) con
+    dirs_nuovi = {percorso: {"modify", "voci"}}.
+    """
+    completo = True
+    dirs_nuovi = {}
+    facts_remoti = {}
+    ultima_modifica = None
+    listing_eseguiti = 0
+    listing_riusati = 0
+
+    stato_listing = {"mlsd": True}
+    da_visitare = [(".", "")]
+
+    i = 0
+    while i < len(da_visitare):
+        percorso_remoto, modify_dir = da_visitare[i]
+        i = i + 1
+
+        if percorso_remoto in dirs_nuovi:
+            continue
+
+        voci = None
+        precedente = dirs_precedenti.get(percorso_remoto)
+        if (
+            not forza
+            and precedente is not None
+            and modify_dir != ""
+            and precedente["modify"] == modify_dir
+        ):
+            ha_sottocartelle = False
+            k = 0
+            while k < len(precedente["voci"]):
+                if precedente["voci"][k][1].get("type", "") == "dir":
+                    ha_sottocartelle = True
+                    break
+                k = k + 1
+            if not ha_sottocartelle:
+                voci = precedente["voci"]
+                listing_riusati = listing_riusati + 1
+
+        if voci is None:
+            voci = _list_directory(ftp, percorso_remoto, stato_listing)
+            listing_eseguiti = listing_eseguiti + 1
+            if voci is None:
+                completo = False
+                if precedente is None:
+                    continue
+                voci = precedente["voci"]
+
+        dirs_nuovi[percorso_remoto] = {"modify": modify_dir, "voci": voci}
+
+        k = 0
+        while k < len(voci):
+            nome, facts = voci[k]
+            k = k + 1
+            if nome in (".", "..") or "/" in nome:
+                continue
+            tipo = facts.get("type", "")
+            if percorso_remoto in (".", ""):
+                remoto = nome
+            else:
+                remoto = percorso_remoto + "/" + nome
+            if tipo == "dir":
+                da_visitare.append((remoto, facts.get("modify", "")))
+            elif tipo not in ("cdir", "pdir"):
+                modify = facts.get("modify", "")
+                facts_remoti[remoto] = {"size": facts.get("size", ""), "modify": modify}
+                if modify:
+                    try:
+                        data = datetime.strptime(modify[:14], "%Y%m%d%H%M%S")
+                        if ultima_modifica is None or data > ultima_modifica:
+                            ultima_modifica = data
+                    except Exception:
+                        pass
+
+    return (
+        dirs_nuovi,
+        facts_remoti,
+        ultima_modifica,
+        listing_eseguiti,
+        listing_riusati,
+        stato_listing["mlsd"],
+        completo,
+    )
+
+
+def poll_domain(job, dirs_precedenti=None, forza=False):
+    """
+    Un giro di monitoraggio di un dominio: solo listing, nessun download.
+
+    'dirs_precedenti' è il campo "dirs" del giro precedente (listing
+    condizionale). Restituisce un dizionario:
+        {"ok", "errore", "dirs", "file", "byte", "ultima_modifica", "utc",
+         "listing", "listing_riusati"}
+    dove "utc" è True se le date arrivano da MLSD (UTC per RFC 3659) e
+    "completo" è False se qualche cartella non è stata letta.
+    Un giro completo senza listing riusati aggiorna anche la cache dei
+    listing, così un download lanciato subito dopo non rilegge il server.
+    """
+    if dirs_precedenti is None:
+        dirs_precedenti = {}
+
+    esito = {
+        "ok": False,
+        "errore": "",
+        "dirs": dirs_precedenti,
+        "file": 0,
+        "byte": 0,
+        "ultima_modifica": None,
+        "utc": True,
+        "listing": 0,
+        "listing_riusati": 0,
+        "completo": False,
+    }
+
+    try:
+        ftp, _host = _connect_ftp(job)
+    except Exception as e:
+        esito["errore"] = str(e)
+        return esito
+
+    try:
+        (
+            dirs_nuovi,
+            facts_remoti,
+            ultima_modifica,
+            listing_eseguiti,
+            listing_riusati,
+            mlsd,
+            completo,
+        ) = _list_remote_tree_conditional(ftp, dirs_precedenti, forza)
+    except Exception as e:
+        esito["errore"] = str(e)
+        return esito
+    finally:
+        try:
+            ftp.quit()
+        except Exception:
+            pass
+
+    byte_totali = 0
+    for facts in facts_remoti.values():
+        try:
+            byte_totali = byte_totali + int(facts.get("size", "") or 0)
+        except Exception:
+            pass
+
+    if listing_riusati == 0 and completo:
+        with _listing_cache_lock:
+            _listing_cache[_listing_cache_key(job)] = {
+                "istante": time.monotonic(),
+                "risultato": (sorted(facts_remoti.keys()), facts_remoti, ultima_modifica, True),
+            }
+
+    esito["ok"] = True
+    esito["dirs"] = dirs_nuovi
+    esito["file"] = len(facts_remoti)
+    esito["byte"] = byte_totali
+    esito["ultima_modifica"] = ultima_modifica
+    esito["utc"] = mlsd
+    esito["listing"] = listing_eseguiti
+    esito["listing_riusati"] = listing_riusati
+    esito["completo"] = completo
+    return esito
+
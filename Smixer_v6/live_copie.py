@@ -0,0 +1,323 @@
+"""
+live_copie.py
+Segnalazione di possibili copie tra postazioni durante la verifica (scheda LIVE).
+
+Indice incrementale dei file delle cartelle test: un file viene riletto solo
+se (dimensione, mtime) sono cambiati rispetto alla scansione precedente.
+Per ogni file si tengono:
+
+- lo sha256 del contenuto (copie identiche);
+- le impronte "winnowing" del testo normalizzato (senza spazi, minuscolo):
+  due file con molte impronte in comune sono quasi identici anche se
+  spostati, reindentati o con qualche riga aggiunta.
+
+Quando un file cambia viene confrontato, tramite indici inversi, con i file
+delle ALTRE postazioni modificati entro FINESTRA_SECONDI; gli avvisi vengono
+accodati e letti dalla GUI con pop_alerts(). Nessun confronto completo
+tra tutte le coppie, nessuna pipeline di similarità.
+
+Per evitare falsi positivi:
+- la prima scansione di ogni cartella fa da riferimento: i file già presenti
+  (consegna, codice di partenza) non generano avvisi e le loro impronte
+  vengono ignorate nei confronti successivi;
+- contenuti/impronte presenti in almeno SOGLIA_DIFFUSO postazioni sono
+  considerati materiale distribuito e non segnalati.
+
+Interfaccia:
+- new_copy_index()
+- update_folder(indice, cartella, files, adesso=None)
+- pop_alerts(indice)
+- forget_folder(indice, cartella)
+"""
+
+import time
+import hashlib
+import threading
+
+# finestra temporale: si confrontano solo file modificati a meno di
+# FINESTRA_SECONDI l'uno dall'altro
+FINESTRA_SECONDI = 15 * 60
+
+# k-gram (caratteri del testo normalizzato) e finestra del winnowing
+KGRAM = 24
+WINNOW = 8
+
+# quota minima di impronte in comune (rispetto al file più piccolo)
+SOGLIA_SIMILE = 0.8
+# file troppo piccoli non vengono segnalati
+MIN_BYTE = 64
+MIN_IMPRONTE = 8
+# file oltre questa dimensione: solo sha256, niente impronte
+MAX_BYTE_IMPRONTE = 1024 * 1024
+
+# contenuti presenti in almeno tante postazioni = materiale distribuito
+SOGLIA_DIFFUSO = 4
+
+
+# =============================================================================
+#  IMPRONTE
+# =============================================================================
+
+def _fingerprints(dati):
+    """
+    Impronte winnowing del contenuto: hash dei k-gram del testo senza spazi
+    e in minuscolo, tenendo il minimo di ogni finestra di WINNOW k-gram.
+    """
+    testo = "".join(dati.decode("utf-8", errors="replace").lower().split())
+    if len(testo) < KGRAM:
+        return frozenset()
+
+    # hash() delle stringhe: stabile nel processo, basta per un indice in memoria
+    hash_kgram = [hash(testo[i:i + KGRAM]) for i in range(len(testo) - KGRAM + 1)]
+
+    if len(hash_kgram) <= WINNOW:
+        return frozenset([min(hash_kgram)])
+
+    impronte = set()
+    for i in range(len(hash_kgram) - WINNOW + 1):
+        impronte.add(min(hash_kgram[i:i + WINNOW]))
+    return frozenset(impronte)
+
+
+def _read_file(percorso, size):
+    """
+    (sha256, impronte) del file; None se illeggibile.
+    """
+    try:
+        with open(percorso, "rb") as f:
+            if size > MAX_BYTE_IMPRONTE:
+                h = hashlib.sha256()
+                while True:
+                    pezzo = f.read(1024 * 1024)
+                    if not pezzo:
+                        break
+                    h.update(pezzo)
+                return h.hexdigest(), frozenset()
+            dati = f.read()
+    except OSError:
+        return None
+    return hashlib.sha256(dati).hexdigest(), _fingerprints(dati)
+
+
+# =============================================================================
+#  INDICE
+# =============================================================================
+
+def new_copy_index():
+    """
+    Crea un indice vuoto (le scansioni lo aggiornano dai thread del pool,
+    la GUI legge gli avvisi dal mainloop).
+    """
+    return {
+        "lock": threading.Lock(),
+        "file": {},          # percorso -> voce
+        "per_sha": {},       # sha256 -> set(percorsi)
+        "per_impronta": {},  # impronta -> set(percorsi)
+        "comuni": set(),     # impronte dei file di riferimento
+        "cartelle": set(),   # cartelle già indicizzate almeno una volta
+        "segnalati": set(),  # coppie già segnalate
+        "avvisi": [],
+    }
+
+
+def _remove_entry(indice, percorso):
+    voce = indice["file"].pop(percorso, None)
+    if voce is None:
+        return
+    percorsi = indice["per_sha"].get(voce["sha"])
+    if percorsi is not None:
+        percorsi.discard(percorso)
+        if not percorsi:
+            del indice["per_sha"][voce["sha"]]
+    for impronta in voce["impronte"]:
+        percorsi = indice["per_impronta"].get(impronta)
+        if percorsi is not None:
+            percorsi.discard(percorso)
+            if not percorsi:
+                del indice["per_impronta"][impronta]
+
+
+def _add_entry(indice, percorso, voce):
+    indice["file"][percorso] = voce
+    indice["per_sha"].setdefault(voce["sha"], set()).add(percorso)
+    for impronta in voce["impronte"]:
+        indice["per_impronta"].setdefault(impronta, set()).add(percorso)
+
+
+def _seats(indice, percorsi):
+    return {indice["file"][p]["cartella"] for p in percorsi if p in indice["file"]}
+
+
+def _candidate(voce, altro):
+    """
+    True se 'altro' può essere confrontato con 'voce': altra postazione,
+    non file di riferimento, modificato entro la finestra temporale.
+    """
+    if altro["cartella"] == voce["cartella"] or altro["riferimento"]:
+        return False
+    return abs(altro["mtime"] - voce["mtime"]) <= FINESTRA_SECONDI
+
+
+def _find_matches(indice, percorso, voce):
+    """
+    Cerca copie identiche e quasi identiche del file appena cambiato.
+    """
+    avvisi = []
+
+    if voce["size"] < MIN_BYTE:
+        return avvisi
+
+    # --- copie identiche
+    stessi = indice["per_sha"].get(voce["sha"], set())
+    identici = set()
+    if len(_seats(indice, stessi)) < SOGLIA_DIFFUSO:
+        for altro_percorso in stessi:
+            altro = indice["file"][altro_percorso]
+            if altro_percorso != percorso and _candidate(voce, altro):
+                identici.add(altro_percorso)
+                avvisi.append(("identico", 1.0, altro_percorso))
+
+    # --- copie simili (impronte in comune)
+    impronte = [i for i in voce["impronte"] if i not in indice["comuni"]]
+    if len(impronte) < MIN_IMPRONTE:
+        return avvisi
+
+    in_comune = {}
+    for impronta in impronte:
+        percorsi = indice["per_impronta"].get(impronta, ())
+        if len(percorsi) > 1 and len(_seats(indice, percorsi)) >= SOGLIA_DIFFUSO:
+            continue
+        for altro_percorso in percorsi:
+            if altro_percorso != percorso and altro_percorso not in identici:
+                in_comune[altro_percorso] = in_comune.get(altro_percorso, 0) + 1
+
+    for altro_percorso, n in in_comune.items():
+        altro = indice["file"][altro_percorso]
+        if not _candidate(voce, altro):
+            continue
+        altre_impronte = len([i for i in altro["impronte"] if i not in indice["comuni"]])
+        minimo = min(len(impronte), altre_impronte)
+        if minimo < MIN_IMPRONTE:
+            continue
+        quota = n / minimo
+        if quota >= SOGLIA_SIMILE:
+            avvisi.append(("simile", quota, altro_percorso))
+
+    return avvisi
+
+
+def update_folder(indice, cartella, files, adesso=None):
+    """
+    Aggiorna l'indice con lo stato attuale di una cartella test.
+
+    - files: lista di (percorso, stat_result) dei file considerati
+
+    Vengono letti solo i file nuovi o con (dimensione, mtime) cambiati.
+    Restituisce il numero di nuovi avvisi accodati.
+    """
+    if adesso is None:
+        adesso = time.time()
+
+    with indice["lock"]:
+        riferimento = cartella not in indice["cartelle"]
+        presenti = {}
+        da_leggere = []
+        for percorso, st in files:
+            presenti[percorso] = st
+            voce = indice["file"].get(percorso)
+            if voce is None or voce["size"] != st.st_size or voce["mtime_ns"] != st.st_mtime_ns:
+                da_leggere.append((percorso, st))
+        spariti = [
+            p for p, v in indice["file"].items()
+            if v["cartella"] == cartella and p not in presenti
+        ]
+
+    # lettura e impronte fuori dal lock (le cartelle sono elaborate in parallelo)
+    letti = []
+    for percorso, st in da_leggere:
+        esito = _read_file(percorso, st.st_size)
+        if esito is not None:
+            letti.append((percorso, st, esito[0], esito[1]))
+
+    nuovi = 0
+    with indice["lock"]:
+        for percorso in spariti:
+            _remove_entry(indice, percorso)
+
+        for percorso, st, sha, impronte in letti:
+            _remove_entry(indice, percorso)
+            voce = {
+                "cartella": cartella,
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "mtime": st.st_mtime,
+                "sha": sha,
+                "impronte": impronte,
+                "riferimento": riferimento,
+            }
+            _add_entry(indice, percorso, voce)
+
+            if riferimento:
+                indice["comuni"].update(impronte)
+                continue
+
+            for tipo, quota, altro_percorso in _find_matches(indice, percorso, voce):
+                chiave = (tipo,) + tuple(sorted((percorso, altro_percorso)))
+                if chiave in indice["segnalati"]:
+                    continue
+                indice["segnalati"].add(chiave)
+                indice["avvisi"].append(
+                    {
+                        "ora": adesso,
+                        "tipo": tipo,
+                        "quota": quota,
+                        "cartella": cartella,
+                        "file": percorso,
+                        "altra_cartella": indice["file"][altro_percorso]["cartella"],
+                        "altro_file": altro_percorso,
+                    }
+                )
+                nuovi += 1
+
+        indice["cartelle"].add(cartella)
+
+    return nuovi
+
+
+def pop_alerts(indice):
+    """
+    Restituisce e svuota la lista degli avvisi accumulati.
+
+    Le cartelle sono elaborate in parallelo: un file distribuito a tutte le
+    postazioni può generare avvisi prima che risulti diffuso. Al momento
+    della lettura gli avvisi su contenuti ormai presenti in almeno
+    SOGLIA_DIFFUSO postazioni vengono scartati.
+    """
+    with indice["lock"]:
+        avvisi = indice["avvisi"]
+        indice["avvisi"] = []
+
+        validi = []
+        for avviso in avvisi:
+            diffuso = False
+            for percorso in (avviso["file"], avviso["altro_file"]):
+                voce = indice["file"].get(percorso)
+                if voce is None:
+                    continue
+                stessi = indice["per_sha"].get(voce["sha"], ())
+                if len(_seats(indice, stessi)) >= SOGLIA_DIFFUSO:
+                    diffuso = True
+            if not diffuso:
+                validi.append(avviso)
+    return validi
+
+
+def forget_folder(indice, cartella):
+    """
+    Rimuove dall'indice i file di una cartella (ad es. cartella rimossa).
+    """
+    with indice["lock"]:
+        percorsi = [p for p, v in indice["file"].items() if v["cartella"] == cartella]
+        for percorso in percorsi:
+            _remove_entry(indice, percorso)
+        indice["cartelle"].discard(cartella)
@@ -0,0 +1,244 @@
+"""
+live_timeline.py
+Storico dell'attività delle postazioni durante la verifica (scheda LIVE).
+
+Per ogni cartella test vengono registrati, a intervalli, i file toccati,
+i byte modificati e la variazione di righe, confrontando lo stato dei file
+(dimensione, mtime) con quello della scansione precedente.
+
+I campioni sono tenuti in memoria in buffer circolari a dimensione fissa
+(array), a più risoluzioni: ogni registrazione viene sommata nel bucket
+corrente di tutti i livelli, quindi lo storico recente è fine (10 s) e
+quello vecchio resta disponibile solo aggregato (1 min, 5 min).
+La memoria occupata non cresce con la durata della verifica.
+
+Interfaccia:
+- new_timeline()
+- record_folder(timeline, cartella, files, conta_righe=None, adesso=None)
+- get_series(timeline, cartella, livello, n, metrica="file", adesso=None)
+- sparkline(valori)
+- forget_folder(timeline, cartella)
+"""
+
+import time
+import threading
+from array import array
+
+# livelli di risoluzione: (secondi per bucket, numero di bucket)
+LIVELLI = (
+    (10, 360),   # ultima ora, a 10 s
+    (60, 480),   # ultime 8 ore, a 1 min
+    (300, 288),  # ultime 24 ore, a 5 min
+)
+
+METRICHE = ("file", "byte", "righe")
+
+CARATTERI_SPARKLINE = "▁▂▃▄▅▆▇█"
+
+
+# =============================================================================
+#  STRUTTURE
+# =============================================================================
+
+def new_timeline(livelli=LIVELLI):
+    """
+    Crea uno storico vuoto (thread-safe: le scansioni registrano dai thread
+    del pool, la GUI legge dal mainloop).
+    """
+    return {
+        "livelli": tuple(livelli),
+        "lock": threading.Lock(),
+        "cartelle": {},  # cartella -> {"stato": {...}, "anelli": [...]}
+    }
+
+
+def _new_ring(passo, dimensione):
+    anello = {
+        "passo": passo,
+        "dimensione": dimensione,
+        "ultimo": None,  # indice assoluto (tempo // passo) dell'ultimo bucket
+    }
+    for metrica in METRICHE:
+        anello[metrica] = array("q", bytes(8 * dimensione))
+    return anello
+
+
+def _advance(anello, bucket):
+    """
+    Porta l'anello al bucket indicato azzerando gli slot intermedi
+    (quelli dei periodi senza attività).
+    """
+    ultimo = anello["ultimo"]
+    if ultimo is not None and bucket <= ultimo:
+        return
+
+    dimensione = anello["dimensione"]
+    if ultimo is None or bucket - ultimo >= dimensione:
+        da_azzerare = range(dimensione)
+    else:
+        da_azzerare = [b % dimensione for b in range(ultimo + 1, bucket + 1)]
+
+    for metrica in METRICHE:
+        valori = anello[metrica]
+        for slot in da_azzerare:
+            valori[slot] = 0
+
+    anello["ultimo"] = bucket
+
+
+def _folder_entry(timeline, cartella):
+    voce = timeline["cartelle"].get(cartella)
+    if voce is None:
+        voce = {
+            "stato": None,
+            "anelli": [_new_ring(passo, dim) for passo, dim in timeline["livelli"]],
+        }
+        timeline["cartelle"][cartella] = voce
+    return voce
+
+
+# =============================================================================
+#  REGISTRAZIONE
+# =============================================================================
+
+def record_folder(timeline, cartella, files, conta_righe=None, adesso=None):
+    """
+    Registra lo stato attuale di una cartella test.
+
+    - files:       lista di (percorso, stat_result, righe_o_None) dei file
+                   considerati (tipicamente quelli con le estensioni scelte)
+    - conta_righe: opzionale, funzione (percorso, stat) -> righe, chiamata
+                   SOLO per i file nuovi o modificati
+
+    La prima registrazione di una cartella fa da riferimento (nessuna
+    attività). La variazione di righe di un file modificato è esatta solo
+    se le sue righe erano già note (conteggio attivo o modifica precedente).
+    Restituisce il dizionario delle variazioni registrate.
+    """
+    if adesso is None:
+        adesso = time.time()
+
+    nuovo_stato = {}
+    for percorso, st, righe in files:
+        nuovo_stato[percorso] = (st.st_size, st.st_mtime_ns, righe, st)
+
+    with timeline["lock"]:
+        voce = _folder_entry(timeline, cartella)
+        precedente = voce["stato"]
+
+    delta = {"file": 0, "byte": 0, "righe": 0}
+
+    if precedente is not None:
+        for percorso, (size, mtime_ns, righe, st) in nuovo_stato.items():
+            vecchio = precedente.get(percorso)
+            if vecchio is not None and vecchio[0] == size and vecchio[1] == mtime_ns:
+                if righe is None:
+                    righe = vecchio[2]
+                nuovo_stato[percorso] = (size, mtime_ns, righe, st)
+                continue
+
+            # file nuovo o modificato
+            if righe is None and conta_righe is not None:
+                righe = conta_righe(percorso, st)
+            nuovo_stato[percorso] = (size, mtime_ns, righe, st)
+
+            delta["file"] += 1
+            if vecchio is None:
+                delta["byte"] += size
+                if righe is not None:
+                    delta["righe"] += righe
+            else:
+                delta["byte"] += abs(size - vecchio[0])
+                if righe is not None and vecchio[2] is not None:
+                    delta["righe"] += righe - vecchio[2]
+
+        for percorso, vecchio in precedente.items():
+            if percorso not in nuovo_stato:
+                # file cancellato o rinominato
+                delta["file"] += 1
+                delta["byte"] += vecchio[0]
+                if vecchio[2] is not None:
+                    delta["righe"] -= vecchio[2]
+
+    # nello stato servono solo dimensione, mtime e righe
+    stato = {}
+    for percorso, (size, mtime_ns, righe, _st) in nuovo_stato.items():
+        stato[percorso] = (size, mtime_ns, righe)
+
+    with timeline["lock"]:
+        voce["stato"] = stato
+        if delta["file"]:
+            for anello in voce["anelli"]:
+                bucket = int(adesso // anello["passo"])
+                _advance(anello, bucket)
+                slot = bucket % anello["dimensione"]
+                for metrica in METRICHE:
+                    anello[metrica][slot] += delta[metrica]
+
+    return delta
+
+
+def forget_folder(timeline, cartella):
+    """
+    Elimina lo storico di una cartella (ad es. cartella rimossa).
+    """
+    with timeline["lock"]:
+        timeline["cartelle"].pop(cartella, None)
+
+
+# =============================================================================
+#  LETTURA
+# =============================================================================
+
+def get_series(timeline, cartella, livello, n, metrica="file", adesso=None):
+    """
+    Ultimi n bucket (dal più vecchio al più recente, l'ultimo è quello
+    corrente) della metrica per la cartella, al livello di risoluzione
+    indicato. Non richiede alcuna scansione.
+    """
+    if adesso is None:
+        adesso = time.time()
+
+    with timeline["lock"]:
+        voce = timeline["cartelle"].get(cartella)
+        passo, dimensione = timeline["livelli"][livello]
+        n = min(n, dimensione)
+        if voce is None:
+            return [0] * n
+
+        anello = voce["anelli"][livello]
+        corrente = int(adesso // passo)
+        ultimo = anello["ultimo"]
+        valori = anello[metrica]
+
+        serie = []
+        for bucket in range(corrente - n + 1, corrente + 1):
+            if ultimo is None or bucket > ultimo or bucket <= ultimo - dimensione:
+                serie.append(0)
+            else:
+                serie.append(valori[bucket % dimensione])
+        return serie
+
+
+def sparkline(valori):
+    """
+    Rappresenta una serie di valori con caratteri unicode ▁▂▃▄▅▆▇█
+    (spazio per i bucket senza attività).
+    """
+    massimo = 0
+    for v in valori:
+        if abs(v) > massimo:
+            massimo = abs(v)
+
+    if massimo == 0:
+        return " " * len(valori)
+
+    livelli = len(CARATTERI_SPARKLINE)
+    testo = []
+    for v in valori:
+        if v == 0:
+            testo.append(" ")
+        else:
+            indice = (abs(v) * livelli - 1) // massimo
+            testo.append(CARATTERI_SPARKLINE[min(indice, livelli - 1)])
+    return "".join(testo)
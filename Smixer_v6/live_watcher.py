@@ -0,0 +1,426 @@
+"""
+live_watcher.py
+Osservazione delle cartelle test della directory remota per la scheda LIVE.
+
+Invece di riscandire tutto l'albero a intervalli fissi, il watcher segnala
+solo le cartelle test in cui qualcosa è cambiato:
+
+- backend "inotify" (Linux, filesystem locali): eventi del kernel tramite
+  ctypes, nessun I/O finché non cambia qualcosa;
+- backend "polling" (Windows, macOS, share di rete NFS/CIFS/SMB/FUSE dove
+  inotify non vede le modifiche fatte da altre macchine): a ogni giro
+  controlla solo l'mtime di ciascuna cartella test (una stat); la firma
+  completa (numero di voci, byte totali, mtime, con os.scandir, senza aprire
+  i file) viene ricalcolata quando quell'mtime cambia oppure allo scadere
+  dell'intervallo della cartella, che raddoppia finché la cartella resta
+  ferma (fino a POLLING_INTERVAL_MAX) e torna al minimo dopo una modifica.
+
+Interfaccia:
+- start_watcher(base_directory, folder_names, on_change, ...)
+      on_change(set_di_nomi_cartella) viene chiamato dal thread del watcher
+- stop_watcher(stato)
+"""
+
+import os
+import sys
+import time
+import errno
+import struct
+import select
+import threading
+import ctypes
+import ctypes.util
+
+# backend a polling: secondi tra due giri (e intervallo minimo di una
+# cartella appena modificata) e intervallo massimo di una cartella ferma.
+# Su share di rete ogni stat è un round trip: un massimo più alto riduce
+# l'I/O, ma una modifica "in place" in una cartella ferma può essere vista
+# con quel ritardo (creazioni/rimozioni al primo livello arrivano al giro
+# successivo tramite l'mtime della cartella)
+POLLING_INTERVAL = 5.0
+POLLING_INTERVAL_MAX = 60.0
+
+# raccolta eventi inotify: si notifica dopo una pausa di DEBOUNCE secondi
+# (o comunque entro DEBOUNCE_MAX) per accorpare le raffiche di scritture
+DEBOUNCE = 0.3
+DEBOUNCE_MAX = 1.0
+
+# filesystem su cui inotify non riceve le modifiche fatte da altri client
+NETWORK_FS_TYPES = {
+    "nfs",
+    "nfs4",
+    "cifs",
+    "smb3",
+    "smbfs",
+    "9p",
+    "afs",
+    "ceph",
+    "glusterfs",
+    "davfs",
+}
+
+# costanti da <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+_MASK_BASE = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ONLYDIR
+_MASK_CARTELLA = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+_EVENTO = struct.Struct("iIII")
+
+
+# =============================================================================
+#  SCELTA DEL BACKEND
+# =============================================================================
+
+def _filesystem_type(path):
+    """
+    Tipo di filesystem del punto di mount che contiene 'path' (Linux),
+    letto da /proc/mounts; stringa vuota se non determinabile.
+    """
+    try:
+        reale = os.path.realpath(path)
+        migliore = ""
+        tipo = ""
+        with open("/proc/mounts", "r", encoding="utf-8", errors="replace") as f:
+            for riga in f:
+                parti = riga.split()
+                if len(parti) < 3:
+                    continue
+                mount = parti[1].replace("\\040", " ")
+                if reale == mount or reale.startswith(mount.rstrip("/") + "/"):
+                    if len(mount) > len(migliore):
+                        migliore = mount
+                        tipo = parti[2]
+        return tipo
+    except Exception:
+        return ""
+
+
+def _inotify_usable(path):
+    """
+    True se su 'path' conviene usare inotify (Linux e filesystem locale).
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    tipo = _filesystem_type(path)
+    if tipo in NETWORK_FS_TYPES or tipo.startswith("fuse"):
+        return False
+    return True
+
+
+# =============================================================================
+#  BACKEND INOTIFY
+# =============================================================================
+
+def _load_libc():
+    nome = ctypes.util.find_library("c") or "libc.so.6"
+    libc = ctypes.CDLL(nome, use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_init1.restype = ctypes.c_int
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_add_watch.restype = ctypes.c_int
+    return libc
+
+
+def _add_watch(stato, path, cartella, mask):
+    """
+    Registra un watch; restituisce False se il limite di watch è esaurito.
+    """
+    wd = stato["libc"].inotify_add_watch(stato["fd"], os.fsencode(path), mask)
+    if wd < 0:
+        if ctypes.get_errno() == errno.ENOSPC:
+            return False
+        return True
+    stato["watch"][wd] = (cartella, path)
+    return True
+
+
+def _watch_tree(stato, cartella, path):
+    """
+    Aggiunge i watch a una cartella test e a tutte le sue sottocartelle.
+    """
+    for root, dirs, _files in os.walk(path):
+        if not _add_watch(stato, root, cartella, _MASK_CARTELLA):
+            return False
+    return True
+
+
+def _inotify_loop(stato, base_directory, folder_names, on_change):
+    fd = stato["fd"]
+    cambiate = set()
+    primo_evento = None
+    ultimo_evento = None
+
+    try:
+        while not stato["stop"].is_set():
+            pronti, _, _ = select.select([fd], [], [], 0.2)
+
+            if pronti:
+                try:
+                    dati = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    dati = b""
+
+                pos = 0
+                while pos + _EVENTO.size <= len(dati):
+                    wd, mask, _cookie, lunghezza = _EVENTO.unpack_from(dati, pos)
+                    nome = dati[pos + _EVENTO.size: pos + _EVENTO.size + lunghezza]
+                    nome = os.fsdecode(nome.rstrip(b"\0"))
+                    pos = pos + _EVENTO.size + lunghezza
+
+                    if mask & IN_Q_OVERFLOW:
+                        cambiate.update(folder_names)
+                        continue
+
+                    voce = stato["watch"].get(wd)
+                    if voce is None:
+                        continue
+
+                    if mask & IN_IGNORED:
+                        del stato["watch"][wd]
+                        continue
+
+                    cartella, path = voce
+
+                    if cartella is None:
+                        # evento sulla directory base: creazione/rimozione di una cartella test
+                        if nome in folder_names:
+                            cambiate.add(nome)
+                            if mask & (IN_CREATE | IN_MOVED_TO) and mask & IN_ISDIR:
+                                _watch_tree(stato, nome, os.path.join(base_directory, nome))
+                        continue
+
+                    cambiate.add(cartella)
+                    if mask & (IN_CREATE | IN_MOVED_TO) and mask & IN_ISDIR:
+                        _watch_tree(stato, cartella, os.path.join(path, nome))
+
+                ora = time.monotonic()
+                if cambiate:
+                    if primo_evento is None:
+                        primo_evento = ora
+                    ultimo_evento = ora
+
+            if cambiate:
+                ora = time.monotonic()
+                if ora - ultimo_evento >= DEBOUNCE or ora - primo_evento >= DEBOUNCE_MAX:
+                    da_notificare = set(cambiate)
+                    cambiate.clear()
+                    primo_evento = None
+                    ultimo_evento = None
+                    try:
+                        on_change(da_notificare)
+                    except Exception:
+                        pass
+    finally:
+        try:
+            os.close(fd)
+        except Exception:
+            pass
+
+
+def _start_inotify(stato, base_directory, folder_names, on_change):
+    """
+    Prepara il backend inotify; False se non disponibile (si passa al polling).
+    """
+    try:
+        libc = _load_libc()
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except Exception:
+        return False
+    if fd < 0:
+        return False
+
+    stato["libc"] = libc
+    stato["fd"] = fd
+    stato["watch"] = {}
+
+    ok = _add_watch(stato, base_directory, None, _MASK_BASE)
+    for nome in sorted(folder_names):
+        if not ok:
+            break
+        path = os.path.join(base_directory, nome)
+        if os.path.isdir(path):
+            ok = _watch_tree(stato, nome, path)
+
+    if not ok:
+        # limite fs.inotify.max_user_watches raggiunto
+        os.close(fd)
+        return False
+
+    stato["thread"] = threading.Thread(
+        target=_inotify_loop,
+        args=(stato, base_directory, folder_names, on_change),
+        daemon=True,
+    )
+    return True
+
+
+# =============================================================================
+#  BACKEND A POLLING
+# =============================================================================
+
+def _folder_signature(path):
+    """
+    Firma leggera di una cartella: (voci, byte, somma mtime, mtime massimo).
+    Usa solo i dati di os.scandir (su Windows già inclusi nel listing).
+    None se la cartella non esiste.
+    """
+    if not os.path.isdir(path):
+        return None
+
+    voci = 0
+    byte_totali = 0
+    somma_mtime = 0
+    max_mtime = 0
+    da_visitare = [path]
+
+    while da_visitare:
+        corrente = da_visitare.pop()
+        try:
+            with os.scandir(corrente) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    voci += 1
+                    somma_mtime += st.st_mtime_ns
+                    if st.st_mtime_ns > max_mtime:
+                        max_mtime = st.st_mtime_ns
+                    if entry.is_dir(follow_symlinks=False):
+                        da_visitare.append(entry.path)
+                    else:
+                        byte_totali += st.st_size
+        except OSError:
+            continue
+
+    return (voci, byte_totali, somma_mtime, max_mtime)
+
+
+def _folder_mtime(path):
+    """
+    mtime (ns) della sola cartella, None se non esiste: cambia quando vi
+    vengono create, rimosse o rinominate voci (non se un file viene
+    riscritto al suo interno).
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _polling_loop(stato, base_directory, folder_names, on_change, intervallo, intervallo_max):
+    firme = {}
+    mtime_cartelle = {}
+    attese = {}
+    scadenze = {}
+    ora = time.monotonic()
+    for nome in folder_names:
+        path = os.path.join(base_directory, nome)
+        mtime_cartelle[nome] = _folder_mtime(path)
+        firme[nome] = _folder_signature(path)
+        attese[nome] = intervallo
+        scadenze[nome] = ora + intervallo
+
+    while not stato["stop"].wait(intervallo):
+        cambiate = set()
+        for nome in folder_names:
+            if stato["stop"].is_set():
+                return
+            path = os.path.join(base_directory, nome)
+            mtime = _folder_mtime(path)
+            if mtime == mtime_cartelle[nome] and time.monotonic() < scadenze[nome]:
+                continue
+
+            mtime_cartelle[nome] = mtime
+            firma = _folder_signature(path)
+            if firma != firme[nome]:
+                firme[nome] = firma
+                cambiate.add(nome)
+                attese[nome] = intervallo
+            else:
+                # cartella ferma: la si riscandisce sempre più di rado
+                attese[nome] = min(attese[nome] * 2, intervallo_max)
+            scadenze[nome] = time.monotonic() + attese[nome]
+
+        if cambiate:
+            try:
+                on_change(cambiate)
+            except Exception:
+                pass
+
+
+# =============================================================================
+#  INTERFACCIA
+# =============================================================================
+
+def start_watcher(
+    base_directory,
+    folder_names,
+    on_change,
+    polling_interval=POLLING_INTERVAL,
+    force_polling=False,
+    polling_interval_max=POLLING_INTERVAL_MAX,
+):
+    """
+    Avvia l'osservazione delle cartelle 'folder_names' sotto 'base_directory'.
+    Restituisce lo stato del watcher ({"backend": "inotify"/"polling", ...}).
+    'polling_interval' / 'polling_interval_max' valgono solo per il backend
+    a polling (vedi POLLING_INTERVAL_MAX).
+    """
+    polling_interval_max = max(polling_interval, polling_interval_max)
+    folder_names = set(folder_names)
+    stato = {"backend": "", "stop": threading.Event(), "thread": None}
+
+    if not force_polling and _inotify_usable(base_directory):
+        if _start_inotify(stato, base_directory, folder_names, on_change):
+            stato["backend"] = "inotify"
+
+    if stato["backend"] == "":
+        stato["backend"] = "polling"
+        stato["thread"] = threading.Thread(
+            target=_polling_loop,
+            args=(
+                stato,
+                base_directory,
+                folder_names,
+                on_change,
+                polling_interval,
+                polling_interval_max,
+            ),
+            daemon=True,
+        )
+
+    stato["thread"].start()
+    return stato
+
+
+def stop_watcher(stato):
+    """
+    Ferma il watcher (non attende la fine del thread).
+    """
+    if stato is not None:
+        stato["stop"].set()
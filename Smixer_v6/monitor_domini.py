@@ -0,0 +1,346 @@
+"""
+monitor_domini.py
+Monitor live dei domini degli alunni durante la verifica.
+
+Ogni 'intervallo' secondi un thread di pianificazione interroga tutti i
+domini con un pool limitato di connessioni (ftpAgent.poll_domain: solo
+listing MLSD/LIST condizionale, nessun download) e la finestra mostra per
+ciascun dominio numero di file, variazione rispetto all'avvio del monitor,
+ultima modifica remota e tempo trascorso.
+
+I file vengono scaricati solo su richiesta ("Scarica selezionati"), tramite
+il callback fornito dalla scheda Domini.
+"""
+
+import queue
+import threading
+import time
+from datetime import timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import tkinter as tk
+from tkinter import ttk
+
+import ftpAgent
+from utils import format_age
+
+MONITOR_MAX_WORKERS = 4
+INTERVALLO_DEFAULT = 60  # secondi
+INTERVALLO_MINIMO = 15  # secondi
+AGGIORNAMENTO_GUI_MS = 500
+
+COLORE_CAMBIATO = "#fff3b0"
+
+
+def _data_locale(data, utc):
+    """
+    Converte la data remota in ora locale (MLSD fornisce date UTC,
+    LIST le fornisce già nell'ora del server).
+    """
+    if data is None:
+        return None
+    if utc:
+        return data.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return data
+
+
+def open_domain_monitor(parent, get_jobs, scarica_cb=None):
+    """
+    Apre la finestra del monitor.
+
+    - get_jobs():        restituisce i job FTP (come ftpAgent) dei domini
+                         da monitorare; chiamata a ogni avvio del monitor
+    - scarica_cb(items): opzionale, scarica le righe selezionate (item_id
+                         della tabella Domini)
+    """
+    top = tk.Toplevel(parent)
+    top.title("Monitor live domini")
+    top.geometry("1100x520")
+
+    # ==================================================================
+    # STATO
+    # ==================================================================
+    coda = queue.Queue()
+    stato = {
+        "intervallo": INTERVALLO_DEFAULT,
+        "thread": None,
+        "stop": None,
+        "sveglia": None,
+        "after_id": None,
+        # cresce a ogni avvio/arresto: i messaggi in coda di un thread
+        # fermato (generazione vecchia) vengono scartati
+        "generazione": 0,
+    }
+    # item_id -> {"file_iniziali", "file", "ultima_modifica"}
+    righe = {}
+
+    # ==================================================================
+    # RIGA 0: controlli
+    # ==================================================================
+    barra = tk.Frame(top)
+    barra.grid(row=0, column=0, sticky="ew", padx=8, pady=6)
+
+    btn_avvia = tk.Button(barra, text="Avvia monitor", width=16)
+    btn_avvia.pack(side="left", padx=4)
+
+    btn_ora = tk.Button(barra, text="Aggiorna ora", width=14, state="disabled")
+    btn_ora.pack(side="left", padx=4)
+
+    tk.Label(barra, text="Intervallo (s):").pack(side="left", padx=(12, 2))
+    intervallo_var = tk.StringVar(value=str(INTERVALLO_DEFAULT))
+    spin_intervallo = tk.Spinbox(
+        barra,
+        from_=INTERVALLO_MINIMO,
+        to=900,
+        increment=15,
+        width=6,
+        textvariable=intervallo_var,
+    )
+    spin_intervallo.pack(side="left")
+
+    btn_scarica = tk.Button(barra, text="Scarica selezionati", width=18)
+    btn_scarica.pack(side="left", padx=12)
+    if scarica_cb is None:
+        btn_scarica.configure(state="disabled")
+
+    lbl_stato = tk.Label(barra, text="Monitor fermo.", anchor="w")
+    lbl_stato.pack(side="left", padx=8)
+
+    # ==================================================================
+    # RIGA 1: tabella
+    # ==================================================================
+    colonne = (
+        "Alunno",
+        "Dominio",
+        "N. file",
+        "Δ file",
+        "Ultima modifica",
+        "Tempo trascorso",
+        "Listing",
+        "Stato",
+    )
+
+    tree = ttk.Treeview(top, columns=colonne, show="headings")
+
+    i = 0
+    while i < len(colonne):
+        col = colonne[i]
+        tree.heading(col, text=col)
+        if col in ("Alunno", "Dominio"):
+            tree.column(col, width=170, anchor="w")
+        elif col == "Stato":
+            tree.column(col, width=220, anchor="w")
+        else:
+            tree.column(col, width=100, anchor="center")
+        i = i + 1
+
+    tree.tag_configure("cambiato", background=COLORE_CAMBIATO)
+
+    tree.grid(row=1, column=0, sticky="nsew", padx=8, pady=4)
+    scrollbar = ttk.Scrollbar(top, orient="vertical", command=tree.yview)
+    tree.configure(yscrollcommand=scrollbar.set)
+    scrollbar.grid(row=1, column=1, sticky="ns")
+
+    top.grid_rowconfigure(1, weight=1)
+    top.grid_columnconfigure(0, weight=1)
+
+    # ==================================================================
+    # THREAD DI PIANIFICAZIONE (nessun accesso a Tk)
+    # ==================================================================
+    def _ciclo(jobs, stop, sveglia, generazione):
+        dirs_by_item = {}
+        giro = 0
+
+        while not stop.is_set():
+            forza = giro % ftpAgent.MONITOR_FULL_EVERY == 0
+            t0 = time.perf_counter()
+
+            def _interroga(job):
+                esito = ftpAgent.poll_domain(job, dirs_by_item.get(job["item_id"]), forza)
+                if esito["ok"]:
+                    dirs_by_item[job["item_id"]] = esito["dirs"]
+                coda.put(("esito", generazione, job["item_id"], esito))
+
+            with ThreadPoolExecutor(max_workers=MONITOR_MAX_WORKERS) as pool:
+                k = 0
+                while k < len(jobs):
+                    pool.submit(_interroga, jobs[k])
+                    k = k + 1
+
+            coda.put(("giro", generazione, giro + 1, time.perf_counter() - t0, forza))
+            giro = giro + 1
+
+            sveglia.wait(stato["intervallo"])
+            sveglia.clear()
+
+    # ==================================================================
+    # GUI
+    # ==================================================================
+    def _leggi_intervallo():
+        try:
+            valore = int(float(intervallo_var.get()))
+        except Exception:
+            valore = INTERVALLO_DEFAULT
+        if valore < INTERVALLO_MINIMO:
+            valore = INTERVALLO_MINIMO
+        stato["intervallo"] = valore
+
+    def _applica_esito(item_id, esito):
+        if not tree.exists(item_id):
+            return
+
+        if not esito["ok"]:
+            tree.set(item_id, "Stato", "Errore: " + esito["errore"][:80])
+            return
+
+        if not esito["completo"]:
+            # cartelle non lette: conteggi non affidabili, si tengono i precedenti
+            tree.set(item_id, "Stato", "Listing incompleto (non verificato)")
+            return
+
+        riga = righe.get(item_id)
+        if riga is None:
+            riga = {"file_iniziali": esito["file"], "file": esito["file"], "ultima_modifica": None}
+            righe[item_id] = riga
+
+        data = _data_locale(esito["ultima_modifica"], esito["utc"])
+        cambiato = riga["file"] != esito["file"] or (
+            riga["ultima_modifica"] is not None and data != riga["ultima_modifica"]
+        )
+        riga["file"] = esito["file"]
+        riga["ultima_modifica"] = data
+
+        delta = esito["file"] - riga["file_iniziali"]
+        if delta > 0:
+            testo_delta = "+" + str(delta)
+        else:
+            testo_delta = str(delta)
+
+        if data is not None:
+            testo_data = data.strftime("%Y-%m-%d %H:%M")
+            testo_eta = format_age(data.timestamp())
+        else:
+            testo_data = "n.d."
+            testo_eta = "-"
+
+        tree.set(item_id, "N. file", str(esito["file"]))
+        tree.set(item_id, "Δ file", testo_delta)
+        tree.set(item_id, "Ultima modifica", testo_data)
+        tree.set(item_id, "Tempo trascorso", testo_eta)
+        tree.set(
+            item_id,
+            "Listing",
+            "{} (+{} riusati)".format(esito["listing"], esito["listing_riusati"]),
+        )
+        tree.set(item_id, "Stato", "Modificato" if cambiato else "OK")
+
+        if cambiato:
+            tree.item(item_id, tags=("cambiato",))
+        else:
+            tree.item(item_id, tags=())
+
+    def _svuota_coda():
+        stato["after_id"] = None
+        while True:
+            try:
+                messaggio = coda.get_nowait()
+            except queue.Empty:
+                break
+
+            if messaggio[1] != stato["generazione"]:
+                # risultato di un monitor già fermato
+                continue
+
+            if messaggio[0] == "esito":
+                _applica_esito(messaggio[2], messaggio[3])
+            elif messaggio[0] == "giro":
+                lbl_stato.config(
+                    text="Giro {} completato in {:.1f} s{} — prossimo tra {} s.".format(
+                        messaggio[2],
+                        messaggio[3],
+                        " (completo)" if messaggio[4] else "",
+                        stato["intervallo"],
+                    )
+                )
+
+        if top.winfo_exists():
+            stato["after_id"] = top.after(AGGIORNAMENTO_GUI_MS, _svuota_coda)
+
+    def avvia():
+        if stato["thread"] is not None:
+            ferma()
+            return
+
+        jobs = get_jobs()
+        if not jobs:
+            lbl_stato.config(text="Nessun dominio con dati FTP completi.")
+            return
+
+        tree.delete(*tree.get_children())
+        righe.clear()
+
+        k = 0
+        while k < len(jobs):
+            job = jobs[k]
+            tree.insert(
+                "",
+                "end",
+                iid=job["item_id"],
+                values=(job["alunno"], job["dominio"], "", "", "", "", "", "In attesa..."),
+            )
+            k = k + 1
+
+        _leggi_intervallo()
+        stop = threading.Event()
+        sveglia = threading.Event()
+        stato["stop"] = stop
+        stato["sveglia"] = sveglia
+        stato["generazione"] = stato["generazione"] + 1
+        stato["thread"] = threading.Thread(
+            target=_ciclo, args=(jobs, stop, sveglia, stato["generazione"]), daemon=True
+        )
+        stato["thread"].start()
+
+        btn_avvia.configure(text="Ferma monitor")
+        btn_ora.configure(state="normal")
+        lbl_stato.config(text="Monitor avviato su {} domini...".format(len(jobs)))
+
+    def ferma():
+        if stato["stop"] is not None:
+            stato["stop"].set()
+            stato["sveglia"].set()
+        stato["generazione"] = stato["generazione"] + 1
+        stato["thread"] = None
+        stato["stop"] = None
+        stato["sveglia"] = None
+        btn_avvia.configure(text="Avvia monitor")
+        btn_ora.configure(state="disabled")
+        lbl_stato.config(text="Monitor fermo.")
+
+    def aggiorna_ora():
+        if stato["sveglia"] is not None:
+            stato["sveglia"].set()
+
+    def scarica_selezionati():
+        selezione = tree.selection()
+        if scarica_cb is not None and selezione:
+            scarica_cb(list(selezione))
+
+    def chiudi():
+        ferma()
+        if stato["after_id"] is not None:
+            try:
+                top.after_cancel(stato["after_id"])
+            except Exception:
+                pass
+        top.destroy()
+
+    btn_avvia.configure(command=avvia)
+    btn_ora.configure(command=aggiorna_ora)
+    btn_scarica.configure(command=scarica_selezionati)
+    intervallo_var.trace_add("write", lambda *args: _leggi_intervallo())
+    top.protocol("WM_DELETE_WINDOW", chiudi)
+
+    stato["after_id"] = top.after(AGGIORNAMENTO_GUI_MS, _svuota_coda)
+
+    return top
@@ -10,15 +10,32 @@ Fasi:
 - "merge_domains"  : generazione testi merged dei domini (e salvataggio __MERGED__.txt)
 - "compare"        : confronto verifica vs merge dominio (metriche)
 
+Modalità pipeline (opzionale):
+    start_domain_indexer / index_downloaded_file / stop_domain_indexer
+    (+ domain_indexer_done / domain_indexer_result) permettono di normalizzare i file del dominio man mano che vengono scaricati;
+l'indice prodotto viene poi passato ad analyze_reuse_by_student (domain_index)
+che riutilizza i blocchi già pronti invece di rileggere i file dal disco.
+
+Librerie note (opzionale):
+    i file dei domini il cui sha256 compare nell'insieme 'skip_hashes'
+    (elenco 'librerie_note.txt' e/o file identici in molti domini, vedi
+    ftpAgent.shared_file_hashes) vengono esclusi dal merge, così jQuery,
+    Bootstrap e simili non gonfiano le metriche di riuso.
+
 Le altre funzionalità restano invariate (heatmap coerente con similarity.py).
 """
 
 import os
 import difflib
+import hashlib
+import queue
+import threading
 
 import tkinter as tk
 from tkinter import Toplevel, messagebox
 
+import utils
+
 try:
     import matplotlib.pyplot as plt
     from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
@@ -34,6 +51,9 @@ except Exception:
 # LETTURA E NORMALIZZAZIONE TESTO
 # ======================================================================
 
+MERGED_FILE_NAME = "__MERGED__.txt"
+LIBRERIE_NOTE_FILE = "librerie_note.txt"
+
 def _safe_read_text(file_path):
     """
     Legge un file di testo provando alcune codifiche comuni.
@@ -66,6 +86,28 @@ def _safe_read_text(file_path):
         return ""
 
 
+def _read_text_and_sha256(file_path):
+    """
+    Legge il file UNA sola volta e restituisce (testo, sha256): lo sha dei
+    byte letti e il testo decodificato come _safe_read_text (UTF-8, poi
+    latin-1, a capo normalizzati come in lettura testuale).
+    (None, None) se il file non è leggibile.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            dati = f.read()
+    except Exception:
+        return None, None
+
+    impronta = hashlib.sha256(dati).hexdigest()
+    try:
+        testo = dati.decode("utf-8")
+    except UnicodeDecodeError:
+        testo = dati.decode("latin-1")
+    testo = testo.replace("\r\n", "\n").replace("\r", "\n")
+    return testo, impronta
+
+
 def _normalize_text_for_code(text):
     """
     Normalizza il testo pensando a codice sorgente:
@@ -139,13 +181,60 @@ def _text_to_line_set(text, min_len):
     return insieme
 
 
-def read_text_from_directory(directory_path, allowed_extensions):
+def _has_allowed_extension(nome, allowed_extensions):
+    """
+    True se il nome file termina con una delle estensioni ammesse.
+    """
+    nome_lower = nome.lower()
+    k = 0
+    while k < len(allowed_extensions):
+        if nome_lower.endswith(allowed_extensions[k]):
+            return True
+        k = k + 1
+    return False
+
+
+def _read_file_block(percorso, directory_path, contenuto=None):
+    """
+    Legge un file e restituisce il blocco (già normalizzato)
+        FILE: relativo/percorso/file.ext
+        <contenuto>
+    oppure stringa vuota se il file è vuoto/illeggibile.
+    'contenuto' (opzionale) è il testo già letto: il file non viene riletto.
+
+    Poiché _normalize_text_for_code lavora riga per riga, unire con "\n"
+    i blocchi normalizzati equivale a normalizzare il testo concatenato.
+    """
+    if contenuto is None:
+        contenuto = _safe_read_text(percorso)
+
+    if contenuto is None or contenuto == "":
+        return ""
+
+    blocco = (
+        "FILE: "
+        + os.path.relpath(percorso, directory_path)
+        + "\n"
+        + contenuto
+        + "\n"
+    )
+    return _normalize_text_for_code(blocco)
+
+
+def read_text_from_directory(directory_path, allowed_extensions, cache=None, skip_hashes=None):
     """
     Scorre ricorsivamente una directory e concatena il contenuto di tutti i file
     con estensione in allowed_extensions.
 
     Ogni blocco è preceduto dalla riga:
         FILE: relativo/percorso/file.ext
+
+    'cache' (opzionale) è un dizionario {percorso_assoluto: voce} prodotto
+    dall'indicizzatore dei domini: se la voce corrisponde ancora al file su
+    disco (dimensione e mtime) il blocco normalizzato viene riutilizzato.
+
+    'skip_hashes' (opzionale) è un insieme di sha256 da escludere.
+    Il file __MERGED__.txt generato dall'analisi non viene mai incluso.
     """
     if not directory_path or not os.path.isdir(directory_path):
         return ""
@@ -156,37 +245,176 @@ def read_text_from_directory(directory_path, allowed_extensions):
         j = 0
         while j < len(files):
             nome = files[j]
-            nome_lower = nome.lower()
-
-            estensione_valida = False
-            k = 0
-            while k < len(allowed_extensions):
-                est = allowed_extensions[k]
-                if nome_lower.endswith(est):
-                    estensione_valida = True
-                    break
-                k = k + 1
-
-            if estensione_valida:
-                percorso = os.path.join(radice, nome)
-                contenuto = _safe_read_text(percorso)
 
-                if contenuto is None:
-                    contenuto = ""
+            if nome != MERGED_FILE_NAME and _has_allowed_extension(nome, allowed_extensions):
+                percorso = os.path.join(radice, nome)
 
-                if contenuto != "":
-                    blocchi.append(
-                        "FILE: "
-                        + os.path.relpath(percorso, directory_path)
-                        + "\n"
-                        + contenuto
-                        + "\n"
-                    )
+                voce = None
+                if cache is not None:
+                    voce = cache.get(percorso)
+                    if voce is not None and not _index_entry_is_current(voce, percorso):
+                        voce = None
+
+                escluso = False
+                if skip_hashes:
+                    if voce is not None:
+                        impronta = voce.get("sha256")
+                    else:
+                        impronta = utils.file_sha256(percorso)
+                    escluso = impronta in skip_hashes
+
+                if not escluso:
+                    if voce is not None:
+                        blocco = voce["blocco"]
+                    else:
+                        blocco = _read_file_block(percorso, directory_path)
+
+                    if blocco != "":
+                        blocchi.append(blocco)
 
             j = j + 1
 
-    testo = "\n".join(blocchi)
-    return _normalize_text_for_code(testo)
+    return "\n".join(blocchi)
+
+
+def load_library_hashes(percorsi_file):
+    """
+    Legge uno o più elenchi di librerie note (un sha256 per riga,
+    righe vuote e commenti '#' ignorati). I file mancanti sono ignorati.
+    """
+    hashes = set()
+
+    i = 0
+    while i < len(percorsi_file):
+        percorso = percorsi_file[i]
+        if percorso and os.path.isfile(percorso):
+            try:
+                with open(percorso, "r", encoding="utf-8", errors="ignore") as f:
+                    for riga in f:
+                        valore = riga.split("#", 1)[0].strip().lower()
+                        if len(valore) == 64:
+                            hashes.add(valore)
+            except Exception:
+                pass
+        i = i + 1
+
+    return hashes
+
+
+# ======================================================================
+# INDICE DOMINI IN PIPELINE (download → normalizzazione)
+# ======================================================================
+
+def _index_entry_is_current(voce, percorso):
+    """
+    Verifica che la voce d'indice descriva ancora il file su disco.
+    """
+    try:
+        st = os.stat(percorso)
+    except Exception:
+        return False
+    return voce.get("size") == st.st_size and voce.get("mtime_ns") == st.st_mtime_ns
+
+
+def _index_one_file(indicizzatore, alunno, dom_dir, percorso):
+    """
+    Normalizza e calcola l'impronta (sha256) di un singolo file scaricato.
+    """
+    if not _has_allowed_extension(os.path.basename(percorso), indicizzatore["estensioni"]):
+        return
+
+    try:
+        st = os.stat(percorso)
+    except Exception:
+        return
+
+    # una sola lettura per impronta e contenuto
+    contenuto, impronta = _read_text_and_sha256(percorso)
+    if impronta is None:
+        return
+
+    voce = {
+        "blocco": _read_file_block(percorso, dom_dir, contenuto),
+        "sha256": impronta,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+    }
+
+    with indicizzatore["lock"]:
+        per_alunno = indicizzatore["index"].get(alunno)
+        if per_alunno is None:
+            per_alunno = {}
+            indicizzatore["index"][alunno] = per_alunno
+        per_alunno[percorso] = voce
+        indicizzatore["file_indicizzati"] = indicizzatore["file_indicizzati"] + 1
+
+
+def _indexer_loop(indicizzatore):
+    """
+    Consumatore della coda: un solo thread CPU che lavora mentre
+    i thread FTP sono impegnati nel trasferimento di rete.
+    """
+    coda = indicizzatore["queue"]
+    while True:
+        elemento = coda.get()
+        if elemento is None:
+            return
+        alunno, dom_dir, percorso = elemento
+        try:
+            _index_one_file(indicizzatore, alunno, dom_dir, percorso)
+        except Exception:
+            pass
+
+
+def start_domain_indexer(allowed_extensions):
+    """
+    Avvia l'indicizzatore in pipeline e ne restituisce lo stato.
+    I file si accodano con index_downloaded_file (thread-safe).
+    """
+    indicizzatore = {
+        "estensioni": tuple(allowed_extensions),
+        "queue": queue.Queue(),
+        "index": {},
+        "lock": threading.Lock(),
+        "file_indicizzati": 0,
+        "thread": None,
+    }
+
+    t = threading.Thread(target=_indexer_loop, args=(indicizzatore,), daemon=True)
+    t.start()
+    indicizzatore["thread"] = t
+    return indicizzatore
+
+
+def index_downloaded_file(indicizzatore, alunno, dom_dir, percorso):
+    """
+    Accoda un file appena scaricato (chiamabile dai worker FTP).
+    """
+    indicizzatore["queue"].put((alunno, dom_dir, percorso))
+
+
+def stop_domain_indexer(indicizzatore):
+    """
+    Segnala la fine dei file da indicizzare e ritorna SUBITO (non attende:
+    può essere chiamata dal thread Tk). La fine del lavoro si controlla con
+    domain_indexer_done, poi l'indice si legge con domain_indexer_result.
+    """
+    indicizzatore["queue"].put(None)
+
+
+def domain_indexer_done(indicizzatore):
+    """
+    True quando l'indicizzatore ha elaborato tutta la coda.
+    """
+    return indicizzatore["thread"] is None or not indicizzatore["thread"].is_alive()
+
+
+def domain_indexer_result(indicizzatore):
+    """
+    Indice prodotto (da leggere dopo domain_indexer_done):
+        {alunno: {percorso_assoluto: {"blocco", "sha256", "size", "mtime_ns"}}}
+    """
+    return indicizzatore["index"]
 
 
 # ======================================================================
@@ -208,11 +436,15 @@ def _write_text(path, text):
             pass
 
 
-def generate_domain_merges(domini_dirs, allowed_extensions, progress_cb=None):
+def generate_domain_merges(domini_dirs, allowed_extensions, progress_cb=None, domain_index=None, skip_hashes=None):
     """
     Crea __MERGED__.txt in ogni cartella dominio e restituisce i testi merged.
 
     progress_cb("merge_domains", indice_corrente, totale, nome_studente)
+
+    Con 'domain_index' (da domain_indexer_result) i file già normalizzati
+    durante il download non vengono riletti; i file con sha256 in
+    'skip_hashes' (librerie note) sono esclusi.
     """
     merged_texts_by_student = {}
     merged_paths_by_student = {}
@@ -233,10 +465,13 @@ def generate_domain_merges(domini_dirs, allowed_extensions, progress_cb=None):
         dom_dir = domini_dirs.get(stud)
 
         if dom_dir and os.path.isdir(dom_dir):
-            testo_merged = read_text_from_directory(dom_dir, allowed_extensions)
+            cache = None
+            if domain_index is not None:
+                cache = domain_index.get(stud)
+            testo_merged = read_text_from_directory(dom_dir, allowed_extensions, cache, skip_hashes)
             merged_texts_by_student[stud] = testo_merged
 
-            merged_path = os.path.join(dom_dir, "__MERGED__.txt")
+            merged_path = os.path.join(dom_dir, MERGED_FILE_NAME)
             _write_text(merged_path, testo_merged)
             merged_paths_by_student[stud] = merged_path
 
@@ -396,7 +631,14 @@ def compute_merge_metrics(test_text, merged_domain_text, min_line_len=4, min_blo
 # PIPELINE PRINCIPALE
 # ======================================================================
 
-def analyze_reuse_by_student(tests_dirs, domini_dirs, allowed_extensions, progress_cb=None):
+def analyze_reuse_by_student(
+    tests_dirs,
+    domini_dirs,
+    allowed_extensions,
+    progress_cb=None,
+    domain_index=None,
+    skip_hashes=None,
+):
     """
     Esegue tutta la pipeline di analisi del riuso per studente.
 
@@ -404,6 +646,8 @@ def analyze_reuse_by_student(tests_dirs, domini_dirs, allowed_extensions, progre
       - tests_dirs:   dict {studente: path_verifica_locale}
       - domini_dirs:  dict {studente: path_cartella_dominio}
       - allowed_extensions: lista/tupla di estensioni (".php", ".html", ...)
+      - domain_index: indice opzionale prodotto in pipeline durante il download
+      - skip_hashes:  sha256 dei file di libreria da escludere dai domini
 
     Restituisce:
       metrics_by_student, students_in_test, students_in_domain,
@@ -438,6 +682,8 @@ def analyze_reuse_by_student(tests_dirs, domini_dirs, allowed_extensions, progre
         domini_dirs,
         allowed_extensions,
         progress_cb,
+        domain_index,
+        skip_hashes,
     )
 
     studenti = sorted(
@@ -1,7 +1,29 @@
 import os
+import json
+import time
+import hashlib
+import atexit
+import threading
 from datetime import datetime
 
-import data_handler  # per riutilizzare la logica su test01..test30
+import data_handler  # per riutilizzare la logica sulle cartelle test
+import live_timeline
+import live_copie
+
+# Cache persistente del conteggio righe: percorso -> [size, mtime_ns, righe]
+LINE_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".smx", "line_count_cache.json")
+LINE_CACHE_MAX_ENTRIES = 50000
+# la cache viene riscritta al più ogni LINE_CACHE_SAVE_INTERVAL secondi
+# (e comunque all'uscita del programma)
+LINE_CACHE_SAVE_INTERVAL = 60
+
+_line_cache = None
+_line_cache_dirty = False
+_line_cache_saved_at = 0.0
+_line_cache_lock = threading.Lock()
+
+# lettura a blocchi per lo sha256 dei file
+SHA256_CHUNK_SIZE = 1024 * 1024
 
 
 # =============================================================================
@@ -49,6 +71,82 @@ def parse_extensions(ext_string: str):
     return result
 
 
+# =============================================================================
+#  RICONCILIAZIONE TREEVIEW (aggiornamenti per chiave, senza ricostruire)
+# =============================================================================
+
+def _same_values(tree_values, new_values):
+    """
+    Confronta i valori letti dalla Treeview (Tk può restituirli come
+    stringhe o numeri) con quelli nuovi, come stringhe.
+    """
+    if len(tree_values) != len(new_values):
+        return False
+    for a, b in zip(tree_values, new_values):
+        if str(a) != str(b):
+            return False
+    return True
+
+
+def reconcile_tree_rows(tree, rows):
+    """
+    Porta la Treeview (righe di primo livello) allo stato `rows`, lista
+    ordinata di (chiave, valori), usando la chiave come iid:
+      - inserisce le righe nuove;
+      - aggiorna solo le righe i cui valori sono cambiati;
+      - rimuove le righe non più presenti;
+      - sposta le righe solo se l'ordine è diverso.
+    Selezione e posizione di scorrimento vengono conservate.
+    Restituisce (inserite, aggiornate, rimosse).
+    """
+    inserite = 0
+    aggiornate = 0
+    rimosse = 0
+
+    chiavi = [str(chiave) for chiave, _valori in rows]
+    desiderate = set(chiavi)
+
+    correnti = tree.get_children()
+    da_rimuovere = [iid for iid in correnti if iid not in desiderate]
+    if da_rimuovere:
+        tree.delete(*da_rimuovere)
+        rimosse = len(da_rimuovere)
+
+    presenti = set(correnti)
+    for chiave, (_k, valori) in zip(chiavi, rows):
+        valori = tuple(valori)
+        if chiave in presenti:
+            if not _same_values(tree.item(chiave, "values"), valori):
+                tree.item(chiave, values=valori)
+                aggiornate += 1
+        else:
+            tree.insert("", "end", iid=chiave, values=valori)
+            inserite += 1
+
+    if list(tree.get_children()) != chiavi:
+        for indice, chiave in enumerate(chiavi):
+            tree.move(chiave, "", indice)
+
+    return inserite, aggiornate, rimosse
+
+
+def update_tree_cells(tree, modifiche):
+    """
+    Applica una lista di (item_id, colonna, valore) scrivendo solo le celle
+    il cui valore è cambiato (righe inesistenti ignorate).
+    Restituisce il numero di celle scritte.
+    """
+    scritte = 0
+    for item_id, colonna, valore in modifiche:
+        try:
+            if str(tree.set(item_id, colonna)) != str(valore):
+                tree.set(item_id, colonna, valore)
+                scritte += 1
+        except Exception:
+            pass
+    return scritte
+
+
 # =============================================================================
 #  UTILITÀ PER LA SCHEDA "CORREZIONE"
 # =============================================================================
@@ -122,10 +220,10 @@ def count_directory_content(directory, entry_extension):
     return num_folders, num_files, num_extension_files, extension_files
 
 
-def check_directory_content(base_directory, subdir, tree, entry_extension):
+def directory_content_row(base_directory, subdir, entry_extension):
     """
-    Calcola le statistiche sulla sottocartella `subdir` e inserisce una riga
-    nella Treeview (Correzione / Preparazione).
+    Valori della riga della Treeview (Correzione / Preparazione) per la
+    sottocartella `subdir`.
     """
     full_path = os.path.join(base_directory, subdir)
     num_folders, num_files, num_extension_files, extension_files = count_directory_content(
@@ -134,25 +232,34 @@ def check_directory_content(base_directory, subdir, tree, entry_extension):
 
     # NOTA: ci aspettiamo che l'albero abbia anche una colonna "mix_file":
     # per le schede che non la usano mettiamo stringa vuota.
+    return (
+        subdir,
+        num_folders,
+        num_files,
+        num_extension_files,
+        ", ".join(extension_files),
+        "",
+    )
+
+
+def check_directory_content(base_directory, subdir, tree, entry_extension):
+    """
+    Calcola le statistiche sulla sottocartella `subdir` e inserisce una riga
+    nella Treeview (Correzione / Preparazione).
+    """
     tree.insert(
         "",
         "end",
-        values=(
-            subdir,
-            num_folders,
-            num_files,
-            num_extension_files,
-            ", ".join(extension_files),
-            "",
-        ),
+        values=directory_content_row(base_directory, subdir, entry_extension),
     )
 
 
-def update_subdirectories_list(selected_directory, tree, entry_extension):
+def update_subdirectories_list(selected_directory, tree, entry_extension, skip_prefixes=()):
     """
     Elenca le sottodirectory immediate di `selected_directory`, le ordina
-    alfabeticamente e per ciascuna calcola le statistiche inserendole
-    nella Treeview.
+    alfabeticamente e per ciascuna calcola le statistiche, aggiornando la
+    Treeview per chiave (nome sottocartella) con reconcile_tree_rows.
+    Le sottocartelle che iniziano con uno dei `skip_prefixes` sono escluse.
     """
     if not selected_directory or not os.path.isdir(selected_directory):
         tree.delete(*tree.get_children())
@@ -162,19 +269,44 @@ def update_subdirectories_list(selected_directory, tree, entry_extension):
         d
         for d in os.listdir(selected_directory)
         if os.path.isdir(os.path.join(selected_directory, d))
+        and not any(d.startswith(p) for p in skip_prefixes)
     ]
     subdirectories.sort()
 
-    tree.delete(*tree.get_children())
-    for subdir in subdirectories:
-        check_directory_content(selected_directory, subdir, tree, entry_extension)
+    rows = [
+        (subdir, directory_content_row(selected_directory, subdir, entry_extension))
+        for subdir in subdirectories
+    ]
+    reconcile_tree_rows(tree, rows)
+
+
+# =============================================================================
+#  IMPRONTA DEI FILE
+# =============================================================================
+
+def file_sha256(percorso):
+    """
+    sha256 esadecimale del contenuto del file, letto a blocchi
+    (None se illeggibile). Usata da copie, download FTP e similarità.
+    """
+    try:
+        h = hashlib.sha256()
+        with open(percorso, "rb") as f:
+            while True:
+                pezzo = f.read(SHA256_CHUNK_SIZE)
+                if not pezzo:
+                    break
+                h.update(pezzo)
+        return h.hexdigest()
+    except OSError:
+        return None
 
 
 # =============================================================================
 #  UTILITÀ PER LA SCHEDA "LIVE"
 # =============================================================================
 
-def _format_age(last_mod_timestamp: float | None) -> str:
+def format_age(last_mod_timestamp: float | None) -> str:
     """
     Converte un timestamp di ultima modifica in una stringa del tipo:
       - "2g 3h"
@@ -203,10 +335,124 @@ def _format_age(last_mod_timestamp: float | None) -> str:
     return "<1m"
 
 
-def scan_remote_directory(remote_directory, extension, count_lines=False):
+def _count_lines_binary(file_path):
+    """
+    Conta le righe leggendo il file a blocchi binari e contando i byte di
+    fine riga, senza decodificare. Come readlines(), un'ultima riga senza
+    a capo finale conta come riga.
+    """
+    righe = 0
+    ultimo = b""
+    with open(file_path, "rb") as fh:
+        while True:
+            blocco = fh.read(1024 * 1024)
+            if not blocco:
+                break
+            righe += blocco.count(b"\n")
+            ultimo = blocco[-1:]
+    if ultimo and ultimo != b"\n":
+        righe += 1
+    return righe
+
+
+def _load_line_cache():
+    global _line_cache
+    if _line_cache is not None:
+        return _line_cache
+    _line_cache = {}
+    try:
+        with open(LINE_CACHE_PATH, "r", encoding="utf-8") as f:
+            dati = json.load(f)
+        if isinstance(dati, dict):
+            _line_cache = dati
+    except Exception:
+        pass
+    return _line_cache
+
+
+def count_file_lines(file_path, st=None):
+    """
+    Numero di righe del file, riusando la cache se dimensione e mtime_ns
+    non sono cambiati. 'st' (os.stat già eseguito) evita una stat in più.
+    Restituisce None se il file non è leggibile.
+    """
+    global _line_cache_dirty
+
+    try:
+        if st is None:
+            st = os.stat(file_path)
+    except OSError:
+        return None
+
+    with _line_cache_lock:
+        cache = _load_line_cache()
+        voce = cache.get(file_path)
+        if voce is not None and voce[0] == st.st_size and voce[1] == st.st_mtime_ns:
+            return voce[2]
+
+    try:
+        righe = _count_lines_binary(file_path)
+    except OSError:
+        return None
+
+    with _line_cache_lock:
+        cache.pop(file_path, None)
+        cache[file_path] = [st.st_size, st.st_mtime_ns, righe]
+        # le voci più vecchie (ordine di inserimento) escono per prime
+        while len(cache) > LINE_CACHE_MAX_ENTRIES:
+            del cache[next(iter(cache))]
+        _line_cache_dirty = True
+
+    return righe
+
+
+def save_line_cache(force=False):
     """
-    Scansiona la directory remota alla ricerca delle sole cartelle test01..test30
-    (come definito in data_handler), e per ciascuna restituisce:
+    Salva la cache del conteggio righe (solo se modificata), in modo atomico.
+
+    Senza force la scrittura avviene al più ogni LINE_CACHE_SAVE_INTERVAL
+    secondi: le scansioni possono chiamarla a ogni giro senza riscrivere
+    ogni volta l'intero file. All'uscita del programma viene chiamata con
+    force=True.
+    """
+    global _line_cache_dirty, _line_cache_saved_at
+
+    with _line_cache_lock:
+        if not _line_cache_dirty or _line_cache is None:
+            return
+        adesso = time.monotonic()
+        if not force and adesso - _line_cache_saved_at < LINE_CACHE_SAVE_INTERVAL:
+            return
+        # copia sotto lock, scrittura fuori: le scansioni non si fermano
+        dati = dict(_line_cache)
+        _line_cache_dirty = False
+        _line_cache_saved_at = adesso
+
+    try:
+        os.makedirs(os.path.dirname(LINE_CACHE_PATH), exist_ok=True)
+        tmp_path = f"{LINE_CACHE_PATH}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(dati, f)
+        os.replace(tmp_path, LINE_CACHE_PATH)
+    except Exception:
+        with _line_cache_lock:
+            _line_cache_dirty = True
+
+
+atexit.register(save_line_cache, True)
+
+
+def scan_remote_directory(
+    remote_directory,
+    extension,
+    count_lines=False,
+    only_folders=None,
+    timeline=None,
+    copy_index=None,
+):
+    """
+    Scansiona la directory remota alla ricerca delle sole cartelle test
+    (pattern configurati in data_handler), e per ciascuna restituisce:
 
       (nome_cartella,
        num_file_con_estensione,
@@ -216,6 +462,13 @@ def scan_remote_directory(remote_directory, extension, count_lines=False):
        eta_str)
 
     - extension può contenere UNA o PIÙ estensioni (come in parse_extensions)
+    - only_folders (opzionale): limita la scansione a questi nomi di cartella
+      (aggiornamenti incrementali segnalati dal watcher della scheda LIVE)
+    - timeline (opzionale): storico live_timeline in cui registrare
+      l'attività di ciascuna cartella (con i dati stat già raccolti); la
+      variazione di righe viene registrata solo con count_lines
+    - copy_index (opzionale): indice live_copie da aggiornare (rilegge solo
+      i file con dimensione/mtime cambiati) per segnalare copie tra postazioni
     """
     results = []
 
@@ -224,43 +477,42 @@ def scan_remote_directory(remote_directory, extension, count_lines=False):
 
     exts = parse_extensions(extension.strip())
 
-    for folder_name, folder_path in data_handler._iter_test_folders(remote_directory):
-        if not os.path.isdir(folder_path):
-            continue
-
+    def _scan_folder(folder_name, folder_path):
         files_found = []
+        stat_files = []
         total_lines = 0
         last_mod = None
 
-        for root, _dirs, files in os.walk(folder_path):
-            for f in files:
-                if not exts:
-                    match = True
-                else:
-                    match = any(f.lower().endswith(e) for e in exts)
-                if not match:
-                    continue
-
-                files_found.append(f)
-                file_path = os.path.join(root, f)
-
-                # aggiorna last_mod
-                mtime = os.path.getmtime(file_path)
-                if last_mod is None or mtime > last_mod:
-                    last_mod = mtime
-
-                # conteggio righe opzionale
-                if count_lines:
-                    try:
-                        try:
-                            with open(file_path, "r", encoding="utf-8") as fh:
-                                lines = fh.readlines()
-                        except UnicodeDecodeError:
-                            with open(file_path, "r", encoding="latin-1", errors="replace") as fh:
-                                lines = fh.readlines()
-                        total_lines += len(lines)
-                    except Exception:
-                        pass
+        # stat dalle voci di os.scandir (nessuna stat aggiuntiva per file)
+        for root, f, st in data_handler.walk_files_with_stat(folder_path):
+            if exts and not any(f.lower().endswith(e) for e in exts):
+                continue
+
+            files_found.append(f)
+
+            # aggiorna last_mod
+            mtime = st.st_mtime
+            if last_mod is None or mtime > last_mod:
+                last_mod = mtime
+
+            # conteggio righe opzionale (cache per size/mtime)
+            righe = None
+            if count_lines:
+                righe = count_file_lines(os.path.join(root, f), st)
+                if righe is not None:
+                    total_lines += righe
+
+            stat_files.append((os.path.join(root, f), st, righe))
+
+        if timeline is not None:
+            # con il conteggio righe attivo le righe dei file nuovi/modificati
+            # sono già note; senza, la metrica "righe" resta vuota
+            live_timeline.record_folder(timeline, folder_name, stat_files)
+
+        if copy_index is not None:
+            live_copie.update_folder(
+                copy_index, folder_name, [(p, st) for p, st, _righe in stat_files]
+            )
 
         num_file = len(files_found)
         files_found.sort()
@@ -270,22 +522,47 @@ def scan_remote_directory(remote_directory, extension, count_lines=False):
         else:
             last_mod_str = "-"
 
-        age_str = _format_age(last_mod)
+        age_str = format_age(last_mod)
 
         num_lines_value = total_lines if count_lines else None
 
-        results.append(
-            (folder_name, num_file, num_lines_value, files_found, last_mod_str, age_str)
-        )
+        return (folder_name, num_file, num_lines_value, files_found, last_mod_str, age_str)
+
+    # le cartelle vengono visitate in parallelo (round trip di rete sovrapposti)
+    for _name, _path, row in data_handler.map_test_folders(
+        remote_directory, _scan_folder, only_folders=only_folders
+    ):
+        if row is not None:
+            results.append(row)
+
+    if count_lines:
+        # scrittura su disco limitata nel tempo (LINE_CACHE_SAVE_INTERVAL)
+        save_line_cache()
 
     results.sort(key=lambda x: x[0])
     return results
 
 
-def copy_test_directories(remote_directory, destination_root, nome_verifica):
+def copy_test_directories(
+    remote_directory,
+    destination_root,
+    nome_verifica,
+    widget=None,
+    on_update=None,
+    archive_format=None,
+    archive_only=False,
+):
     """
-    Copia SOLO le cartelle test01..test30 esistenti da `remote_directory`
+    Copia SOLO le cartelle test esistenti da `remote_directory`
     dentro una nuova cartella creata sotto `destination_root`.
+
+    - archive_format ("zip" / "tar.xz"): crea anche, in streaming, l'archivio
+      compresso accanto alla cartella; archive_only=True crea solo l'archivio.
+
+    - senza `widget`: copia bloccante, restituisce il messaggio di esito;
+    - con `widget` (es. il frame LIVE): la copia gira in background
+      (data_handler.start_copy_job), on_update(testo) riceve l'avanzamento
+      e infine il messaggio di esito; restituisce subito "copia avviata".
     """
     nome_verifica = (nome_verifica or "").strip()
     if not nome_verifica:
@@ -301,14 +578,48 @@ def copy_test_directories(remote_directory, destination_root, nome_verifica):
 
     timestamp = _dt.now().strftime("%Y%m%d_%H-%M")
     dest_base = os.path.join(destination_root, f"{timestamp}_{nome_verifica}")
-    os.makedirs(dest_base, exist_ok=True)
+    copia_file = not (archive_only and archive_format)
+    if copia_file:
+        os.makedirs(dest_base, exist_ok=True)
+
+    def _esito(job):
+        if not job["cartelle"]:
+            return f"⚠️ Nessuna cartella test trovata in {remote_directory}."
+        if job["annullata"]:
+            return f"⚠️ Copia annullata: {job['file_fatti']}/{job['file_totali']} file in {dest_base}."
+        arch = job["archivio"]
+        if arch is not None and arch["errore"] is not None:
+            return f"⚠️ Archivio non creato: {arch['errore']}"
+        if not copia_file:
+            return f"✅ Archiviate {len(job['cartelle'])} cartelle di test in {arch['percorso']}."
+        if job["errori"]:
+            return (
+                f"⚠️ Copiate {len(job['cartelle'])} cartelle in {dest_base} "
+                f"con {len(job['errori'])} errori (vedi {data_handler.COPY_ERRORS_FILE})."
+            )
+        return f"✅ Copiate {len(job['cartelle'])} cartelle di test in {dest_base}."
+
+    job = data_handler.start_copy_job(
+        remote_directory,
+        dest_base,
+        archive_format=archive_format,
+        copy_files=copia_file,
+    )
+
+    if widget is None:
+        job["finito"].wait()
+        return _esito(job)
 
-    copied = data_handler._copy_test_folders(remote_directory, dest_base, report_text=None)
+    def _avanzamento(job):
+        if on_update is not None:
+            on_update(data_handler.format_copy_progress(job))
 
-    if not copied:
-        return f"⚠️ Nessuna cartella test01–test30 trovata in {remote_directory}."
+    def _fine(job):
+        if on_update is not None:
+            on_update(_esito(job))
 
-    return f"✅ Copiate {len(copied)} cartelle di test in {dest_base}."
+    data_handler.follow_copy_job(widget, job, _avanzamento, _fine)
+    return f"Copia avviata in {dest_base}..."
 
 
 # =============================================================================